@@ -0,0 +1,246 @@
+import time
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Optional
+
+import discord
+
+# Стадии проверок: сначала чистые вычисления, затем обращения к состоянию.
+# Сетевые действия (удаление, сообщения) выполняются после конвейера, один раз на сообщение.
+STAGE_CPU = 0
+STAGE_STATE = 1
+STAGE_NAMES = {STAGE_CPU: 'cpu', STAGE_STATE: 'state'}
+
+
+class AutomodRule(ABC):
+    """Правило автомодерации: настройки сервера компилируются в параметры проверки"""
+
+    name = ''
+    stage = STAGE_CPU
+    action = 'delete'
+    # Ожидаемое время проверки для метрик: превышения только считаются (over_budget), правило не отключается
+    budget_ms = 1.0
+
+    def compile(self, config: dict):
+        """Параметры правила для сервера или None, если правило у него не сработает"""
+        return True
+
+    @abstractmethod
+    def check(self, message: discord.Message, params) -> Optional[str]:
+        """Причина срабатывания или None"""
+
+    def observe(self, message: discord.Message, params, caught_by: 'AutomodRule'):
+        """Учесть сообщение, которое уже поймало правило caught_by (для правил с состоянием)"""
+
+
+class MentionsRule(AutomodRule):
+    name = 'mentions'
+    action = 'spam'
+    budget_ms = 0.1
+
+    def compile(self, config: dict):
+        limit = config.get('max_mentions', 5)
+        return limit if limit and limit > 0 else None
+
+    def check(self, message, limit):
+        if len(message.mentions) > limit:
+            return 'mentions'
+        return None
+
+
+class CapsRule(AutomodRule):
+    name = 'caps'
+    action = 'caps'
+    budget_ms = 0.5
+
+    MIN_LETTERS = 10  # Короткие сообщения вроде "OK" не считаются капсом
+
+    def compile(self, config: dict):
+        # Удаление за капс включается явно (caps_filter), caps_threshold сам по себе его не включает
+        if not config.get('caps_filter', False):
+            return None
+        threshold = config.get('caps_threshold', 0)
+        if not threshold or threshold >= 100:
+            return None
+        return threshold / 100
+
+    def check(self, message, ratio):
+        content = message.content
+        if len(content) < self.MIN_LETTERS:
+            return None
+        letters = upper = 0
+        for char in content:
+            if char.isalpha():
+                letters += 1
+                upper += char.isupper()
+        if letters >= self.MIN_LETTERS and upper / letters > ratio:
+            return 'caps'
+        return None
+
+
+class BadWordsRule(AutomodRule):
+    name = 'bad_words'
+    action = 'bad_words'
+    budget_ms = 2.0
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+
+    def compile(self, config: dict):
+        return True if config.get('bad_words', True) else None
+
+    def check(self, message, params):
+        return 'bad_words' if message.content and self.matcher.matches(message.content) else None
+
+
+class SpamRule(AutomodRule):
+    name = 'spam'
+    stage = STAGE_STATE
+    action = 'spam'
+    budget_ms = 1.0
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def compile(self, config: dict):
+        threshold = config.get('spam_threshold', self.tracker.flood_count)
+        if not threshold or threshold < 2:
+            return None
+        # Буфер автора не длиннее capacity, больший порог никогда бы не сработал
+        return min(threshold, self.tracker.capacity)
+
+    def observe(self, message, flood_count, caught_by):
+        # Пойманные другими правилами сообщения тоже входят в окно флуда
+        self.tracker.record(message.guild.id, message.channel.id, message.author.id, message.content)
+
+    def check(self, message, flood_count):
+        buffer = self.tracker.record(
+            message.guild.id, message.channel.id, message.author.id, message.content
+        )
+        if self.tracker.is_repeat(buffer):
+            return 'repeat'
+        if self.tracker.is_flood(buffer, flood_count):
+            return 'flood'
+        return None
+
+
+class NearDuplicateRule(AutomodRule):
+    name = 'near_duplicate'
+    stage = STAGE_STATE
+    action = 'raid'
+    budget_ms = 2.0
+
+    def __init__(self, index, joins, raid_threshold: int = 2):
+        self.index = index
+        self.joins = joins
+        self.raid_threshold = raid_threshold
+
+    def compile(self, config: dict):
+        threshold = config.get('duplicate_threshold', 3)
+        if not threshold or threshold < 2:
+            return None
+        # Проверяются только новые аккаунты и недавно вошедшие: у старых участников
+        # одинаковые поздравления и приветствия - обычное дело
+        return (
+            threshold,
+            timedelta(days=config.get('duplicate_account_age_days', 7)),
+            timedelta(hours=config.get('duplicate_join_age_hours', 24))
+        )
+
+    @staticmethod
+    def is_fresh(author, account_age: timedelta, join_age: timedelta) -> bool:
+        now = discord.utils.utcnow()
+        if now - author.created_at <= account_age:
+            return True
+        joined_at = getattr(author, 'joined_at', None)
+        return joined_at is not None and now - joined_at <= join_age
+
+    def observe(self, message, params, caught_by):
+        # Антиспам ловит повторы одного автора в одном канале: индексу они ничего не добавляют,
+        # а при флуде отпечаток каждого повтора стоил бы дороже самой проверки
+        if isinstance(caught_by, SpamRule):
+            return
+        _, account_age, join_age = params
+        if self.is_fresh(message.author, account_age, join_age):
+            self.index.check(message.guild.id, message.channel.id, message.author.id, message.content)
+
+    def check(self, message, params):
+        threshold, account_age, join_age = params
+        # Отпечаток считается только для подозрительных авторов
+        if not self.is_fresh(message.author, account_age, join_age):
+            return None
+        authors, channels = self.index.check(
+            message.guild.id, message.channel.id, message.author.id, message.content
+        )
+        # В режиме рейда достаточно одного повтора в другом канале или от другого автора
+        if self.joins.in_raid(message.guild.id):
+            threshold = min(threshold, self.raid_threshold)
+        if max(authors, channels) >= threshold:
+            return 'raid' if authors > 1 else 'cross_channel'
+        return None
+
+
+class AutomodPipeline:
+    """Правила по стадиям с остановкой на первом срабатывании"""
+
+    def __init__(self, rules: list, config_source, observer=None):
+        # Сортировка устойчивая: внутри стадии порядок регистрации
+        self.rules = sorted(rules, key=lambda rule: rule.stage)
+        # Функция guild_id -> настройки автомодерации сервера
+        self.config_source = config_source
+        # observer(rule, секунды, сработало) - выгрузка замеров во внешние метрики
+        self.observer = observer
+        # Настройки автомодерации читаются из server_rules.json при запуске и во время работы не меняются
+        self._compiled = {}
+        self.metrics = {
+            rule.name: {'checks': 0, 'hits': 0, 'errors': 0, 'over_budget': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            for rule in self.rules
+        }
+
+    def compiled(self, guild_id: int) -> list:
+        """Правила сервера с параметрами [(rule, params)], без отключенных"""
+        compiled = self._compiled.get(guild_id)
+        if compiled is None:
+            config = self.config_source(guild_id)
+            compiled = []
+            for rule in self.rules:
+                params = rule.compile(config)
+                if params is not None:
+                    compiled.append((rule, params))
+            self._compiled[guild_id] = compiled
+        return compiled
+
+    def _record(self, rule: AutomodRule, elapsed: float, hit: bool):
+        if self.observer is not None:
+            self.observer(rule, elapsed, hit)
+        elapsed_ms = elapsed * 1000
+        stats = self.metrics[rule.name]
+        stats['checks'] += 1
+        stats['hits'] += hit
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if elapsed_ms > rule.budget_ms:
+            stats['over_budget'] += 1
+
+    def run(self, message: discord.Message) -> Optional[tuple]:
+        """Первое сработавшее правило: (rule, reason) или None"""
+        compiled = self.compiled(message.guild.id)
+        for index, (rule, params) in enumerate(compiled):
+            start = time.perf_counter()
+            try:
+                reason = rule.check(message, params)
+            except Exception as e:
+                self.metrics[rule.name]['errors'] += 1
+                print(f"Ошибка правила автомодерации {rule.name}: {e}")
+                continue
+            self._record(rule, time.perf_counter() - start, reason is not None)
+            if reason is not None:
+                # Проверки дальше не нужны, но правила с состоянием должны увидеть сообщение
+                for later_rule, later_params in compiled[index + 1:]:
+                    try:
+                        later_rule.observe(message, later_params, rule)
+                    except Exception as e:
+                        self.metrics[later_rule.name]['errors'] += 1
+                        print(f"Ошибка правила автомодерации {later_rule.name}: {e}")
+                return rule, reason
+        return None
@@ -0,0 +1,125 @@
+import os
+import time
+from collections import deque
+from typing import Optional
+
+# Похожие символы приводятся к одному виду: латиница и цифры -> кириллица
+HOMOGLYPHS = {
+    'a': 'а', 'b': 'в', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у', 'ё': 'е', 'й': 'и',
+}
+
+LEETSPEAK = {
+    '0': 'о', '3': 'з', '4': 'ч', '6': 'б', '@': 'а', '$': 'с', '€': 'е',
+}
+
+NORMALIZE_TABLE = str.maketrans({**HOMOGLYPHS, **LEETSPEAK})
+
+
+def normalize(text: str) -> str:
+    """Нормализация текста перед поиском (регистр, гомоглифы, leetspeak)"""
+    # translate заменяет символ на символ, поэтому длина строки не меняется
+    return text.lower().translate(NORMALIZE_TABLE)
+
+
+class BadWordsMatcher:
+    """Поиск запрещенных слов автоматом Ахо-Корасик"""
+
+    def __init__(self, filename: str, normalize_text: bool = True, check_interval: float = 5.0):
+        self.filename = filename
+        self.normalize_text = normalize_text
+        self.check_interval = check_interval
+        self.words = []
+        self._mtime = None
+        self._last_check = 0.0
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+
+    def _prepare(self, text: str) -> str:
+        return normalize(text) if self.normalize_text else text.lower()
+
+    def compile(self, words):
+        """Построение автомата по списку слов"""
+        goto, fail, output = [{}], [0], [None]
+        for word in words:
+            pattern = self._prepare(word)
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    fail.append(0)
+                    output.append(None)
+                state = next_state
+            output[state] = word
+
+        # Суффиксные ссылки строятся обходом в ширину
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                fail[next_state] = goto[link].get(char, 0)
+                if output[next_state] is None:
+                    output[next_state] = output[fail[next_state]]
+
+        self.words = list(words)
+        self._goto, self._fail, self._output = goto, fail, output
+
+    def reload(self, force: bool = False) -> bool:
+        """Перечитать файл, если изменилось время его модификации"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        try:
+            mtime = os.stat(self.filename).st_mtime_ns
+        except OSError:
+            if self._mtime is not None:
+                self._mtime = None
+                self.compile([])
+                return True
+            return False
+
+        if mtime == self._mtime and not force:
+            return False
+
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                words = [line.strip().lower() for line in f if line.strip()]
+        except OSError as e:
+            print(f"Ошибка загрузки запрещенных слов: {e}")
+            return False
+
+        self.compile(words)
+        self._mtime = mtime
+        return True
+
+    def find(self, text: str) -> Optional[str]:
+        """Первое найденное запрещенное слово или None"""
+        goto, fail, output = self._goto, self._fail, self._output
+        if len(goto) == 1:
+            return None
+
+        state = 0
+        for char in self._prepare(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+    def matches(self, text: str) -> bool:
+        """Есть ли в тексте запрещенные слова"""
+        self.reload()
+        return self.find(text) is not None
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+# python -m benchmarks                 - прогон и сравнение с benchmarks/baseline.json
+# python -m benchmarks --save          - прогон и запись нового эталона
+# python -m benchmarks -k on_message   - только бенчмарки с подстрокой в названии
+# python -m benchmarks --quick         - в 10 раз меньше итераций (проверка, что все работает)
+# python -m benchmarks --repeat 5      - каждый бенчмарк 5 раз, в отчет идут медианы
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# Меньше итераций --quick не срезает: на паре замеров p99 - это просто максимум
+MIN_ITERATIONS = 20
+# Расхождение REST/оп в пределах округления и редких фоновых запросов
+REST_TOLERANCE = 0.01
+# p99 сравнивается, только если замеров хватает на устойчивый хвост
+P99_MIN_ITERATIONS = 1000
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def measure(op, iterations: int) -> dict:
+    from benchmarks.fakes import REST_CALLS
+
+    for i in range(min(iterations // 10, 200)):
+        await op(i)
+    REST_CALLS.clear()
+
+    timings = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for i in range(iterations):
+        start = clock()
+        await op(i)
+        timings.append(clock() - start)
+    total = clock() - started
+
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / (total / 1e9), 1),
+        'p50_us': round(percentile(timings, 0.50) / 1000, 2),
+        'p99_us': round(percentile(timings, 0.99) / 1000, 2),
+        'rest_calls_per_op': round(sum(REST_CALLS.values()) / iterations, 3)
+    }
+
+
+async def run_all(bot, benchmarks: dict, scale: float, repeat: int) -> dict:
+    results = {}
+    for name, (setup, iterations) in benchmarks.items():
+        iterations = max(int(iterations * scale), min(iterations, MIN_ITERATIONS))
+        runs = []
+        for _ in range(repeat):
+            # Свежие данные на каждый повтор: иначе повтор тех же сообщений замеряет уже антиспам
+            op = await setup(bot)
+            runs.append(await measure(op, iterations))
+        # Медиана каждого показателя по повторам: короткие прогоны сильно шумят
+        result = {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+        results[name] = result
+        print(
+            f"{name:<28} {result['ops_per_sec']:>12.1f} оп/с   "
+            f"p50 {result['p50_us']:>10.2f} мкс   p99 {result['p99_us']:>10.2f} мкс   "
+            f"REST/оп {result['rest_calls_per_op']}"
+        )
+    await bot.persistence.close()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Бенчмарки, у которых p50 (и p99 на длинных прогонах) хуже эталона больше чем в threshold раз
+    или число REST-запросов на операцию не совпадает с эталоном (замерен другой путь)"""
+    regressions = []
+    print(f"\nСравнение с эталоном ({baseline.get('python', '?')}, {baseline.get('machine', '?')}):")
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<28} нет в эталоне")
+            continue
+        p50 = result['p50_us'] / base['p50_us'] if base['p50_us'] else 1.0
+        p99 = result['p99_us'] / base['p99_us'] if base['p99_us'] else 1.0
+        judged = max(p50, p99) if result['iterations'] >= P99_MIN_ITERATIONS else p50
+        rest_changed = abs(result['rest_calls_per_op'] - base['rest_calls_per_op']) > REST_TOLERANCE
+        if rest_changed:
+            status = 'ДРУГОЙ ПУТЬ'
+        else:
+            status = 'РЕГРЕССИЯ' if judged > threshold else 'ok'
+        print(
+            f"{name:<28} p50 x{p50:.2f}   p99 x{p99:.2f}   "
+            f"REST/оп {base['rest_calls_per_op']} -> {result['rest_calls_per_op']}   {status}"
+        )
+        if status != 'ok':
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих путей бота")
+    parser.add_argument('-k', dest='pattern', default='', help="подстрока в названии бенчмарка")
+    parser.add_argument('--quick', action='store_true', help="в 10 раз меньше итераций")
+    parser.add_argument('--save', action='store_true', help="записать результаты как эталон")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="файл эталона")
+    parser.add_argument('--repeat', type=int, help="повторов каждого бенчмарка (по умолчанию 1, с --quick 5)")
+    parser.add_argument('--threshold', type=float, help="допустимое замедление (по умолчанию 1.25, с --quick 1.5)")
+    args = parser.parse_args()
+    if args.repeat is None:
+        args.repeat = 5 if args.quick else 1
+    if args.threshold is None:
+        args.threshold = 1.5 if args.quick else 1.25
+
+    # bot.py читает и пишет файлы данных в текущей папке, поэтому прогон идет во временной
+    sys.path.insert(0, ROOT)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='bot-bench-') as workdir:
+        os.chdir(workdir)
+        os.environ['STORAGE_BACKEND'] = 'json'
+
+        from benchmarks.suite import BENCHMARKS, write_bad_words
+        write_bad_words(os.path.join(workdir, 'bad_words.txt'))
+        import bot
+
+        async def skip_commands(message):
+            pass
+        # Разбор префиксных команд - код discord.py, а не бота
+        bot.bot.process_commands = skip_commands
+
+        selected = {name: entry for name, entry in BENCHMARKS.items() if args.pattern in name}
+        try:
+            results = asyncio.run(run_all(bot, selected, 0.1 if args.quick else 1.0, max(args.repeat, 1)))
+        finally:
+            os.chdir(cwd)
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Эталон записан в {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
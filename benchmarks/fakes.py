@@ -0,0 +1,169 @@
+import itertools
+from datetime import datetime, timezone
+
+import discord
+
+# Легкие заменители объектов discord.py: только атрибуты и методы, которые трогает bot.py.
+# Сетевые методы ничего не отправляют, а только считают вызовы в REST_CALLS.
+
+REST_CALLS = {}
+_ids = itertools.count(10 ** 17)
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+def rest_call(name: str):
+    REST_CALLS[name] = REST_CALLS.get(name, 0) + 1
+
+
+class FakePermissions:
+    def __init__(self, administrator: bool = False):
+        self.administrator = administrator
+
+
+class FakeRole:
+    def __init__(self, name: str, position: int = 1):
+        self.id = next_id()
+        self.name = name
+        self.position = position
+        self.mention = f"<@&{self.id}>"
+
+
+class FakeMember:
+    def __init__(self, guild, name: str, bot: bool = False, status=discord.Status.online,
+                 administrator: bool = False, roles: list = None):
+        self.id = next_id()
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.bot = bot
+        self.status = status
+        self.guild = guild
+        self.roles = roles or []
+        self.guild_permissions = FakePermissions(administrator)
+        self.created_at = datetime.now(timezone.utc)
+
+    async def send(self, *args, **kwargs):
+        rest_call('dm_send')
+
+    async def create_dm(self):
+        # ЛС отправляются тем же send, что и у участника
+        return self
+
+    async def add_roles(self, *roles, reason=None):
+        rest_call('add_roles')
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        rest_call('remove_roles')
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def timeout(self, until, reason=None):
+        rest_call('timeout')
+
+
+class FakeChannel:
+    def __init__(self, guild, name: str, category=None):
+        self.id = next_id()
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.guild = guild
+        self.category = category
+
+    async def send(self, *args, **kwargs):
+        rest_call('channel_send')
+        return FakeMessage(self, self.guild.me, args[0] if args else '')
+
+
+class FakeGuild:
+    def __init__(self, name: str = "Бенчмарк", members: int = 0, text_channels: int = 20,
+                 voice_channels: int = 5, online_ratio: float = 0.3, bot_ratio: float = 0.01):
+        self.id = next_id()
+        self.name = name
+        self.created_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.icon = None
+        self.default_role = FakeRole('@everyone', 0)
+        self.roles = [self.default_role, FakeRole('Muted'), FakeRole('Модератор')]
+        self.categories = []
+        self.text_channels = [FakeChannel(self, f"канал-{i}") for i in range(text_channels)]
+        self.voice_channels = [FakeChannel(self, f"голос-{i}") for i in range(voice_channels)]
+        self.me = FakeMember(self, "бот", bot=True, administrator=True)
+        self.owner = FakeMember(self, "владелец", administrator=True)
+
+        # Статусы раскладываются детерминированно, чтобы прогоны были сравнимы
+        online_every = max(int(1 / online_ratio), 1) if online_ratio else 0
+        bot_every = max(int(1 / bot_ratio), 1) if bot_ratio else 0
+        self.members = [
+            FakeMember(
+                self,
+                f"участник-{i}",
+                bot=bool(bot_every) and i % bot_every == 0,
+                status=discord.Status.online if online_every and i % online_every == 0 else discord.Status.offline
+            )
+            for i in range(members)
+        ]
+        self.member_count = len(self.members)
+        self._channels = {channel.id: channel for channel in self.text_channels + self.voice_channels}
+        self._members = {member.id: member for member in self.members}
+
+    def get_channel(self, channel_id: int):
+        return self._channels.get(channel_id)
+
+    def get_member(self, member_id: int):
+        return self._members.get(member_id)
+
+    def get_role(self, role_id: int):
+        return discord.utils.get(self.roles, id=role_id)
+
+    async def create_role(self, name: str, **kwargs):
+        rest_call('create_role')
+        role = FakeRole(name)
+        self.roles.append(role)
+        return role
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeChannel, author: FakeMember, content: str, mentions: list = None):
+        self.id = next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.mentions = mentions or []
+
+    async def delete(self):
+        rest_call('message_delete')
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, *args, **kwargs):
+        rest_call('interaction_response')
+        self._done = True
+
+    async def defer(self, *args, **kwargs):
+        rest_call('interaction_defer')
+        self._done = True
+
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        rest_call('interaction_followup')
+
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild, user: FakeMember):
+        self.guild = guild
+        self.user = user
+        self.channel = guild.text_channels[0] if guild.text_channels else None
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.command = None
+        self.command_failed = False
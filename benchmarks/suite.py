@@ -0,0 +1,182 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import FakeGuild, FakeInteraction, FakeMember, FakeMessage
+
+# Синтетические нагрузки; генератор с фиксированным зерном, чтобы прогоны были сравнимы
+SEED = 1337
+VOCABULARY_SIZE = 5000
+BAD_WORDS_COUNT = 20000
+HEAVY_USER_WARNINGS = 5000
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, iterations: int):
+    """Регистрация бенчмарка: setup(bot) возвращает корутину-операцию op(i)"""
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, iterations)
+        return setup
+    return decorator
+
+
+def vocabulary(rng: random.Random, size: int = VOCABULARY_SIZE) -> list:
+    letters = 'абвгдежзиклмнопрстуфхцчшщыэюя'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def sentences(rng: random.Random, words: list, count: int, length: tuple = (4, 20)) -> list:
+    return [' '.join(rng.choices(words, k=rng.randint(*length))) for _ in range(count)]
+
+
+def write_bad_words(path: str, count: int = BAD_WORDS_COUNT):
+    """Большой список запрещенных слов для бенчмарков (до импорта bot)"""
+    rng = random.Random(SEED + 1)
+    letters = 'бвгджзклмнпрстфхцчшщ'
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            f.write(''.join(rng.choice(letters) for _ in range(rng.randint(5, 9))) + '\n')
+
+
+def write_heavy_partition(directory: str, guild_id: int, user_id: int, count: int = HEAVY_USER_WARNINGS):
+    """Раздел сервера с участником, у которого много варнов"""
+    moderator_id = 1
+    start = datetime.now() - timedelta(days=365)
+    warnings = [
+        {
+            'id': i,
+            'guild_id': guild_id,
+            'moderator': 'модератор',
+            'moderator_id': moderator_id,
+            'reason': f'нарушение {i}',
+            'level': 1 + i % 3,
+            'timestamp': (start + timedelta(minutes=i)).isoformat(),
+            'active': i % 10 == 0
+        }
+        for i in range(1, count + 1)
+    ]
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{guild_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump({'warnings': {str(user_id): warnings}, 'log_channel': None, 'mod_roles': []}, f)
+
+
+def message_stream(guild: FakeGuild, authors: list, texts: list):
+    channels = guild.text_channels
+    return [
+        FakeMessage(channels[i % len(channels)], authors[i % len(authors)], text)
+        for i, text in enumerate(texts)
+    ]
+
+
+@benchmark('on_message_clean', iterations=20000)
+async def on_message_clean(bot):
+    """Обычный поток сообщений: все правила проходят, ничего не срабатывает"""
+    rng = random.Random(SEED)
+    guild = FakeGuild(members=0)
+    # Тексты и авторы не повторяются: иначе при тысячах сообщений в секунду сработают флуд и повторы
+    authors = [FakeMember(guild, f"автор-{i}") for i in range(22000)]
+    messages = message_stream(guild, authors, sentences(rng, vocabulary(rng), 22000))
+
+    async def op(i):
+        await bot.on_message(messages[i % len(messages)])
+    return op
+
+
+@benchmark('on_message_flood', iterations=20000)
+async def on_message_flood(bot):
+    """Один автор повторяет сообщение: срабатывает спам и выполняется удаление"""
+    guild = FakeGuild(members=0)
+    author = FakeMember(guild, "спамер")
+    channel = guild.text_channels[0]
+    message = FakeMessage(channel, author, "купи подписку по ссылке прямо сейчас")
+
+    async def op(i):
+        await bot.on_message(message)
+    return op
+
+
+@benchmark('bad_words_large_list', iterations=20000)
+async def bad_words_large_list(bot):
+    """Поиск по списку из BAD_WORDS_COUNT слов на тексте разной длины"""
+    rng = random.Random(SEED + 2)
+    texts = sentences(rng, vocabulary(rng), 1000, length=(5, 60))
+    matches = bot.bad_words_matcher.matches
+
+    async def op(i):
+        matches(texts[i % len(texts)])
+    return op
+
+
+@benchmark('spam_tracker_many_authors', iterations=50000)
+async def spam_tracker_many_authors(bot):
+    """Окно спама на 10 000 авторов в 50 каналах"""
+    rng = random.Random(SEED + 3)
+    texts = sentences(rng, vocabulary(rng), 1000)
+    check = bot.spam_tracker.check
+
+    async def op(i):
+        check(1, i % 50, i % 10000, texts[i % len(texts)], now=i * 0.001)
+    return op
+
+
+@benchmark('near_duplicate_index', iterations=20000)
+async def near_duplicate_index(bot):
+    """Отпечатки сообщений сервера за минуту: 100 сообщений в секунду"""
+    rng = random.Random(SEED + 4)
+    texts = sentences(rng, vocabulary(rng), 2000, length=(6, 30))
+    check = bot.duplicate_index.check
+
+    async def op(i):
+        check(2, i % 50, i % 3000, texts[i % len(texts)], now=i * 0.01)
+    return op
+
+
+@benchmark('warn_member_heavy_user', iterations=2000)
+async def warn_member_heavy_user(bot):
+    """Выдача варна участнику с HEAVY_USER_WARNINGS варнами"""
+    guild = FakeGuild(members=0)
+    moderator = FakeMember(guild, "модератор", administrator=True)
+    member = FakeMember(guild, "нарушитель")
+    write_heavy_partition(bot.GUILDS_DIRECTORY, guild.id, member.id)
+    await bot.guild_states.get(guild.id)
+
+    async def op(i):
+        await bot.warn_member.callback(FakeInteraction(guild, moderator), member, "бенчмарк", 1)
+    return op
+
+
+@benchmark('view_warnings_heavy_user', iterations=2000)
+async def view_warnings_heavy_user(bot):
+    guild = FakeGuild(members=0)
+    moderator = FakeMember(guild, "модератор", administrator=True)
+    member = FakeMember(guild, "нарушитель")
+    write_heavy_partition(bot.GUILDS_DIRECTORY, guild.id, member.id)
+    await bot.guild_states.get(guild.id)
+
+    async def op(i):
+        await bot.view_warnings.callback(FakeInteraction(guild, moderator), member)
+    return op
+
+
+@benchmark('guild_stats_sync_100k', iterations=20)
+async def guild_stats_sync_100k(bot):
+    """Полный пересчет участников сервера на 100 000 человек"""
+    guild = FakeGuild(members=100000)
+
+    async def op(i):
+        bot.guild_stats.sync_members(guild)
+    return op
+
+
+@benchmark('server_stats_100k', iterations=5000)
+async def server_stats_100k(bot):
+    """Команда статистики на сервере из 100 000 участников (после первого пересчета)"""
+    guild = FakeGuild(members=100000)
+    user = FakeMember(guild, "участник")
+    await bot.server_stats.callback(FakeInteraction(guild, user))
+
+    async def op(i):
+        await bot.server_stats.callback(FakeInteraction(guild, user))
+    return op
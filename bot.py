@@ -4,43 +4,190 @@ from discord import app_commands
 from datetime import datetime, timedelta
 import json
 import os
+import io
+import hashlib
 import asyncio
+import time
 from typing import Optional, List
 import aiohttp
 import random
 from collections import defaultdict
 import pytz
+from bad_words_filter import BadWordsMatcher
+from spam_guard import SpamTracker
+from automod import STAGE_NAMES, AutomodPipeline, BadWordsRule, CapsRule, MentionsRule, NearDuplicateRule, SpamRule
+from raid_guard import JoinRateTracker, NearDuplicateIndex
+from keep_alive import keep_alive
+from metrics import (
+    AUTOMOD_HITS, AUTOMOD_SECONDS, MESSAGE_SECONDS, REGISTRY, TimedCommandTree,
+    instrument_http, monitor_loop_lag, observe_command, rate_limit_trace
+)
+from storage import WriteBehind, atomic_write_json, create_storage, load_json
+from scheduler import Scheduler
+from log_dispatcher import LogDispatcher
+from dm_outbox import DMOutbox
+from mod_permissions import ModPermissionCache
+from guild_stats import GuildStatsTracker
+from permission_fanout import PermissionFanout
+from ticket_pool import TicketChannelPool
+from role_queue import RoleAssignQueue
+from reminders import ReminderScheduler
+from rules_search import RulesIndex
+from guild_state import GuildStateCache
+from mod_journal import ModJournal
+from snapshots import MAX_SNAPSHOT_BYTES, SnapshotStore, compress, decompress, full_snapshot, serialize, validate
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.messages = True
+# Статусы участников для счетчика онлайна в /статистика. Привилегированный интент:
+# его нужно включить в Developer Portal (Bot -> Presence Intent), иначе шлюз не примет подключение
+intents.presences = True
+
+# Шардирование: SHARD_COUNT/SHARD_IDS задает cluster.py, AUTO_SHARD=1 - число шардов выберет Discord
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 0)) or None
+SHARD_IDS = [int(i) for i in os.getenv('SHARD_IDS', '').split(',') if i] or None
+CLUSTER_ID = os.getenv('CLUSTER_ID')
+
+class ModerationBotMixin:
+    """Общая часть бота с шардированием и без"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Ссылки на фоновые задачи: без них задачу может собрать сборщик мусора
+        self.background_tasks = set()
+
+    def start_background(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def setup_hook(self):
+        """Однократный запуск до подключения к шлюзу (on_ready повторяется при переподключениях)"""
+        register_persistent_views()
+        self.start_background(monitor_loop_lag())
+        self.start_background(warm_up())
+
+    async def close(self):
+        """Остановка бота: задачи больше не запускаются, логи и ЛС отправляются, пока HTTP-сессия еще открыта"""
+        for task in self.background_tasks:
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        await scheduler.stop()
+        await log_dispatcher.flush()
+        await dm_outbox.flush()
+        await super().close()
+
+class ModerationBot(ModerationBotMixin, commands.Bot):
+    pass
+
+class ShardedModerationBot(ModerationBotMixin, commands.AutoShardedBot):
+    pass
 
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+if SHARD_COUNT or os.getenv('AUTO_SHARD'):
+    bot = ShardedModerationBot(
+        command_prefix='!',
+        intents=intents,
+        help_command=None,
+        shard_count=SHARD_COUNT,
+        shard_ids=SHARD_IDS,
+        tree_cls=TimedCommandTree,
+        http_trace=rate_limit_trace()
+    )
+else:
+    bot = ModerationBot(
+        command_prefix='!', intents=intents, help_command=None, tree_cls=TimedCommandTree,
+        http_trace=rate_limit_trace()
+    )
+
+# Время REST-запросов по маршрутам для /metrics (ответы 429 считает rate_limit_trace)
+instrument_http(bot.http)
+
+def worker_file(filename: str) -> str:
+    """Свой файл на каждый процесс кластера (данные серверов его шардов)"""
+    if CLUSTER_ID is None:
+        return filename
+    name, ext = os.path.splitext(filename)
+    return f"{name}.cluster{CLUSTER_ID}{ext}"
 
 # Файлы для хранения данных
 RULES_FILE = 'server_rules.json'
 WARNINGS_FILE = 'warnings.json'
 LOG_CHANNEL_FILE = 'log_channel.json'
 MOD_ROLES_FILE = 'mod_roles.json'
+SCHEDULE_FILE = worker_file('scheduled_jobs.json')
+FANOUT_FILE = worker_file('fanout_jobs.json')
+VIEWS_FILE = worker_file('persistent_views.json')
+REMINDERS_FILE = worker_file('reminders.json')
+
+# Хранилище варнов, мод ролей и каналов логов: 'json' или 'sqlite'
+# Процессы кластера работают с общей базой SQLite
+STORAGE_BACKEND = 'sqlite' if CLUSTER_ID is not None else os.getenv('STORAGE_BACKEND', 'json')
+DATABASE_FILE = 'bot.db'
+GUILDS_DIRECTORY = 'guilds'  # JSON-хранилище: отдельный файл на каждый сервер
+FLUSH_INTERVAL_MS = 500  # Как часто JSON-файлы сбрасываются на диск
+# Данные серверов грузятся при первом обращении; давно неактивные выгружаются сверх бюджета
+STATE_MEMORY_BUDGET_MB = int(os.getenv('STATE_MEMORY_BUDGET_MB', 64))
 
 # Загрузка данных
-def load_json(filename, default={}):
-    if os.path.exists(filename):
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return default
+persistence = WriteBehind(FLUSH_INTERVAL_MS)
+storage = create_storage(
+    STORAGE_BACKEND, DATABASE_FILE, GUILDS_DIRECTORY,
+    WARNINGS_FILE, LOG_CHANNEL_FILE, MOD_ROLES_FILE, persistence
+)
+
+rules_data = load_json(worker_file(RULES_FILE)) or load_json(RULES_FILE, {'rules': {}, 'categories': []})
+rules_data.setdefault('rules', {})
+rules_data.setdefault('categories', [])
 
-def save_json(filename, data):
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# Отложенные действия (снятие мута, закрытие тикетов) переживают перезапуск
+scheduler = Scheduler(SCHEDULE_FILE, persistence)
 
-rules_data = load_json(RULES_FILE, {'rules': {}, 'categories': []})
-warnings_data = load_json(WARNINGS_FILE)
-log_channels = load_json(LOG_CHANNEL_FILE)
-mod_roles = load_json(MOD_ROLES_FILE, {'roles': []})
+# Журнал всех действий модерации: сегменты по 16 МБ, хранится JOURNAL_MAX_SEGMENTS последних.
+# В кластере у каждого процесса свой журнал только по серверам его шардов
+JOURNAL_DIRECTORY = worker_file('journal')
+JOURNAL_MAX_SEGMENTS = 64
+mod_journal = ModJournal(JOURNAL_DIRECTORY, max_segments=JOURNAL_MAX_SEGMENTS)
 
 # ---------- 1. СИСТЕМА ПРЕДУПРЕЖДЕНИЙ (WARN SYSTEM) ----------
+# Через сколько дней истекает предупреждение каждого уровня (0 - не истекает)
+WARNING_TTL_DAYS = {1: 7, 2: 30, 3: 90}
+
+async def adopt_legacy_warnings(state):
+    """Варны из старого общего warnings.json (без сервера) переходят серверу, где состоит участник"""
+    guild = bot.get_guild(state.guild_id)
+    if guild is None:
+        return
+    # Бот без кластера на одном сервере: все старые варны выданы на нем, даже если участник вышел
+    single_guild = CLUSTER_ID is None and len(bot.guilds) == 1
+    legacy = await storage.adopt_legacy(lambda user_id: single_guild or guild.get_member(int(user_id)) is not None)
+    if not legacy:
+        return
+    state.adopt_warnings(legacy)
+    await storage.replace_guild(state.guild_id, {
+        'warnings': state.warnings,
+        'log_channel': state.log_channel,
+        'mod_roles': state.mod_roles
+    })
+    print(f"📦 Старые варны перенесены на сервер {guild.name}: участников {len(legacy)}")
+
+async def prepare_guild_state(state):
+    """Подготовка данных сервера после загрузки: старые варны, истекшие варны и счетчики статистики"""
+    await adopt_legacy_warnings(state)
+    await expire_guild_warnings(state)
+    snapshot_candidates.add(state.guild_id)
+    guild_stats.load_warnings(state.guild_id, state.warnings)
+
+# Варны, канал логов и мод роли хранятся по серверам (у каждого свой счетчик варнов)
+guild_states = GuildStateCache(
+    storage,
+    WARNING_TTL_DAYS,
+    memory_budget=STATE_MEMORY_BUDGET_MB * 1024 * 1024,
+    on_load=prepare_guild_state
+)
+
 @bot.tree.command(name="варн", description="Выдать предупреждение участнику")
 @app_commands.describe(
     участник="Участник, получающий предупреждение",
@@ -58,11 +205,11 @@ async def warn_member(
         return
     
     user_id = str(участник.id)
-    if user_id not in warnings_data:
-        warnings_data[user_id] = []
+    state = await guild_states.get(interaction.guild.id)
     
     warning = {
-        'id': len(warnings_data[user_id]) + 1,
+        'id': state.next_warning_id(user_id),
+        'guild_id': interaction.guild.id,
         'moderator': interaction.user.name,
         'moderator_id': interaction.user.id,
         'reason': причина,
@@ -71,8 +218,13 @@ async def warn_member(
         'active': True
     }
     
-    warnings_data[user_id].append(warning)
-    save_json(WARNINGS_FILE, warnings_data)
+    user_warnings = state.add_warning(user_id, warning)
+    await storage.save_warnings(interaction.guild.id, user_id, user_warnings)
+    guild_stats.warning_added(interaction.guild.id)
+    mod_journal.record(
+        interaction.guild.id, 'warn', участник.id, interaction.user.id,
+        reason=причина, level=warning['level'], warn_id=warning['id']
+    )
     
     # Автоматические действия по уровню
     actions = {
@@ -100,29 +252,25 @@ async def warn_member(
     embed.add_field(name="Участник", value=участник.mention, inline=True)
     embed.add_field(name="Уровень", value=f"Уровень {уровень}", inline=True)
     embed.add_field(name="Причина", value=причина, inline=False)
-    embed.add_field(name="Всего варнов", value=str(len(warnings_data[user_id])), inline=True)
+    embed.add_field(name="Всего варнов", value=str(len(user_warnings)), inline=True)
     embed.set_footer(text=f"Модератор: {interaction.user.name}")
     
     await interaction.response.send_message(embed=embed)
     
-    # Отправляем DM участнику
-    try:
-        dm_embed = discord.Embed(
-            title="⚠️ Вы получили предупреждение",
-            description=f"На сервере **{interaction.guild.name}**",
-            color=discord.Color.orange()
-        )
-        dm_embed.add_field(name="Причина", value=причина, inline=False)
-        dm_embed.add_field(name="Уровень", value=f"Уровень {уровень}", inline=True)
-        dm_embed.add_field(name="Модератор", value=interaction.user.name, inline=True)
-        dm_embed.set_footer(text="Пожалуйста, соблюдайте правила сервера")
-        await участник.send(embed=dm_embed)
-    except:
-        pass
+    # Уведомляем участника в ЛС (отправка в фоне, закрытые ЛС не мешают)
+    dm_embed = discord.Embed(
+        title="⚠️ Вы получили предупреждение",
+        description=f"На сервере **{interaction.guild.name}**",
+        color=discord.Color.orange()
+    )
+    dm_embed.add_field(name="Причина", value=причина, inline=False)
+    dm_embed.add_field(name="Уровень", value=f"Уровень {уровень}", inline=True)
+    dm_embed.add_field(name="Модератор", value=interaction.user.name, inline=True)
+    dm_embed.set_footer(text="Пожалуйста, соблюдайте правила сервера")
+    dm_outbox.enqueue(участник, dm_embed)
     
     # Автоматическое наказание при 3 предупреждениях
-    active_warnings = [w for w in warnings_data[user_id] if w['active']]
-    if len(active_warnings) >= 3:
+    if state.ledger.active_count(user_id) >= 3:
         await apply_auto_punishment(участник, interaction.user)
 
 @bot.tree.command(name="варны_посмотреть", description="Посмотреть предупреждения участника")
@@ -133,7 +281,8 @@ async def view_warnings(interaction: discord.Interaction, участник: disc
         return
     
     user_id = str(участник.id)
-    user_warnings = warnings_data.get(user_id, [])
+    state = await guild_states.get(interaction.guild.id)
+    user_warnings = state.user_warnings(user_id)
     
     if not user_warnings:
         embed = discord.Embed(
@@ -144,19 +293,30 @@ async def view_warnings(interaction: discord.Interaction, участник: disc
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
     
-    active_warnings = [w for w in user_warnings if w['active']]
-    inactive_warnings = [w for w in user_warnings if not w['active']]
+    active_count = state.ledger.active_count(user_id)
+    inactive_count = len(user_warnings) - active_count
     
     embed = discord.Embed(
         title=f"📋 Предупреждения {участник.name}",
-        description=f"Всего: {len(user_warnings)} | Активных: {len(active_warnings)}",
+        description=(
+            f"Всего: {len(user_warnings)} | Активных: {active_count} | "
+            f"Сумма уровней: {state.ledger.severity_sum(user_id)}"
+        ),
         color=discord.Color.orange(),
         timestamp=datetime.now()
     )
     
-    if active_warnings:
+    if active_count:
+        # Последние 5 активных предупреждений, поиск с конца списка
+        active_warnings = []
+        for warn in reversed(user_warnings):
+            if warn['active']:
+                active_warnings.insert(0, warn)
+                if len(active_warnings) == 5:
+                    break
+        
         active_text = ""
-        for warn in active_warnings[-5:]:  # Последние 5 предупреждений
+        for warn in active_warnings:
             dt = datetime.fromisoformat(warn['timestamp'])
             active_text += (
                 f"**#{warn['id']}** • Уровень {warn['level']}\n"
@@ -165,10 +325,10 @@ async def view_warnings(interaction: discord.Interaction, участник: disc
             )
         embed.add_field(name="🟡 Активные предупреждения", value=active_text, inline=False)
     
-    if inactive_warnings:
+    if inactive_count:
         embed.add_field(
             name="⚪ Снятые предупреждения",
-            value=f"{len(inactive_warnings)} предупреждений снято",
+            value=f"{inactive_count} предупреждений снято или истекло",
             inline=False
         )
     
@@ -186,21 +346,23 @@ async def remove_warning(interaction: discord.Interaction, участник: dis
         return
     
     user_id = str(участник.id)
-    if user_id not in warnings_data or not warnings_data[user_id]:
+    state = await guild_states.get(interaction.guild.id)
+    user_warnings = state.user_warnings(user_id)
+    if not user_warnings:
         await interaction.response.send_message("❌ У участника нет предупреждений", ephemeral=True)
         return
     
     if номер_варна.lower() == 'все':
-        for warn in warnings_data[user_id]:
-            warn['active'] = False
-        count = len(warnings_data[user_id])
+        for warn in user_warnings:
+            deactivate_warning(state, user_id, warn)
+        count = len(user_warnings)
         message = f"✅ Сняты все предупреждения ({count})"
     else:
         try:
             warn_id = int(номер_варна)
-            for warn in warnings_data[user_id]:
+            for warn in user_warnings:
                 if warn['id'] == warn_id:
-                    warn['active'] = False
+                    deactivate_warning(state, user_id, warn)
                     message = f"✅ Предупреждение #{warn_id} снято"
                     break
             else:
@@ -210,7 +372,8 @@ async def remove_warning(interaction: discord.Interaction, участник: dis
             await interaction.response.send_message("❌ Неверный номер предупреждения", ephemeral=True)
             return
     
-    save_json(WARNINGS_FILE, warnings_data)
+    await storage.save_warnings(interaction.guild.id, user_id, user_warnings)
+    mod_journal.record(interaction.guild.id, 'unwarn', участник.id, interaction.user.id, reason=message)
     
     await log_action(
         interaction.guild,
@@ -222,9 +385,45 @@ async def remove_warning(interaction: discord.Interaction, участник: dis
     
     await interaction.response.send_message(f"✅ {message} для {участник.mention}")
 
+def deactivate_warning(state, user_id: str, warn: dict):
+    """Снять предупреждение и обновить счетчики"""
+    if state.ledger.deactivate(user_id, warn):
+        guild_stats.warnings_deactivated(state.guild_id)
+
+async def expire_guild_warnings(state):
+    """Снять истекшие предупреждения одного сервера"""
+    expired = state.ledger.expire_due(state.warnings)
+    for user_id, warn in expired:
+        guild_stats.warnings_deactivated(state.guild_id)
+    for user_id in {user_id for user_id, _ in expired}:
+        await storage.save_warnings(state.guild_id, user_id, state.warnings[user_id])
+
+@tasks.loop(minutes=1)
+async def expire_warnings():
+    """Снятие истекших предупреждений (выгруженные серверы проверяются при загрузке)"""
+    for state in guild_states.resident():
+        await expire_guild_warnings(state)
+
+MUTE_DURATION_HOURS = 24
+# 'role' - роль Muted с правами в каждом канале, 'timeout' - встроенный тайм-аут Discord
+MUTE_MODE = 'role'
+MUTE_OVERWRITE = {'send_messages': False}
+
+# Права роли мута расставляются параллельно и продолжаются после перезапуска
+permission_fanout = PermissionFanout(FANOUT_FILE, persistence, concurrency=5)
+
 async def apply_auto_punishment(member: discord.Member, moderator: discord.User):
     """Автоматическое наказание при 3+ варнах"""
     try:
+        if MUTE_MODE == 'timeout':
+            # Тайм-аут снимается самим Discord, права каналов не трогаются
+            await member.timeout(
+                timedelta(hours=MUTE_DURATION_HOURS),
+                reason="3 активных предупреждения"
+            )
+            mod_journal.record(member.guild.id, 'timeout', member.id, moderator.id, reason="3 активных предупреждения")
+            return
+        
         # Временный мут на 24 часа
         mute_role = discord.utils.get(member.guild.roles, name="Muted")
         if not mute_role:
@@ -235,19 +434,46 @@ async def apply_auto_punishment(member: discord.Member, moderator: discord.User)
                 reason="Автоматическое создание роли для мута"
             )
             
-            # Запрещаем права для всех каналов
-            for channel in member.guild.channels:
-                await channel.set_permissions(mute_role, send_messages=False)
+            # Запрещаем права для всех каналов в фоне, роль выдается сразу
+            permission_fanout.start(member.guild, mute_role, MUTE_OVERWRITE, report_fanout_progress)
         
         await member.add_roles(mute_role, reason="3 активных предупреждения")
+        mod_journal.record(member.guild.id, 'mute', member.id, moderator.id, reason="3 активных предупреждения")
         
-        # Планируем автоматическое снятие мута
-        await asyncio.sleep(24 * 3600)  # 24 часа
-        await member.remove_roles(mute_role, reason="Автоматическое снятие мута")
+        # Планируем автоматическое снятие мута; прежнее снятие сняло бы новый мут раньше срока
+        scheduler.cancel_where('unmute', guild_id=member.guild.id, user_id=member.id)
+        scheduler.schedule(MUTE_DURATION_HOURS * 3600, 'unmute', {
+            'guild_id': member.guild.id,
+            'user_id': member.id,
+            'role_id': mute_role.id
+        })
         
     except Exception as e:
         print(f"Ошибка при автоматическом наказании: {e}")
 
+async def report_fanout_progress(done: int, total: int):
+    """Прогресс настройки прав роли мута"""
+    if done == total or done % 100 == 0:
+        print(f"🔇 Права роли мута: {done}/{total} каналов")
+
+@scheduler.handler('unmute')
+async def scheduled_unmute(payload: dict):
+    """Снятие мута по расписанию"""
+    guild = bot.get_guild(payload['guild_id'])
+    if not guild:
+        return
+    role = guild.get_role(payload['role_id'])
+    if not role:
+        return
+    member = guild.get_member(payload['user_id'])
+    if not member:
+        try:
+            member = await guild.fetch_member(payload['user_id'])
+        except discord.NotFound:
+            return
+    if role in member.roles:
+        await member.remove_roles(role, reason="Автоматическое снятие мута")
+
 # ---------- 2. СИСТЕМА ЛОГИРОВАНИЯ ----------
 @bot.tree.command(name="логи_канал", description="Установить канал для логов")
 @app_commands.describe(канал="Канал для логов")
@@ -257,8 +483,9 @@ async def set_log_channel(interaction: discord.Interaction, канал: discord.
         await interaction.response.send_message("❌ Только администраторы могут настраивать логи", ephemeral=True)
         return
     
-    log_channels[str(interaction.guild.id)] = канал.id
-    save_json(LOG_CHANNEL_FILE, log_channels)
+    state = await guild_states.get(interaction.guild.id)
+    state.log_channel = канал.id
+    await storage.set_log_channel(interaction.guild.id, канал.id)
     
     embed = discord.Embed(
         title="✅ Канал логов установлен",
@@ -267,9 +494,19 @@ async def set_log_channel(interaction: discord.Interaction, канал: discord.
     )
     await interaction.response.send_message(embed=embed)
 
+# Логи копятся по серверам и уходят пачками до 10 эмбедов в одном сообщении
+log_dispatcher = LogDispatcher(max_batch=10, flush_interval=2.0, max_pending=500)
+
+# Личные уведомления копятся по участникам: за окно уходит одно сообщение,
+# дальше не чаще раза в DM_COOLDOWN_SECONDS; закрытые ЛС запоминаются на сутки
+DM_MERGE_SECONDS = 5
+DM_COOLDOWN_SECONDS = 60
+dm_outbox = DMOutbox(bot, merge_window=DM_MERGE_SECONDS, cooldown=DM_COOLDOWN_SECONDS)
+
 async def log_action(guild: discord.Guild, title: str, description: str):
     """Отправить лог в канал"""
-    channel_id = log_channels.get(str(guild.id))
+    state = await guild_states.get(guild.id)
+    channel_id = state.log_channel
     if not channel_id:
         return
     
@@ -277,18 +514,7 @@ async def log_action(guild: discord.Guild, title: str, description: str):
     if not channel:
         return
     
-    embed = discord.Embed(
-        title=title,
-        description=description,
-        color=discord.Color.blurple(),
-        timestamp=datetime.now()
-    )
-    embed.set_footer(text=f"ID сервера: {guild.id}")
-    
-    try:
-        await channel.send(embed=embed)
-    except:
-        pass
+    log_dispatcher.enqueue(channel, title, description)
 
 # ---------- 3. СИСТЕМА МОДЕРАТОРСКИХ РОЛЕЙ ----------
 @bot.tree.command(name="мод_роль_добавить", description="Добавить роль модератора")
@@ -299,35 +525,51 @@ async def add_mod_role(interaction: discord.Interaction, роль: discord.Role)
         await interaction.response.send_message("❌ Только администраторы могут добавлять мод роли", ephemeral=True)
         return
     
-    guild_id = str(interaction.guild.id)
-    if guild_id not in mod_roles:
-        mod_roles[guild_id] = {'roles': []}
-    
-    if роль.id not in mod_roles[guild_id]['roles']:
-        mod_roles[guild_id]['roles'].append(роль.id)
-        save_json(MOD_ROLES_FILE, mod_roles)
+    state = await guild_states.get(interaction.guild.id)
+    if роль.id not in state.mod_roles:
+        state.mod_roles.append(роль.id)
+        await storage.set_mod_roles(interaction.guild.id, state.mod_roles)
+        mod_cache.invalidate_guild(interaction.guild.id)
         await interaction.response.send_message(f"✅ Роль {роль.mention} добавлена как модераторская")
     else:
         await interaction.response.send_message("❌ Эта роль уже является модераторской", ephemeral=True)
 
+# Модераторские роли сервера и статус участников проверяются за O(1)
+def guild_mod_roles(guild_id: int):
+    state = guild_states.peek(guild_id)
+    return state.mod_roles if state is not None else None
+
+mod_cache = ModPermissionCache(guild_mod_roles, max_members=10000)
+
 async def check_mod_permissions(interaction: discord.Interaction) -> bool:
     """Проверка прав модератора"""
-    if interaction.user.guild_permissions.administrator:
+    await guild_states.get(interaction.guild.id)
+    if mod_cache.is_mod(interaction.user):
         return True
     
-    guild_id = str(interaction.guild.id)
-    if guild_id in mod_roles:
-        for role_id in mod_roles[guild_id]['roles']:
-            role = interaction.guild.get_role(role_id)
-            if role and role in interaction.user.roles:
-                return True
-    
     await interaction.response.send_message(
         "❌ У вас недостаточно прав для выполнения этой команды",
         ephemeral=True
     )
     return False
 
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    """Сброс кэша прав при изменении ролей участника"""
+    if before.roles != after.roles:
+        mod_cache.invalidate_member(after.guild.id, after.id)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    """Сброс кэша прав при удалении роли"""
+    mod_cache.invalidate_guild(role.guild.id)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    """Сброс кэша прав при изменении прав роли"""
+    if before.permissions != after.permissions:
+        mod_cache.invalidate_guild(after.guild.id)
+
 # ---------- 4. СИСТЕМА АВТОМОДЕРАЦИИ ----------
 @bot.event
 async def on_message(message: discord.Message):
@@ -335,90 +577,176 @@ async def on_message(message: discord.Message):
     if message.author.bot:
         return
     
-    # Проверка на спам
-    if await check_spam(message):
-        await message.delete()
-        await message.channel.send(
-            f"{message.author.mention}, пожалуйста, не спамьте!",
-            delete_after=5
-        )
+    if message.guild is None:
+        await bot.process_commands(message)
         return
     
-    # Проверка на плохие слова
-    bad_words = await load_bad_words()
-    if bad_words and await contains_bad_words(message.content, bad_words):
-        await message.delete()
-        await message.author.send(
-            f"Ваше сообщение на сервере {message.guild.name} было удалено "
-            f"из-за нарушения правил общения."
+    # Сначала дешевые проверки текста, затем состояние; действие выполняется одно
+    start = time.perf_counter()
+    verdict = automod.run(message)
+    MESSAGE_SECONDS.observe(time.perf_counter() - start)
+    if verdict:
+        rule, reason = verdict
+        try:
+            await AUTOMOD_ACTIONS[rule.action](message, reason)
+        except discord.HTTPException as e:
+            print(f"Ошибка действия автомодерации {rule.name}: {e}")
+            return
+        mod_journal.record(
+            message.guild.id, f'automod:{rule.name}', message.author.id,
+            reason=reason, channel_id=message.channel.id
         )
         return
     
     await bot.process_commands(message)
 
-async def check_spam(message: discord.Message) -> bool:
-    """Проверка на спам"""
-    # Простая проверка на повторяющиеся сообщения
-    recent_messages = []
-    async for msg in message.channel.history(limit=5):
-        if msg.author == message.author and not msg.author.bot:
-            recent_messages.append(msg.content)
-    
-    if len(recent_messages) >= 3 and all(msg == message.content for msg in recent_messages[-2:]):
-        return True
-    
-    # Проверка на слишком много упоминаний
-    if len(message.mentions) > 5:
-        return True
-    
-    return False
+# Последние сообщения хранятся локально, без запросов истории канала
+spam_tracker = SpamTracker(
+    history_size=5,
+    repeat_count=3,
+    flood_count=5,
+    flood_window=5.0,
+    max_mentions=5,
+    idle_ttl=300.0
+)
 
-async def load_bad_words():
-    """Загрузка списка запрещенных слов"""
-    try:
-        with open('bad_words.txt', 'r', encoding='utf-8') as f:
-            return [line.strip().lower() for line in f if line.strip()]
-    except:
-        return []
-
-async def contains_bad_words(text: str, bad_words: list) -> bool:
-    """Проверка на запрещенные слова"""
-    text_lower = text.lower()
-    for word in bad_words:
-        if word in text_lower:
-            return True
-    return False
+# Похожие сообщения по всему серверу за минуту и частота входов для режима рейда
+duplicate_index = NearDuplicateIndex(window=60.0, max_distance=6, min_length=20)
+join_tracker = JoinRateTracker(threshold=10, window=10.0, raid_duration=600.0)
+
+BAD_WORDS_FILE = 'bad_words.txt'
+BAD_WORDS_NORMALIZE = True  # Учитывать гомоглифы, leetspeak и латиницу вместо кириллицы
+
+# Список компилируется один раз и перечитывается только при изменении файла
+bad_words_matcher = BadWordsMatcher(BAD_WORDS_FILE, normalize_text=BAD_WORDS_NORMALIZE)
+
+def observe_automod(rule, elapsed: float, hit: bool):
+    stage = STAGE_NAMES[rule.stage]
+    AUTOMOD_SECONDS.observe(elapsed, stage, rule.name)
+    if hit:
+        AUTOMOD_HITS.inc(stage, rule.name)
+
+def automod_config(guild_id: int) -> dict:
+    """Пороги автомодерации: общие из server_rules.json и переопределения сервера"""
+    config = dict(rules_data.get('auto_moderation', {}))
+    config.update(config.pop('guilds', {}).get(str(guild_id), {}))
+    return config
+
+# Порядок внутри стадии: упоминания и капс дешевле поиска слов, спам трогает буферы авторов
+automod = AutomodPipeline(
+    [
+        MentionsRule(),
+        CapsRule(),
+        BadWordsRule(bad_words_matcher),
+        SpamRule(spam_tracker),
+        NearDuplicateRule(duplicate_index, join_tracker)
+    ],
+    automod_config,
+    observer=observe_automod
+)
+
+async def delete_for_spam(message: discord.Message, reason: str):
+    await message.delete()
+    await message.channel.send(
+        f"{message.author.mention}, пожалуйста, не спамьте!",
+        delete_after=5
+    )
+
+async def delete_for_caps(message: discord.Message, reason: str):
+    await message.delete()
+    await message.channel.send(
+        f"{message.author.mention}, пожалуйста, не пишите капсом!",
+        delete_after=5
+    )
+
+async def delete_for_bad_words(message: discord.Message, reason: str):
+    await message.delete()
+    # Повторные удаления за окно склеиваются в одно ЛС со счетчиком
+    dm_outbox.enqueue(message.author, discord.Embed(
+        title="🚫 Сообщение удалено",
+        description=f"Ваше сообщение на сервере **{message.guild.name}** было удалено "
+                    f"из-за нарушения правил общения.",
+        color=discord.Color.red()
+    ))
+
+async def delete_for_raid(message: discord.Message, reason: str):
+    await message.delete()
+    await log_action(
+        message.guild,
+        "🚨 МАССОВАЯ РАССЫЛКА",
+        f"**Участник:** {message.author.mention}\n"
+        f"**Канал:** {message.channel.mention}\n"
+        f"**Причина:** похожие сообщения {'от разных участников' if reason == 'raid' else 'в разных каналах'}"
+    )
+
+AUTOMOD_ACTIONS = {
+    'spam': delete_for_spam,
+    'raid': delete_for_raid,
+    'caps': delete_for_caps,
+    'bad_words': delete_for_bad_words
+}
 
 # ---------- 5. СИСТЕМА ТИКЕТОВ ----------
 TICKET_CATEGORY_NAME = "🎫 ТИКЕТЫ"
+TICKET_AUTO_CLOSE_HOURS = 0  # Через сколько часов закрывать тикет автоматически (0 - не закрывать)
+TICKET_POOL_SIZE = 0  # Сколько скрытых каналов держать наготове (0 - создавать канал на каждый тикет)
+
+ticket_categories = {}
+ticket_pool = TicketChannelPool(TICKET_POOL_SIZE)
+
+async def get_ticket_category(guild: discord.Guild) -> discord.CategoryChannel:
+    """Категория тикетов (ID кэшируется)"""
+    category = guild.get_channel(ticket_categories.get(guild.id, 0))
+    if not category:
+        # Ищем или создаем категорию для тикетов
+        category = discord.utils.get(guild.categories, name=TICKET_CATEGORY_NAME)
+        if not category:
+            category = await guild.create_category_channel(TICKET_CATEGORY_NAME)
+        ticket_categories[guild.id] = category.id
+        ticket_pool.discover(category)
+    return category
+
+def ticket_overwrites(guild: discord.Guild, user: discord.Member) -> dict:
+    """Права доступа к каналу тикета"""
+    overwrites = {
+        guild.default_role: discord.PermissionOverwrite(view_channel=False),
+        guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, manage_channels=True),
+        user: discord.PermissionOverwrite(view_channel=True, send_messages=True)
+    }
+    
+    # Добавляем права для модераторов
+    for role_id in mod_cache.role_ids(guild.id):
+        role = guild.get_role(role_id)
+        if role:
+            overwrites[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True)
+    return overwrites
 
 @bot.tree.command(name="тикет", description="Создать тикет для обращения")
 @app_commands.describe(тема="Тема тикета", описание="Подробное описание проблемы")
 async def create_ticket(interaction: discord.Interaction, тема: str, описание: str):
     """Создание тикета"""
-    # Ищем или создаем категорию для тикетов
-    category = discord.utils.get(interaction.guild.categories, name=TICKET_CATEGORY_NAME)
-    if not category:
-        category = await interaction.guild.create_category_channel(TICKET_CATEGORY_NAME)
-    
-    # Создаем канал для тикета
-    ticket_channel = await interaction.guild.create_text_channel(
-        name=f"тикет-{interaction.user.name}",
-        category=category,
-        topic=f"Тикет от {interaction.user.name} | Тема: {тема}"
-    )
+    # Отвечаем сразу, чтобы взаимодействие не истекло, пока создается канал
+    await interaction.response.defer(ephemeral=True, thinking=True)
     
-    # Настраиваем права доступа
-    await ticket_channel.set_permissions(interaction.guild.default_role, view_channel=False)
-    await ticket_channel.set_permissions(interaction.user, view_channel=True, send_messages=True)
-    
-    # Добавляем права для модераторов
-    guild_id = str(interaction.guild.id)
-    if guild_id in mod_roles:
-        for role_id in mod_roles[guild_id]['roles']:
-            role = interaction.guild.get_role(role_id)
-            if role:
-                await ticket_channel.set_permissions(role, view_channel=True, send_messages=True)
+    guild = interaction.guild
+    category = await get_ticket_category(guild)
+    await guild_states.get(guild.id)
+    name = f"тикет-{interaction.user.name}"
+    topic = f"Тикет от {interaction.user.name} | Тема: {тема}"
+    overwrites = ticket_overwrites(guild, interaction.user)
+    
+    # Свободный канал из пула открывается одним изменением, иначе создаем новый сразу с правами
+    ticket_channel = ticket_pool.take(guild)
+    if ticket_channel:
+        await ticket_channel.edit(name=name, topic=topic, overwrites=overwrites)
+    else:
+        ticket_channel = await guild.create_text_channel(
+            name=name,
+            category=category,
+            topic=topic,
+            overwrites=overwrites
+        )
+    ticket_pool.schedule_refill(category)
     
     # Создаем сообщение в тикете
     embed = discord.Embed(
@@ -431,42 +759,95 @@ async def create_ticket(interaction: discord.Interaction, тема: str, опи
     embed.add_field(name="Статус", value="🔓 Открыт", inline=True)
     embed.set_footer(text=f"ID тикета: {ticket_channel.id}")
     
-    await ticket_channel.send(f"{interaction.user.mention}", embed=embed)
+    # Сообщение и кнопки управления тикетом отправляются одним запросом
+    await ticket_channel.send(f"{interaction.user.mention}", embed=embed, view=TicketView())
     
-    # Кнопки для управления тикетом
-    view = TicketView()
-    await ticket_channel.send("Управление тикетом:", view=view)
+    if TICKET_AUTO_CLOSE_HOURS:
+        scheduler.schedule(TICKET_AUTO_CLOSE_HOURS * 3600, 'ticket_close', {
+            'guild_id': guild.id,
+            'channel_id': ticket_channel.id
+        })
     
-    await interaction.response.send_message(
+    await interaction.followup.send(
         f"✅ Тикет создан: {ticket_channel.mention}",
         ephemeral=True
     )
 
+@scheduler.handler('ticket_close')
+async def scheduled_ticket_close(payload: dict):
+    """Автоматическое закрытие тикета"""
+    guild = bot.get_guild(payload['guild_id'])
+    channel = guild.get_channel(payload['channel_id']) if guild else None
+    if channel:
+        await channel.delete(reason="Автоматическое закрытие тикета")
+        mod_journal.record(guild.id, 'ticket_close', channel_id=channel.id, reason="Автоматическое закрытие")
+
 class TicketView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
     
-    @discord.ui.button(label="🔒 Закрыть", style=discord.ButtonStyle.red)
+    @discord.ui.button(label="🔒 Закрыть", style=discord.ButtonStyle.red, custom_id="ticket:close")
     async def close_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
         if await check_mod_permissions(interaction):
             await interaction.channel.delete()
+            mod_journal.record(
+                interaction.guild.id, 'ticket_close', moderator_id=interaction.user.id,
+                channel_id=interaction.channel.id
+            )
     
-    @discord.ui.button(label="📋 Добавить участника", style=discord.ButtonStyle.green)
+    @discord.ui.button(label="📋 Добавить участника", style=discord.ButtonStyle.green, custom_id="ticket:add_member")
     async def add_member(self, interaction: discord.Interaction, button: discord.ui.Button):
         if await check_mod_permissions(interaction):
             # Здесь можно реализовать добавление участника
             await interaction.response.send_message("Функция в разработке", ephemeral=True)
 
 # ---------- 6. СИСТЕМА СТАТИСТИКИ ----------
+# Счетчики обновляются по событиям, команда только читает их
+guild_stats = GuildStatsTracker(TICKET_CATEGORY_NAME, ticket_pool.is_reserved)
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    guild_stats.member_joined(member)
+    if join_tracker.member_joined(member.guild.id):
+        await log_action(
+            member.guild,
+            "🚨 РЕЖИМ РЕЙДА",
+            f"{join_tracker.threshold} и больше входов за {join_tracker.window:.0f} с. "
+            f"Порог похожих сообщений снижен на {join_tracker.raid_duration / 60:.0f} мин."
+        )
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    guild_stats.member_left(member)
+
+@bot.event
+async def on_presence_update(before: discord.Member, after: discord.Member):
+    guild_stats.presence_changed(before, after)
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    guild_stats.channel_created(channel)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    guild_stats.channel_deleted(channel)
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    guild_stats.channel_updated(before, after)
+
 @bot.tree.command(name="статистика", description="Статистика сервера и бота")
 async def server_stats(interaction: discord.Interaction):
     """Статистика сервера"""
     guild = interaction.guild
+    # Счетчики варнов сервера пересчитываются при загрузке его данных
+    await guild_states.get(guild.id)
+    stats = guild_stats.snapshot(guild)
     
     # Статистика участников
     total_members = guild.member_count
-    online_members = sum(1 for m in guild.members if m.status != discord.Status.offline)
-    bot_count = sum(1 for m in guild.members if m.bot)
+    online_members = stats.online
+    bot_count = stats.bots
     
     # Статистика каналов
     text_channels = len(guild.text_channels)
@@ -478,11 +859,8 @@ async def server_stats(interaction: discord.Interaction):
     total_categories = len(rules_data['categories'])
     
     # Статистика предупреждений
-    total_warnings = sum(len(warns) for warns in warnings_data.values())
-    active_warnings = sum(
-        1 for warns in warnings_data.values() 
-        for w in warns if w.get('active', False)
-    )
+    total_warnings = stats.warnings_total
+    active_warnings = stats.warnings_active
     
     embed = discord.Embed(
         title="📊 СТАТИСТИКА СЕРВЕРА",
@@ -503,7 +881,7 @@ async def server_stats(interaction: discord.Interaction):
                    inline=True)
     
     embed.add_field(name="⚠️ Предупреждения", 
-                   value=f"Всего: {total_warnings}\nАктивных: {active_warnings}", 
+                   value=f"Всего: {total_warnings}\nАктивных: {active_warnings}\nОткрытых тикетов: {stats.tickets_open}", 
                    inline=True)
     
     embed.add_field(name="📅 Создание сервера", 
@@ -520,33 +898,98 @@ async def server_stats(interaction: discord.Interaction):
     await interaction.response.send_message(embed=embed)
 
 # ---------- 7. АВТОМАТИЧЕСКИЕ НАПОМИНАНИЯ ----------
-@tasks.loop(hours=24)
+REMINDER_CHANNEL_NAME = "правила"
+REMINDER_TIMEZONE = 'Europe/Moscow'  # Часовой пояс по умолчанию
+REMINDER_HOUR = 12  # Местный час отправки по умолчанию
+REMINDER_WINDOW_MINUTES = 30  # Отправки серверов разносятся по этому окну
+
+reminders = ReminderScheduler(
+    REMINDERS_FILE,
+    persistence,
+    default_timezone=REMINDER_TIMEZONE,
+    default_hour=REMINDER_HOUR,
+    window_minutes=REMINDER_WINDOW_MINUTES,
+    concurrency=5
+)
+
+def get_rules_channel(guild: discord.Guild) -> Optional[discord.TextChannel]:
+    """Канал правил сервера (ID кэшируется)"""
+    channel = guild.get_channel(reminders.channel_id(guild.id) or 0)
+    if not channel:
+        channel = discord.utils.get(guild.text_channels, name=REMINDER_CHANNEL_NAME)
+        reminders.cache_channel(guild.id, channel.id if channel else None)
+    return channel
+
+async def send_rules_reminder(guild_id: int) -> bool:
+    """Отправить напоминание на сервер"""
+    guild = bot.get_guild(guild_id)
+    rules_channel = get_rules_channel(guild) if guild else None
+    if not rules_channel:
+        # Канала нет - считаем день обработанным, чтобы не искать его каждые 5 минут
+        return True
+    
+    embed = discord.Embed(
+        title="📢 Ежедневное напоминание",
+        description="Не забывайте соблюдать правила сервера!",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(
+        name="Основные правила:",
+        value="• Будьте уважительны\n• Не спамьте\n• Соблюдайте тематику каналов",
+        inline=False
+    )
+    embed.set_footer(text="Приятного общения!")
+    
+    try:
+        await rules_channel.send(embed=embed)
+    except (discord.Forbidden, discord.NotFound) as e:
+        # Нет доступа или канал удален - день тоже считается обработанным, повтор будет завтра
+        reminders.cache_channel(guild_id, None)
+        print(f"Напоминание на сервере {guild_id} не отправлено: {e}")
+    return True
+
+@tasks.loop(minutes=5)
 async def daily_rules_reminder():
     """Ежедневное напоминание о правилах"""
-    for guild in bot.guilds:
-        rules_channel = discord.utils.get(guild.text_channels, name="правила")
-        if rules_channel:
-            embed = discord.Embed(
-                title="📢 Ежедневное напоминание",
-                description="Не забывайте соблюдать правила сервера!",
-                color=discord.Color.blue(),
-                timestamp=datetime.now()
-            )
-            embed.add_field(
-                name="Основные правила:",
-                value="• Будьте уважительны\n• Не спамьте\n• Соблюдайте тематику каналов",
-                inline=False
-            )
-            embed.set_footer(text="Приятного общения!")
-            
-            try:
-                await rules_channel.send(embed=embed)
-            except:
-                pass
+    reminders.tick([guild.id for guild in bot.guilds], send_rules_reminder)
+
+@bot.tree.command(name="напоминание_настроить", description="Время ежедневного напоминания о правилах")
+@app_commands.describe(
+    часовой_пояс="Часовой пояс, например Europe/Moscow",
+    час="Местный час отправки (0-23)"
+)
+async def setup_reminder(interaction: discord.Interaction, часовой_пояс: str, час: int):
+    """Настройка напоминания о правилах"""
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Только администраторы могут настраивать напоминания", ephemeral=True)
+        return
+    
+    if not 0 <= час <= 23:
+        await interaction.response.send_message("❌ Час должен быть от 0 до 23", ephemeral=True)
+        return
+    
+    try:
+        reminders.configure(interaction.guild.id, часовой_пояс, час)
+    except pytz.UnknownTimeZoneError:
+        await interaction.response.send_message("❌ Неизвестный часовой пояс", ephemeral=True)
+        return
+    
+    await interaction.response.send_message(
+        f"✅ Напоминание будет приходить в {час}:00 ({часовой_пояс})",
+        ephemeral=True
+    )
 
 # ---------- 8. СИСТЕМА ВЕРИФИКАЦИИ ----------
 VERIFICATION_ROLE_NAME = "✅ Проверенный"
 
+# message_id -> {'guild_id', 'channel_id', 'role_id'}: сообщения с кнопкой верификации
+verification_messages = load_json(VIEWS_FILE)
+persistence.register(VIEWS_FILE, lambda: verification_messages)
+
+# Роли выдаются очередью, чтобы волна нажатий не превращалась в волну запросов
+verification_queue = RoleAssignQueue(workers=3)
+
 @bot.tree.command(name="верификация", description="Настроить систему верификации")
 @app_commands.describe(канал="Канал для верификации", роль="Роль после верификации")
 async def setup_verification(interaction: discord.Interaction, канал: discord.TextChannel, роль: discord.Role):
@@ -564,20 +1007,45 @@ async def setup_verification(interaction: discord.Interaction, канал: disco
         color=discord.Color.green()
     )
     
-    view = VerificationView(роль)
-    await канал.send(embed=embed, view=view)
+    view = VerificationView(роль.id)
+    
+    # Если в канале уже есть сообщение верификации, обновляем его вместо нового
+    message = None
+    for message_id, info in list(verification_messages.items()):
+        if info['channel_id'] == канал.id:
+            try:
+                message = await канал.get_partial_message(int(message_id)).edit(embed=embed, view=view)
+            except discord.NotFound:
+                del verification_messages[message_id]
+            break
+    if message is None:
+        message = await канал.send(embed=embed, view=view)
+    
+    verification_messages[str(message.id)] = {
+        'guild_id': interaction.guild.id,
+        'channel_id': канал.id,
+        'role_id': роль.id
+    }
+    persistence.mark_dirty(VIEWS_FILE)
+    bot.add_view(view, message_id=message.id)
     
     await interaction.response.send_message(f"✅ Система верификации настроена в {канал.mention}", ephemeral=True)
 
 class VerificationView(discord.ui.View):
-    def __init__(self, role: discord.Role):
+    def __init__(self, role_id: int):
         super().__init__(timeout=None)
-        self.role = role
+        self.role_id = role_id
+        # Постоянный custom_id: кнопка продолжает работать после перезапуска
+        self.verify_button.custom_id = f"verification:{role_id}"
     
     @discord.ui.button(label="✅ Пройти верификацию", style=discord.ButtonStyle.green)
     async def verify_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.role not in interaction.user.roles:
-            await interaction.user.add_roles(self.role)
+        role = interaction.guild.get_role(self.role_id)
+        if not role:
+            await interaction.response.send_message("❌ Роль верификации не найдена", ephemeral=True)
+            return
+        if role not in interaction.user.roles:
+            verification_queue.enqueue(interaction.user, role, reason="Верификация")
             embed = discord.Embed(
                 title="✅ Верификация пройдена!",
                 description=f"Добро пожаловать на сервер, {interaction.user.mention}!",
@@ -587,6 +1055,12 @@ class VerificationView(discord.ui.View):
         else:
             await interaction.response.send_message("Вы уже верифицированы!", ephemeral=True)
 
+def register_persistent_views():
+    """Подключить кнопки сообщений, отправленных до перезапуска"""
+    bot.add_view(TicketView())
+    for message_id, info in verification_messages.items():
+        bot.add_view(VerificationView(info['role_id']), message_id=int(message_id))
+
 # ---------- 9. КОМАНДА ПОМОЩИ С ПАГИНАЦИЕЙ ----------
 @bot.tree.command(name="помощь", description="Показать все команды бота")
 async def help_command(interaction: discord.Interaction):
@@ -623,6 +1097,7 @@ async def help_command(interaction: discord.Interaction):
             "`/варн` - Выдать предупреждение\n"
             "`/варны_посмотреть` - Посмотреть варны\n"
             "`/варн_снять` - Снять варн\n"
+            "`/журнал` - История модерации\n"
             "`/мод_роль_добавить` - Добавить мод роль"
         ),
         inline=False
@@ -641,7 +1116,8 @@ async def help_command(interaction: discord.Interaction):
             "`/тикет` - Создать тикет\n"
             "`/статистика` - Статистика сервера\n"
             "`/логи_канал` - Настроить логи\n"
-            "`/верификация` - Настроить верификацию"
+            "`/верификация` - Настроить верификацию\n"
+            "`/напоминание_настроить` - Время напоминания о правилах"
         ),
         inline=False
     )
@@ -674,41 +1150,412 @@ class PaginationView(discord.ui.View):
         await interaction.message.delete()
 
 # ---------- 10. BACKUP И ВОССТАНОВЛЕНИЕ ----------
-@bot.tree.command(name="бэкап", description="Создать резервную копию правил")
+SNAPSHOT_DIRECTORY = 'snapshots'
+SNAPSHOT_INTERVAL_HOURS = 6
+# Полный снимок раз в SNAPSHOT_FULL_EVERY автоматических, между ними только изменения
+SNAPSHOT_FULL_EVERY = 8
+SNAPSHOT_KEEP_CHAINS = 3
+
+snapshot_store = SnapshotStore(SNAPSHOT_DIRECTORY, full_every=SNAPSHOT_FULL_EVERY, keep_chains=SNAPSHOT_KEEP_CHAINS)
+# Серверы, загруженные в память после своего последнего автоматического снимка
+snapshot_candidates = set()
+
+async def snapshot_sections(guild_id: int, load: bool = True) -> dict:
+    """Все данные сервера для снимка: варны, настройки, правила и отложенные задачи.
+    load=False - выгруженный сервер читается прямо из хранилища, без загрузки в кэш"""
+    if load:
+        state = await guild_states.get(guild_id)
+        partition = {'warnings': state.warnings, 'log_channel': state.log_channel, 'mod_roles': state.mod_roles}
+    else:
+        partition = await guild_states.read(guild_id)
+    return {
+        'warnings': partition['warnings'],
+        'settings': {'log_channel': partition['log_channel'], 'mod_roles': partition['mod_roles']},
+        'rules': {rule_id: rule for rule_id, rule in rules_data['rules'].items() if rule.get('guild_id') == guild_id},
+        'jobs': {str(job_id): job for job_id, job in scheduler.guild_jobs(guild_id).items()}
+    }
+
+def replace_guild_rules(guild_id: int, rules: dict):
+    """Заменить правила сервера; номера, занятые другими серверами, выдаются заново"""
+    for rule_id in [r for r, rule in rules_data['rules'].items() if rule.get('guild_id') == guild_id]:
+        del rules_data['rules'][rule_id]
+    next_id = max((int(r) for r in list(rules_data['rules']) + list(rules)), default=0) + 1
+    index = rules_indexes[guild_id] = RulesIndex()
+    for rule_id, rule in rules.items():
+        if rule_id in rules_data['rules']:
+            rule_id, next_id = str(next_id), next_id + 1
+        rules_data['rules'][rule_id] = rule
+        category = rule.get('category', 'Общие')
+        if category not in rules_data['categories']:
+            rules_data['categories'].append(category)
+        index.add(rule_id, rule['text'], category)
+    persistence.mark_dirty(worker_file(RULES_FILE))
+
+async def restore_snapshot(guild_id: int, sections: dict):
+    """Подменить данные сервера проверенным снимком"""
+    # Правила, задачи и кэш ролей меняются без await, затем раздел сервера целиком
+    replace_guild_rules(guild_id, sections['rules'])
+    scheduler.replace_guild_jobs(guild_id, list(sections['jobs'].values()))
+    mod_cache.invalidate_guild(guild_id)
+    await guild_states.replace(guild_id, {
+        'warnings': sections['warnings'],
+        'log_channel': sections['settings']['log_channel'],
+        'mod_roles': sections['settings']['mod_roles']
+    })
+
+@tasks.loop(hours=SNAPSHOT_INTERVAL_HOURS)
+async def periodic_snapshots():
+    """Автоматические снимки серверов (без изменений снимок не пишется)"""
+    for guild in bot.guilds:
+        # Сервер, который с запуска ни разу не загружался, не менялся: ждем его первой загрузки.
+        # Правила и задачи такого сервера попадут в снимок вместе с ним
+        if guild.id not in guild_states and guild.id not in snapshot_candidates:
+            continue
+        try:
+            # Выгруженный после изменений сервер снимается прямо из хранилища, кэш не трогаем
+            sections = await snapshot_sections(guild.id, load=False)
+            snapshot_candidates.discard(guild.id)
+            await snapshot_store.save(guild.id, sections)
+        except Exception as e:
+            snapshot_candidates.add(guild.id)
+            print(f"Ошибка снимка сервера {guild.id}: {e}")
+
+@bot.tree.command(name="бэкап", description="Создать резервную копию данных сервера")
 async def backup_rules(interaction: discord.Interaction):
-    """Создание бэкапа правил"""
+    """Создание бэкапа: варны, мод роли, канал логов, правила и задачи сервера"""
     if not await check_mod_permissions(interaction):
         return
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"backup_rules_{timestamp}.json"
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(rules_data, f, ensure_ascii=False, indent=2)
+    sections = await snapshot_sections(interaction.guild.id)
+    # Сериализация сразу, сжатие в потоке; файл собирается в памяти
+    data = serialize(full_snapshot(interaction.guild.id, sections))
+    compressed = await asyncio.to_thread(compress, data)
     
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"backup_{interaction.guild.id}_{timestamp}.json.gz"
     await interaction.response.send_message(
         f"✅ Бэкап создан: `{filename}`",
-        file=discord.File(filename)
+        file=discord.File(io.BytesIO(compressed), filename=filename)
+    )
+
+@bot.tree.command(name="бэкап_список", description="Автоматические снимки данных сервера")
+async def list_snapshots(interaction: discord.Interaction):
+    """Список сохраненных снимков"""
+    if not await check_mod_permissions(interaction):
+        return
+    
+    entries = await snapshot_store.list(interaction.guild.id)
+    if not entries:
+        await interaction.response.send_message("Снимков пока нет", ephemeral=True)
+        return
+    
+    lines = [
+        f"`{entry['name']}` - {entry['created_at'][:16].replace('T', ' ')}, изменений: {entry['changes']}"
+        for entry in reversed(entries[-20:])
+    ]
+    embed = discord.Embed(title="🗄️ Снимки сервера", description="\n".join(lines), color=discord.Color.blue())
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="восстановить", description="Восстановить данные сервера из снимка")
+@app_commands.describe(
+    файл="Файл бэкапа (.json.gz)",
+    снимок="Название автоматического снимка из /бэкап_список"
+)
+async def restore_backup(
+    interaction: discord.Interaction,
+    файл: Optional[discord.Attachment] = None,
+    снимок: Optional[str] = None
+):
+    """Восстановление из бэкапа или автоматического снимка"""
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Только администраторы могут восстанавливать данные", ephemeral=True)
+        return
+    if (файл is None) == (снимок is None):
+        await interaction.response.send_message("❌ Укажите либо файл, либо название снимка", ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    guild_id = interaction.guild.id
+    try:
+        if файл is not None:
+            if файл.size > MAX_SNAPSHOT_BYTES:
+                raise ValueError("файл слишком большой")
+            snapshot = await asyncio.to_thread(decompress, await файл.read())
+        else:
+            snapshot = await snapshot_store.load(guild_id, снимок)
+        validate(snapshot, guild_id, scheduler.kinds())
+    except Exception as e:
+        await interaction.followup.send(f"❌ Снимок не восстановлен: {e}", ephemeral=True)
+        return
+    
+    # Текущее состояние сохраняется полным снимком, чтобы восстановление можно было отменить
+    before = await snapshot_store.save(guild_id, await snapshot_sections(guild_id), full=True)
+    sections = snapshot['sections']
+    await restore_snapshot(guild_id, sections)
+    
+    await log_action(
+        interaction.guild,
+        "🗄️ ВОССТАНОВЛЕНИЕ ДАННЫХ",
+        f"**Администратор:** {interaction.user.mention}\n"
+        f"**Снимок от:** {snapshot['created_at'][:16].replace('T', ' ')}\n"
+        f"**Прежние данные:** `{before['name']}`"
     )
+    await interaction.followup.send(
+        f"✅ Восстановлено: варны {sum(len(w) for w in sections['warnings'].values())}, "
+        f"правила {len(sections['rules'])}, задачи {len(sections['jobs'])}, "
+        f"мод роли {len(sections['settings']['mod_roles'])}.\n"
+        f"Прежние данные сохранены в снимке `{before['name']}`",
+        ephemeral=True
+    )
+
+# ---------- 11. ПОИСК ПО ПРАВИЛАМ ----------
+# Отдельный индекс на каждый сервер, обновляется при добавлении правил
+rules_indexes = defaultdict(RulesIndex)
+for rule_id, rule in rules_data['rules'].items():
+    rules_indexes[rule.get('guild_id', 0)].add(rule_id, rule['text'], rule.get('category', ''))
+persistence.register(worker_file(RULES_FILE), lambda: rules_data)
+
+@bot.tree.command(name="правило_добавить", description="Добавить правило")
+@app_commands.describe(текст="Текст правила", категория="Категория правила")
+async def add_rule(interaction: discord.Interaction, текст: str, категория: str = "Общие"):
+    """Добавить правило"""
+    if not await check_mod_permissions(interaction):
+        return
+    
+    rule_id = str(max((int(r) for r in rules_data['rules']), default=0) + 1)
+    rules_data['rules'][rule_id] = {
+        'text': текст,
+        'category': категория,
+        'guild_id': interaction.guild.id,
+        'author_id': interaction.user.id,
+        'timestamp': datetime.now().isoformat()
+    }
+    if категория not in rules_data['categories']:
+        rules_data['categories'].append(категория)
+    rules_indexes[interaction.guild.id].add(rule_id, текст, категория)
+    persistence.mark_dirty(worker_file(RULES_FILE))
     
-    # Удаляем временный файл
-    os.remove(filename)
+    await interaction.response.send_message(f"✅ Правило #{rule_id} добавлено в категорию **{категория}**")
+
+@bot.tree.command(name="правило_найти", description="Найти правило")
+@app_commands.describe(запрос="Слова для поиска")
+async def find_rule(interaction: discord.Interaction, запрос: str):
+    """Поиск правил по тексту и категориям"""
+    results = rules_indexes[interaction.guild.id].search(запрос, limit=5)
+    if not results:
+        await interaction.response.send_message("❌ Ничего не найдено", ephemeral=True)
+        return
+    
+    embed = discord.Embed(
+        title=f"🔍 Поиск: {запрос}",
+        color=discord.Color.blue()
+    )
+    for rule_id, score in results:
+        rule = rules_data['rules'][rule_id]
+        embed.add_field(
+            name=f"#{rule_id} • {rule.get('category', 'Общие')}",
+            value=rule['text'][:1024],
+            inline=False
+        )
+    await interaction.response.send_message(embed=embed)
+
+@bot.tree.command(name="правила_список", description="Список категорий правил")
+@app_commands.describe(категория="Показать правила этой категории")
+async def list_rules(interaction: discord.Interaction, категория: Optional[str] = None):
+    """Список категорий или правил категории"""
+    guild_rules = [
+        (rule_id, rule) for rule_id, rule in rules_data['rules'].items()
+        if rule.get('guild_id') == interaction.guild.id
+    ]
+    
+    embed = discord.Embed(title="📜 Правила сервера", color=discord.Color.blue())
+    if категория:
+        text = "\n".join(
+            f"**#{rule_id}** {rule['text']}" for rule_id, rule in guild_rules
+            if rule.get('category') == категория
+        )
+        embed.add_field(name=категория, value=text[:1024] or "Нет правил", inline=False)
+    else:
+        counts = defaultdict(int)
+        for _, rule in guild_rules:
+            counts[rule.get('category', 'Общие')] += 1
+        text = "\n".join(f"• {name}: {count}" for name, count in counts.items())
+        embed.description = text or "Правила еще не добавлены"
+    await interaction.response.send_message(embed=embed)
 
-# ---------- ОБНОВЛЕННЫЙ ON_READY ----------
+# ---------- 12. МЕТРИКИ ----------
 @bot.event
-async def on_ready():
-    print(f'✅ Бот {bot.user} успешно запущен!')
-    print(f'🆔 ID бота: {bot.user.id}')
-    print(f'📊 Серверов: {len(bot.guilds)}')
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    """Время успешной слеш-команды (ошибки замеряет TimedCommandTree.on_error)"""
+    observe_command(interaction, 'ok')
+
+def gateway_latency():
+    """Задержка шлюза по шардам (для обычного бота - один шард 0)"""
+    if isinstance(bot, commands.AutoShardedBot):
+        return {(str(shard_id),): latency for shard_id, latency in bot.latencies}
+    return {('0',): bot.latency}
+
+def component_metrics():
+    """Внутренние счетчики очередей и кэшей одной метрикой"""
+    components = {
+        'storage': persistence.metrics,
+        'log_dispatcher': log_dispatcher.metrics,
+        'dm_outbox': dm_outbox.metrics,
+        'mod_cache': mod_cache.metrics,
+        'guild_state': guild_states.metrics,
+        'mod_journal': mod_journal.metrics,
+        'snapshots': snapshot_store.metrics,
+        'permission_fanout': permission_fanout.metrics,
+        'verification_queue': verification_queue.metrics
+    }
+    values = {
+        (component, name): value
+        for component, component_values in components.items()
+        for name, value in list(component_values.items())
+    }
+    values[('log_dispatcher', 'queue_depth')] = log_dispatcher.queue_depth()
+    values[('dm_outbox', 'queue_depth')] = dm_outbox.queue_depth()
+    values[('guild_state', 'resident')] = len(guild_states)
+    return values
+
+REGISTRY.gauge('discord_gateway_latency_seconds', 'Задержка шлюза Discord', ('shard',), gateway_latency)
+REGISTRY.gauge('bot_guilds', 'Число серверов бота', callback=lambda: len(bot.guilds))
+REGISTRY.gauge('bot_component_value', 'Счетчики компонентов бота', ('component', 'name'), component_metrics)
+
+# ---------- 13. ЖУРНАЛ МОДЕРАЦИИ ----------
+JOURNAL_QUERY_LIMIT = 200  # Сколько последних событий показывает запрос
+JOURNAL_PAGE_SIZE = 10
+JOURNAL_ACTIONS = {
+    'warn': "⚠️ Варн",
+    'unwarn': "✅ Снятие варна",
+    'mute': "🔇 Мут",
+    'timeout': "🔇 Тайм-аут",
+    'ticket_close': "🔒 Закрытие тикета"
+}
+
+def journal_line(event: dict) -> str:
+    action = event['action']
+    if action.startswith('automod:'):
+        title = f"🤖 Автомодерация ({action[8:]})"
+    else:
+        title = JOURNAL_ACTIONS.get(action, action)
+    line = f"<t:{int(event['ts'])}:f> **{title}**"
+    if event.get('user_id'):
+        line += f" <@{event['user_id']}>"
+    if event.get('moderator_id'):
+        line += f" ← <@{event['moderator_id']}>"
+    if event.get('reason'):
+        line += f"\n└ {str(event['reason'])[:100]}"
+    return line
+
+@bot.tree.command(name="журнал", description="История действий модерации")
+@app_commands.describe(
+    участник="Действия в отношении участника",
+    модератор="Действия модератора",
+    дней="За сколько последних дней (0 - за все время)",
+    все_серверы="Искать на всех серверах этого процесса кластера (только для владельца бота)"
+)
+async def moderation_journal(
+    interaction: discord.Interaction,
+    участник: Optional[discord.User] = None,
+    модератор: Optional[discord.User] = None,
+    дней: int = 7,
+    все_серверы: bool = False
+):
+    """Поиск по журналу модерации с пагинацией"""
+    if not await check_mod_permissions(interaction):
+        return
+    if все_серверы and not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("❌ Поиск по всем серверам доступен только владельцу бота", ephemeral=True)
+        return
     
-    # Запускаем фоновые задачи
-    daily_rules_reminder.start()
+    seqs = mod_journal.query(
+        guild_id=None if все_серверы else interaction.guild.id,
+        user_id=участник.id if участник else None,
+        moderator_id=модератор.id if модератор else None,
+        since=time.time() - дней * 86400 if дней > 0 else None,
+        limit=JOURNAL_QUERY_LIMIT
+    )
+    query_ms = mod_journal.metrics['last_query_ms']
+    # Адреса берутся сразу, чтение сегментов - в потоке
+    events = await asyncio.to_thread(mod_journal.read, mod_journal.locate(seqs)) if seqs else []
+    if not events:
+        await interaction.response.send_message("Записей не найдено", ephemeral=True)
+        return
+    footer = f"событий: {len(events)} · поиск {query_ms:.1f} мс"
+    if все_серверы and CLUSTER_ID is not None:
+        # Журнал у каждого процесса кластера свой: видны только серверы его шардов
+        footer += f" · только кластер {CLUSTER_ID}"
+    
+    pages = []
+    total_pages = (len(events) + JOURNAL_PAGE_SIZE - 1) // JOURNAL_PAGE_SIZE
+    for page in range(total_pages):
+        chunk = events[page * JOURNAL_PAGE_SIZE:(page + 1) * JOURNAL_PAGE_SIZE]
+        lines = []
+        for event in chunk:
+            line = journal_line(event)
+            if все_серверы:
+                line += f" · сервер {event['guild_id']}"
+            lines.append(line)
+        embed = discord.Embed(
+            title="📒 ЖУРНАЛ МОДЕРАЦИИ",
+            description="\n".join(lines),
+            color=discord.Color.dark_blue()
+        )
+        embed.set_footer(text=f"Страница {page + 1}/{total_pages} · {footer}")
+        pages.append(embed)
     
+    await interaction.response.send_message(embed=pages[0], view=PaginationView(pages))
+
+# ---------- ЗАПУСК СЕРВИСОВ ----------
+# Хэш сигнатур команд с последней синхронизации: sync нужен только после их изменения
+COMMAND_SYNC_FILE = 'command_sync.json'
+
+def command_tree_hash() -> str:
+    """Стабильный хэш сигнатур слеш-команд приложения"""
+    commands_data = sorted((command.to_dict() for command in bot.tree.get_commands()), key=lambda c: c['name'])
+    payload = json.dumps([bot.application_id, commands_data], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+async def sync_command_tree():
+    """Синхронизация команд, если их сигнатуры изменились"""
+    # Команды глобальные, в кластере их синхронизирует только первый процесс
+    if CLUSTER_ID not in (None, '0'):
+        return
+    tree_hash = command_tree_hash()
+    if load_json(COMMAND_SYNC_FILE).get('hash') == tree_hash:
+        print('✅ Команды не изменились, синхронизация не нужна')
+        return
     try:
         synced = await bot.tree.sync()
-        print(f'✅ Синхронизировано {len(synced)} команд')
     except Exception as e:
         print(f'❌ Ошибка синхронизации: {e}')
+        return
+    await asyncio.to_thread(atomic_write_json, COMMAND_SYNC_FILE, {'hash': tree_hash})
+    print(f'✅ Синхронизировано {len(synced)} команд')
+
+async def start_services():
+    """Фоновые задачи, которым нужен кэш серверов"""
+    await bot.wait_until_ready()
+    scheduler.start()
+    print(f'⏰ Запланированных задач: {len(scheduler)}')
+    daily_rules_reminder.start()
+    expire_warnings.start()
+    periodic_snapshots.start()
+    # Пересчитываются только серверы, которые еще не считались
+    await asyncio.gather(permission_fanout.resume(bot), guild_stats.sync_all(bot.guilds))
+
+async def warm_up():
+    """Прогрев после запуска: синхронизация команд идет параллельно с запуском сервисов"""
+    for result in await asyncio.gather(sync_command_tree(), start_services(), return_exceptions=True):
+        if isinstance(result, Exception):
+            print(f"Ошибка при запуске сервисов: {result}")
+
+@bot.event
+async def on_ready():
+    print(f'✅ Бот {bot.user} успешно запущен!')
+    print(f'🆔 ID бота: {bot.user.id}')
+    print(f'📊 Серверов: {len(bot.guilds)}')
     
     await bot.change_presence(
         activity=discord.Activity(
@@ -719,6 +1566,16 @@ async def on_ready():
     )
 
 # ---------- ЗАПУСК БОТА ----------
+async def run_bot(token: str):
+    """Запуск бота с сохранением данных при остановке"""
+    try:
+        async with bot:
+            await bot.start(token)
+    finally:
+        await persistence.close()
+        await storage.close()
+        mod_journal.close()
+
 if __name__ == "__main__":
     TOKEN = os.getenv('DISCORD_TOKEN')
     if not TOKEN:
@@ -730,4 +1587,9 @@ if __name__ == "__main__":
             exit(1)
     
     print("🚀 Запуск расширенного бота...")
-    bot.run(TOKEN)
\ No newline at end of file
+    # Веб-сервер для пинга и /metrics; процессы кластера слушают соседние порты
+    keep_alive(int(os.environ.get("PORT", 8080)) + int(CLUSTER_ID or 0))
+    try:
+        asyncio.run(run_bot(TOKEN))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,90 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from storage import SqliteStorage
+
+# python cluster.py --workers 4 --shards 16
+# Каждый процесс запускает bot.py со своим диапазоном шардов;
+# варны, мод роли и каналы логов процессы делят через общую базу SQLite
+
+
+def shard_ranges(shard_count: int, workers: int) -> list:
+    """Разбить шарды на непрерывные диапазоны по процессам"""
+    base, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for worker in range(workers):
+        size = base + (1 if worker < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return [shards for shards in ranges if shards]
+
+
+def start_worker(cluster_id: int, shard_ids: list, shard_count: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        'CLUSTER_ID': str(cluster_id),
+        'SHARD_COUNT': str(shard_count),
+        'SHARD_IDS': ','.join(map(str, shard_ids)),
+        'STORAGE_BACKEND': 'sqlite'
+    })
+    print(f"🚀 Кластер {cluster_id}: шарды {shard_ids[0]}-{shard_ids[-1]}")
+    return subprocess.Popen([sys.executable, 'bot.py'], env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запуск бота в нескольких процессах")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument('--shards', type=int, required=True, help="общее число шардов")
+    parser.add_argument('--database', default='bot.db', help="общая база SQLite")
+    args = parser.parse_args()
+
+    # Перенос из JSON выполняется здесь один раз, а не параллельно в каждом процессе
+    storage = SqliteStorage(args.database)
+    counts = storage.migrate_from_json('warnings.json', 'log_channel.json', 'mod_roles.json')
+    if counts:
+        print(f"📦 Данные перенесены в {args.database}: {counts}")
+    storage.conn.close()
+
+    ranges = shard_ranges(args.shards, args.workers)
+    workers = {
+        cluster_id: start_worker(cluster_id, shard_ids, args.shards)
+        for cluster_id, shard_ids in enumerate(ranges)
+    }
+    restarts = {cluster_id: 0 for cluster_id in workers}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Упавший процесс перезапускается с нарастающей задержкой
+    while not stopping:
+        time.sleep(1)
+        for cluster_id, process in list(workers.items()):
+            if stopping or process.poll() is None:
+                continue
+            restarts[cluster_id] += 1
+            delay = min(2 ** restarts[cluster_id], 60)
+            print(f"⚠️ Кластер {cluster_id} завершился с кодом {process.returncode}, перезапуск через {delay} с")
+            time.sleep(delay)
+            workers[cluster_id] = start_worker(cluster_id, ranges[cluster_id], args.shards)
+
+    for process in workers.values():
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+
+class DMOutbox:
+    """Личные уведомления участникам: склейка за окно, кэш ЛС-каналов и память о закрытых ЛС"""
+
+    def __init__(self, client: discord.Client, merge_window: float = 5.0, cooldown: float = 60.0,
+                 closed_ttl: float = 24 * 3600, max_batch: int = 10, max_channels: int = 50000):
+        self.client = client
+        self.merge_window = merge_window
+        # Следующее сообщение тому же участнику - не раньше чем через cooldown
+        self.cooldown = cooldown
+        self.closed_ttl = closed_ttl
+        self.max_batch = max_batch
+        self.max_channels = max_channels
+        # user_id -> OrderedDict[(title, description, fields)] = [count, embed]
+        self._pending = {}
+        self._users = {}
+        self._channels = OrderedDict()  # user_id -> ID ЛС-канала, от давних к свежим
+        self._closed = OrderedDict()  # user_id -> до какого момента не писать (по времени добавления)
+        self._events = {}
+        self._tasks = {}
+        self.metrics = {
+            'queued': 0,
+            'collapsed': 0,
+            'sent_messages': 0,
+            'sent_embeds': 0,
+            'channels_opened': 0,
+            'channel_cache_hits': 0,
+            'skipped_closed': 0,
+            'closed_users': 0,
+            'dropped_overflow': 0,
+            'dropped_errors': 0
+        }
+
+    def queue_depth(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def is_closed(self, user_id: int) -> bool:
+        """ЛС участника закрыты (запоминается на closed_ttl)"""
+        now = time.monotonic()
+        while self._closed and next(iter(self._closed.values())) <= now:
+            self._closed.popitem(last=False)
+        return user_id in self._closed
+
+    def enqueue(self, user: discord.abc.User, embed: discord.Embed) -> bool:
+        """Поставить уведомление в очередь; False - ЛС участника закрыты"""
+        if self.is_closed(user.id):
+            self.metrics['skipped_closed'] += 1
+            return False
+
+        self._users[user.id] = user
+        pending = self._pending.setdefault(user.id, OrderedDict())
+        key = (embed.title, embed.description, tuple((field.name, field.value) for field in embed.fields))
+        self.metrics['queued'] += 1
+        if key in pending:
+            pending[key][0] += 1
+            self.metrics['collapsed'] += 1
+        else:
+            pending[key] = [1, embed]
+            if len(pending) > self.max_batch:
+                pending.popitem(last=False)
+                self.metrics['dropped_overflow'] += 1
+
+        task = self._tasks.get(user.id)
+        if task is None or task.done():
+            self._events[user.id] = asyncio.Event()
+            self._tasks[user.id] = asyncio.get_running_loop().create_task(self._worker(user.id))
+        return True
+
+    @staticmethod
+    def _build_embed(count: int, embed: discord.Embed) -> discord.Embed:
+        if count > 1:
+            embed = embed.copy()
+            embed.title = f"{embed.title} ×{count}"
+        return embed
+
+    async def _channel(self, user_id: int):
+        channel_id = self._channels.get(user_id)
+        if channel_id is not None:
+            self._channels.move_to_end(user_id)
+            self.metrics['channel_cache_hits'] += 1
+            return self.client.get_partial_messageable(channel_id, type=discord.ChannelType.private)
+
+        channel = await self._users[user_id].create_dm()
+        self.metrics['channels_opened'] += 1
+        self._channels[user_id] = channel.id
+        if len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+        return channel
+
+    def _mark_closed(self, user_id: int):
+        self._closed.pop(user_id, None)
+        self._closed[user_id] = time.monotonic() + self.closed_ttl
+        self._channels.pop(user_id, None)
+        self._pending.pop(user_id, None)
+        self.metrics['closed_users'] += 1
+
+    async def _wait(self, user_id: int, timeout: float):
+        """Пауза, которую прерывает flush()"""
+        try:
+            await asyncio.wait_for(self._events[user_id].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self, user_id: int):
+        # Все уведомления за окно уходят одним сообщением
+        await self._wait(user_id, self.merge_window)
+        while self._pending.get(user_id):
+            batch = self._pending.pop(user_id)
+            embeds = [self._build_embed(count, embed) for count, embed in batch.values()]
+            try:
+                channel = await self._channel(user_id)
+                await channel.send(embeds=embeds)
+            except discord.Forbidden:
+                # ЛС закрыты: не пишем участнику closed_ttl секунд
+                self._mark_closed(user_id)
+                break
+            except discord.HTTPException as e:
+                # 429 и 5xx discord.py уже повторил сам; канал мог быть удален - при следующей отправке откроется заново
+                self._channels.pop(user_id, None)
+                self.metrics['dropped_errors'] += len(embeds)
+                print(f"Ошибка отправки ЛС участнику {user_id}: {e}")
+                break
+            except Exception as e:
+                self.metrics['dropped_errors'] += len(embeds)
+                print(f"Ошибка отправки ЛС участнику {user_id}: {e}")
+                break
+            self.metrics['sent_messages'] += 1
+            self.metrics['sent_embeds'] += len(embeds)
+            await self._wait(user_id, self.cooldown)
+
+        self._tasks.pop(user_id, None)
+        self._events.pop(user_id, None)
+        self._users.pop(user_id, None)
+
+    async def flush(self):
+        """Отправить все, что накопилось (при остановке бота)"""
+        for event in self._events.values():
+            event.set()
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=10)
@@ -0,0 +1,162 @@
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from storage import Storage
+from warning_ledger import WarningLedger
+
+
+class GuildState:
+    """Данные одного сервера в памяти: варны, канал логов, мод роли и их счетчики"""
+
+    __slots__ = ('guild_id', 'warnings', 'log_channel', 'mod_roles', 'ledger', 'size')
+
+    # Грубая оценка памяти: пустой раздел и одно предупреждение (dict с 8-9 полями)
+    BASE_BYTES = 2048
+    WARNING_BYTES = 1024
+
+    def __init__(self, guild_id: int, partition: dict, ledger: WarningLedger):
+        self.guild_id = guild_id
+        self.warnings = partition['warnings']  # user_id -> [варны]
+        self.log_channel = partition['log_channel']
+        self.mod_roles = partition['mod_roles']
+        self.ledger = ledger
+        ledger.load(self.warnings)
+        self.size = self.BASE_BYTES + self.WARNING_BYTES * sum(len(w) for w in self.warnings.values())
+
+    def user_warnings(self, user_id: str) -> list:
+        return self.warnings.get(user_id, [])
+
+    def add_warning(self, user_id: str, warning: dict) -> list:
+        """Добавить предупреждение участнику и вернуть его список варнов"""
+        warns = self.warnings.setdefault(user_id, [])
+        self.ledger.add(user_id, warning)
+        warns.append(warning)
+        self.size += self.WARNING_BYTES
+        return warns
+
+    def adopt_warnings(self, legacy: dict):
+        """Добавить варны из старого общего файла (user_id -> [варны]) перед уже выданными на сервере"""
+        for user_id, legacy_warnings in legacy.items():
+            for warning in legacy_warnings:
+                warning['guild_id'] = self.guild_id
+            own = self.warnings.get(user_id, [])
+            # Старые варны раньше новых: номера новых сдвигаются, если пересекаются
+            last_id = max((w['id'] for w in legacy_warnings), default=0)
+            if own and own[0]['id'] <= last_id:
+                for warning in own:
+                    last_id += 1
+                    warning['id'] = last_id
+            self.warnings[user_id] = legacy_warnings + own
+            self.size += self.WARNING_BYTES * len(legacy_warnings)
+        self.ledger.load(self.warnings)
+
+    def next_warning_id(self, user_id: str) -> int:
+        # Номера растут по порядку; после разбиения старых данных в них бывают пропуски
+        warns = self.warnings.get(user_id)
+        return warns[-1]['id'] + 1 if warns else 1
+
+
+class GuildStateCache:
+    """Разделы серверов загружаются при первом обращении, холодные выгружаются по бюджету памяти"""
+
+    def __init__(self, storage: Storage, ttl_days: dict, memory_budget: int,
+                 on_load: Optional[Callable[[GuildState], Awaitable[None]]] = None):
+        self.storage = storage
+        self.ttl_days = ttl_days
+        self.memory_budget = memory_budget
+        self.on_load = on_load
+        self._states = OrderedDict()  # guild_id -> GuildState, от холодных к горячим
+        self._locks = {}
+        self.metrics = {'hits': 0, 'loads': 0, 'evictions': 0, 'eviction_skips': 0}
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._states
+
+    def __len__(self):
+        return len(self._states)
+
+    def peek(self, guild_id: int) -> Optional[GuildState]:
+        """Раздел, если он уже в памяти (без загрузки и без обновления LRU)"""
+        return self._states.get(guild_id)
+
+    def resident(self) -> list:
+        return list(self._states.values())
+
+    def resident_bytes(self) -> int:
+        return sum(state.size for state in self._states.values())
+
+    async def get(self, guild_id: int) -> GuildState:
+        """Раздел сервера; при первом обращении читается из хранилища"""
+        state = self._states.get(guild_id)
+        if state is not None:
+            self._states.move_to_end(guild_id)
+            self.metrics['hits'] += 1
+            return state
+
+        # Параллельные обращения к холодному серверу ждут одну загрузку
+        lock = self._locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(guild_id)
+            if state is None:
+                partition = await self.storage.load_guild(guild_id)
+                state = GuildState(guild_id, partition, WarningLedger(self.ttl_days))
+                self.metrics['loads'] += 1
+                if self.on_load is not None:
+                    try:
+                        await self.on_load(state)
+                    except Exception as e:
+                        print(f"Ошибка подготовки данных сервера {guild_id}: {e}")
+                # В кэш раздел попадает только подготовленным: до этого параллельные обращения ждут блокировку
+                self._states[guild_id] = state
+        self._locks.pop(guild_id, None)
+        self._states.move_to_end(guild_id)
+        self.evict()
+        return state
+
+    async def read(self, guild_id: int) -> dict:
+        """Данные сервера только для чтения: из памяти или прямо из хранилища, без загрузки в кэш"""
+        lock = self._locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(guild_id)
+            if state is not None:
+                partition = {'warnings': state.warnings, 'log_channel': state.log_channel, 'mod_roles': state.mod_roles}
+            else:
+                partition = await self.storage.load_guild(guild_id)
+                # Хранилище не держит раздел в памяти ради одного чтения
+                self.storage.release(guild_id)
+        self._locks.pop(guild_id, None)
+        return partition
+
+    async def replace(self, guild_id: int, partition: dict) -> GuildState:
+        """Подменить раздел сервера целиком: сначала в памяти, затем в хранилище"""
+        state = GuildState(guild_id, partition, WarningLedger(self.ttl_days))
+        self._states[guild_id] = state
+        self._states.move_to_end(guild_id)
+        await self.storage.replace_guild(guild_id, partition)
+        if self.on_load is not None:
+            try:
+                await self.on_load(state)
+            except Exception as e:
+                print(f"Ошибка подготовки данных сервера {guild_id}: {e}")
+        return state
+
+    def evict(self) -> int:
+        """Выгрузить самые давние разделы, пока память выше бюджета"""
+        total = self.resident_bytes()
+        if total <= self.memory_budget:
+            return 0
+
+        evicted = 0
+        # Самый свежий раздел не выгружается: его только что запросили
+        for guild_id in list(self._states)[:-1]:
+            if total <= self.memory_budget:
+                break
+            if guild_id in self._locks or not self.storage.release(guild_id):
+                # Несохраненные изменения: раздел останется до следующей попытки
+                self.metrics['eviction_skips'] += 1
+                continue
+            total -= self._states.pop(guild_id).size
+            evicted += 1
+        self.metrics['evictions'] += evicted
+        return evicted
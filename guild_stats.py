@@ -0,0 +1,131 @@
+import asyncio
+from collections import defaultdict
+
+import discord
+
+
+class GuildStats:
+    """Счетчики сервера, которые обновляются по событиям"""
+
+    __slots__ = ('bots', 'online', 'warnings_total', 'warnings_active', 'tickets_open', 'members_synced')
+
+    def __init__(self):
+        self.bots = 0
+        self.online = 0
+        self.warnings_total = 0
+        self.warnings_active = 0
+        self.tickets_open = 0
+        self.members_synced = False
+
+
+class GuildStatsTracker:
+    """Статистика серверов без обхода всех участников на каждый запрос"""
+
+    def __init__(self, ticket_category_name: str, is_reserved=None, yield_every: int = 1000):
+        self.ticket_category_name = ticket_category_name
+        # Резервные каналы пула тикетов не считаются открытыми тикетами
+        self.is_reserved = is_reserved or (lambda channel: False)
+        self.yield_every = yield_every
+        self._stats = defaultdict(GuildStats)
+
+    def get(self, guild_id: int) -> GuildStats:
+        return self._stats[guild_id]
+
+    @staticmethod
+    def _is_online(member: discord.Member) -> bool:
+        return member.status != discord.Status.offline
+
+    def _is_ticket(self, channel) -> bool:
+        category = getattr(channel, 'category', None)
+        return (
+            category is not None
+            and category.name == self.ticket_category_name
+            and not self.is_reserved(channel)
+        )
+
+    # ---- Пересчет ----
+    def load_warnings(self, guild_id: int, warnings: dict):
+        """Пересчет варнов сервера (при загрузке его данных в память)"""
+        stats = self._stats[guild_id]
+        stats.warnings_total = stats.warnings_active = 0
+        for warns in warnings.values():
+            stats.warnings_total += len(warns)
+            stats.warnings_active += sum(1 for warn in warns if warn.get('active'))
+
+    def sync_members(self, guild: discord.Guild):
+        """Пересчет участников сервера за один проход"""
+        stats = self._stats[guild.id]
+        stats.bots = stats.online = 0
+        for member in guild.members:
+            stats.bots += member.bot
+            stats.online += self._is_online(member)
+        stats.tickets_open = sum(1 for channel in guild.text_channels if self._is_ticket(channel))
+        stats.members_synced = True
+
+    async def sync_guild_async(self, guild: discord.Guild):
+        """Пересчет участников с передачей управления циклу событий"""
+        bots = online = 0
+        for i, member in enumerate(guild.members, 1):
+            bots += member.bot
+            online += self._is_online(member)
+            if i % self.yield_every == 0:
+                await asyncio.sleep(0)
+        stats = self._stats[guild.id]
+        # Если пока шел пересчет сервер уже посчитали синхронно, его данные точнее
+        if not stats.members_synced:
+            stats.bots, stats.online = bots, online
+            stats.tickets_open = sum(1 for channel in guild.text_channels if self._is_ticket(channel))
+            stats.members_synced = True
+
+    async def sync_all(self, guilds):
+        """Фоновый пересчет всех серверов после запуска"""
+        for guild in guilds:
+            if not self._stats[guild.id].members_synced:
+                await self.sync_guild_async(guild)
+
+    def snapshot(self, guild: discord.Guild) -> GuildStats:
+        """Актуальные счетчики сервера"""
+        stats = self._stats[guild.id]
+        if not stats.members_synced:
+            self.sync_members(guild)
+        return stats
+
+    # ---- События ----
+    def member_joined(self, member: discord.Member):
+        stats = self._stats[member.guild.id]
+        if stats.members_synced:
+            stats.bots += member.bot
+            stats.online += self._is_online(member)
+
+    def member_left(self, member: discord.Member):
+        stats = self._stats[member.guild.id]
+        if stats.members_synced:
+            stats.bots -= member.bot
+            stats.online -= self._is_online(member)
+
+    def presence_changed(self, before: discord.Member, after: discord.Member):
+        stats = self._stats[after.guild.id]
+        if stats.members_synced:
+            stats.online += self._is_online(after) - self._is_online(before)
+
+    def channel_created(self, channel):
+        if self._is_ticket(channel):
+            self._stats[channel.guild.id].tickets_open += 1
+
+    def channel_deleted(self, channel):
+        if self._is_ticket(channel):
+            stats = self._stats[channel.guild.id]
+            stats.tickets_open = max(stats.tickets_open - 1, 0)
+
+    def channel_updated(self, before, after):
+        # Канал из пула становится тикетом при переименовании
+        self._stats[after.guild.id].tickets_open += self._is_ticket(after) - self._is_ticket(before)
+
+    def warning_added(self, guild_id: int):
+        stats = self._stats[guild_id]
+        stats.warnings_total += 1
+        stats.warnings_active += 1
+
+    def warnings_deactivated(self, guild_id: int, count: int = 1):
+        stats = self._stats[guild_id]
+        stats.warnings_active = max(stats.warnings_active - count, 0)
@@ -1,7 +1,9 @@
-from flask import Flask
+from flask import Flask, Response
 from threading import Thread
 import os
 
+from metrics import REGISTRY
+
 app = Flask('')
 
 @app.route('/')
@@ -34,7 +36,13 @@ def home():
             <p>Пинг бота: <span id="ping">...</span>ms</p>
         </div>
         <script>
-            // Опционально: можно добавить динамическое обновление
+            // Пинг обновляется каждые 5 секунд
+            async function updatePing() {
+                const response = await fetch('/latency');
+                document.getElementById('ping').textContent = await response.text();
+            }
+            updatePing();
+            setInterval(updatePing, 5000);
         </script>
     </body>
     </html>
@@ -44,10 +52,25 @@ def home():
 def ping():
     return "pong"
 
-def run():
-    port = int(os.environ.get("PORT", 8080))
+@app.route('/latency')
+def latency():
+    """Задержка шлюза в миллисекундах (первый шард)"""
+    gauge = REGISTRY.get('discord_gateway_latency_seconds')
+    values = gauge.callback() if gauge is not None and gauge.callback else {}
+    value = next(iter(values.values()), None) if isinstance(values, dict) else values
+    if value is None or value != value or value == float('inf'):
+        return "..."
+    return str(round(value * 1000))
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def run(port=None):
+    port = port or int(os.environ.get("PORT", 8080))
     app.run(host='0.0.0.0', port=port)
 
-def keep_alive():
-    t = Thread(target=run)
+def keep_alive(port=None):
+    # Поток-демон не мешает процессу завершиться вместе с ботом
+    t = Thread(target=run, args=(port,), daemon=True)
     t.start()
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+
+from loadtest.mock_discord import MockDiscord
+from loadtest.scenarios import SCENARIOS
+
+# python -m loadtest                                  - все сценарии по очереди
+# python -m loadtest flood --count 500 --rate 200     - один сценарий
+# python -m loadtest warns --route-limit 5 --latency 0.05
+# Бот запускается отдельным процессом во временной папке и подключается к локальному стенду.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def report(server: MockDiscord, name: str):
+    print(f"\n===== {name} =====")
+    print("Сквозная задержка (событие -> ответ бота):")
+    for action, values in sorted(server.latencies.items()):
+        print(
+            f"  {action:<32} n={len(values):<6} p50 {percentile(values, 0.5) * 1000:8.1f} мс   "
+            f"p99 {percentile(values, 0.99) * 1000:8.1f} мс   max {max(values) * 1000:8.1f} мс"
+        )
+    unanswered = server.unanswered()
+    if unanswered:
+        print(f"  без ответа: {unanswered}")
+
+    total = sum(server.rest_calls.values())
+    print(f"REST-запросов: {total}, ответов 429: {sum(server.rate_limited.values())}")
+    for route, count in sorted(server.rest_calls.items(), key=lambda item: -item[1]):
+        limited = server.rate_limited.get(route, 0)
+        print(f"  {count:>6}  {route}" + (f"  (429: {limited})" if limited else ""))
+    if server.unhandled:
+        print(f"Маршруты без обработчика: {dict(server.unhandled)}")
+
+
+async def run(args, name: str):
+    server = MockDiscord(
+        members=args.members,
+        channels=args.channels,
+        route_limit=args.route_limit,
+        route_window=args.route_window,
+        latency=args.latency
+    )
+    api_base = await server.start()
+
+    with tempfile.TemporaryDirectory(prefix='bot-loadtest-') as workdir:
+        # Канал логов задан заранее, чтобы были видны логи рейда
+        os.makedirs(os.path.join(workdir, 'guilds'))
+        with open(os.path.join(workdir, 'guilds', f"{server.guild['id']}.json"), 'w', encoding='utf-8') as f:
+            json.dump({'warnings': {}, 'log_channel': int(server.log_channel['id']), 'mod_roles': []}, f)
+
+        env = dict(os.environ)
+        env.update({
+            'DISCORD_TOKEN': 'loadtest',
+            'PORT': str(free_port()),
+            'STORAGE_BACKEND': 'json'
+        })
+        env.pop('CLUSTER_ID', None)
+        log_path = os.path.join(workdir, 'bot.log')
+        with open(log_path, 'w', encoding='utf-8') as log:
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'loadtest', 'run_bot.py'), api_base, server.gateway_url],
+                cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+            try:
+                try:
+                    await asyncio.wait_for(server.ready.wait(), timeout=args.startup_timeout)
+                except asyncio.TimeoutError:
+                    with open(log_path, 'r', encoding='utf-8') as f:
+                        print(f.read())
+                    raise SystemExit("❌ Бот не подключился к стенду")
+
+                # Замеры начинаются после запуска: синхронизация команд не в счет
+                server.rest_calls.clear()
+                server.rate_limited.clear()
+                await SCENARIOS[name](server, args.count, args.rate)
+                await asyncio.sleep(args.settle)
+                report(server, name)
+            finally:
+                # Сначала останавливается бот: при остановке он дописывает логи и ЛС, стенд должен отвечать
+                process.send_signal(signal.SIGINT)
+                try:
+                    await asyncio.to_thread(process.wait, 15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                await server.stop()
+        if args.verbose:
+            with open(log_path, 'r', encoding='utf-8') as f:
+                print(f.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальном стенде Discord")
+    parser.add_argument('scenario', nargs='?', choices=sorted(SCENARIOS), help="сценарий (по умолчанию все)")
+    parser.add_argument('--count', type=int, default=200, help="сколько событий отправить")
+    parser.add_argument('--rate', type=float, default=100.0, help="событий в секунду")
+    parser.add_argument('--members', type=int, default=1000, help="участников на сервере")
+    parser.add_argument('--channels', type=int, default=10, help="текстовых каналов")
+    parser.add_argument('--route-limit', type=int, default=5, help="запросов на маршрут за окно (0 - без лимитов)")
+    parser.add_argument('--route-window', type=float, default=5.0, help="окно лимита маршрута, с")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка каждого ответа REST, с")
+    parser.add_argument('--settle', type=float, default=10.0, help="сколько ждать ответов после сценария, с")
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    parser.add_argument('-v', '--verbose', action='store_true', help="показать вывод бота")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    for name in [args.scenario] if args.scenario else sorted(SCENARIOS):
+        asyncio.run(run(args, name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+import asyncio
+import itertools
+import json
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from aiohttp import WSMsgType, web
+
+# Локальная замена Discord: REST /api/v10 и шлюз по WebSocket.
+# Реализовано ровно столько протокола, сколько нужно bot.py для подключения и сценариев.
+
+API_PREFIX = '/api/v10'
+DISCORD_EPOCH = 1420070400000
+ADMINISTRATOR = str(1 << 3)
+
+ID_RE = re.compile(r'/\d{5,}')
+TOKEN_RE = re.compile(r'/(webhooks/\{id\}|interactions/\{id\})/[^/]+')
+MAJOR_RE = re.compile(r'^/(channels|guilds|webhooks)/(\d+)')
+
+_counter = itertools.count()
+
+
+def snowflake() -> int:
+    return ((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (next(_counter) & 0x3FFFFF)
+
+
+def iso_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def json_response(data, status: int = 200, headers: dict = None) -> web.Response:
+    """discord.py разбирает JSON только при Content-Type ровно 'application/json'"""
+    return web.Response(
+        body=json.dumps(data).encode(), status=status, headers=headers, content_type='application/json'
+    )
+
+
+def route_template(method: str, path: str) -> str:
+    """GET /channels/123/messages/456 -> GET /channels/{id}/messages/{id}"""
+    template = TOKEN_RE.sub(r'/\1/{token}', ID_RE.sub('/{id}', path))
+    return f"{method} {template}"
+
+
+class Bucket:
+    """Окно лимита маршрута: limit запросов за window секунд"""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def take(self, now: float) -> float:
+        """0, если запрос проходит, иначе сколько ждать"""
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+        if self.remaining <= 0:
+            return self.reset_at - now
+        self.remaining -= 1
+        return 0.0
+
+
+class MockDiscord:
+    def __init__(self, members: int = 1000, channels: int = 10, route_limit: int = 5,
+                 route_window: float = 5.0, latency: float = 0.0, slow_routes: dict = None):
+        self.route_limit = route_limit
+        self.route_window = route_window
+        self.latency = latency
+        # Шаблон маршрута -> дополнительная задержка ответа в секундах
+        self.slow_routes = slow_routes or {}
+
+        self.bot_user = self.make_user('loadtest-bot', bot=True)
+        self.application_id = snowflake()
+        self.owner = self.make_user('владелец')
+        self.guild = self._build_guild(members, channels)
+
+        self.ws = None
+        self.sequence = 0
+        self.identified = asyncio.Event()
+        self.ready = asyncio.Event()
+
+        self.rest_calls = defaultdict(int)
+        self.rate_limited = defaultdict(int)
+        self.unhandled = defaultdict(int)
+        self._buckets = {}
+        self._pending = {}
+        self.latencies = defaultdict(list)
+
+        self.app = web.Application()
+        self.app.router.add_get('/gateway', self.gateway)
+        self.app.router.add_route('*', API_PREFIX + '/{tail:.*}', self.rest)
+        self._runner = None
+
+    # ---- Данные ----
+    @staticmethod
+    def make_user(name: str, bot: bool = False) -> dict:
+        return {
+            'id': str(snowflake()),
+            'username': name,
+            'discriminator': '0',
+            'global_name': None,
+            'avatar': None,
+            'bot': bot,
+            'flags': 0
+        }
+
+    @staticmethod
+    def make_member(user: dict, roles: list = ()) -> dict:
+        return {
+            'user': user,
+            'roles': list(roles),
+            'joined_at': iso_now(),
+            'deaf': False,
+            'mute': False,
+            'flags': 0,
+            'pending': False,
+            'nick': None,
+            'avatar': None,
+            'premium_since': None,
+            'communication_disabled_until': None
+        }
+
+    def add_member(self, name: str) -> dict:
+        """Новый участник сервера (событие входа сценарий отправляет сам)"""
+        member = self.make_member(self.make_user(name))
+        self.users[member['user']['id']] = member['user']
+        self.members[member['user']['id']] = member
+        return member
+
+    def _channel(self, name: str, channel_type: int = 0, parent_id=None, position: int = 0) -> dict:
+        return {
+            'id': str(snowflake()),
+            'type': channel_type,
+            'guild_id': str(self.guild_id),
+            'name': name,
+            'position': position,
+            'permission_overwrites': [],
+            'parent_id': parent_id,
+            'topic': None,
+            'nsfw': False,
+            'rate_limit_per_user': 0,
+            'last_message_id': None,
+            'flags': 0
+        }
+
+    def _role(self, name: str, position: int, permissions: str = '0', role_id=None) -> dict:
+        return {
+            'id': str(role_id or snowflake()),
+            'name': name,
+            'color': 0,
+            'hoist': False,
+            'position': position,
+            'permissions': permissions,
+            'managed': False,
+            'mentionable': False,
+            'icon': None,
+            'unicode_emoji': None,
+            'flags': 0
+        }
+
+    def _build_guild(self, members: int, channels: int) -> dict:
+        self.guild_id = snowflake()
+        self.admin_role = self._role('Админ', 1, ADMINISTRATOR)
+        self.users = {}
+        member_list = []
+        for user, roles in [(self.bot_user, [self.admin_role['id']]), (self.owner, [])]:
+            self.users[user['id']] = user
+            member_list.append(self.make_member(user, roles))
+        for i in range(members):
+            user = self.make_user(f'участник-{i}')
+            self.users[user['id']] = user
+            member_list.append(self.make_member(user))
+
+        self.text_channels = [self._channel(f'канал-{i}', position=i) for i in range(channels)]
+        self.log_channel = self._channel('логи', position=channels)
+        all_channels = self.text_channels + [self.log_channel]
+        self.channels = {channel['id']: channel for channel in all_channels}
+        self.roles = [self._role('@everyone', 0, role_id=self.guild_id), self.admin_role]
+        self.members = {member['user']['id']: member for member in member_list}
+
+        return {
+            'id': str(self.guild_id),
+            'name': 'Нагрузочный тест',
+            'icon': None,
+            'splash': None,
+            'discovery_splash': None,
+            'banner': None,
+            'description': None,
+            'owner_id': self.owner['id'],
+            'afk_channel_id': None,
+            'afk_timeout': 300,
+            'verification_level': 0,
+            'default_message_notifications': 0,
+            'explicit_content_filter': 0,
+            'mfa_level': 0,
+            'nsfw_level': 0,
+            'premium_tier': 0,
+            'premium_subscription_count': 0,
+            'premium_progress_bar_enabled': False,
+            'preferred_locale': 'ru',
+            'system_channel_id': None,
+            'system_channel_flags': 0,
+            'rules_channel_id': None,
+            'public_updates_channel_id': None,
+            'vanity_url_code': None,
+            'application_id': None,
+            'max_members': 500000,
+            'features': [],
+            'emojis': [],
+            'stickers': [],
+            'joined_at': iso_now(),
+            'large': False,
+            'unavailable': False,
+            'member_count': len(member_list),
+            'roles': self.roles,
+            'channels': all_channels,
+            'members': member_list,
+            'voice_states': [],
+            'presences': [],
+            'threads': [],
+            'stage_instances': [],
+            'guild_scheduled_events': []
+        }
+
+    def pick_members(self, count: int, offset: int = 0) -> list:
+        """Обычные участники по кругу, начиная с offset"""
+        ordinary = [m for m in self.members.values() if m['user']['id'] not in (self.bot_user['id'], self.owner['id'])]
+        return [ordinary[(offset + i) % len(ordinary)] for i in range(count)]
+
+    # ---- Замеры ----
+    def track(self, key, kind: str):
+        """Запомнить момент события, ответ на которое ждем"""
+        self._pending[key] = (kind, time.perf_counter())
+
+    def complete(self, key, action: str):
+        entry = self._pending.pop(key, None)
+        if entry is not None:
+            kind, started = entry
+            self.latencies[f'{kind} -> {action}'].append(time.perf_counter() - started)
+
+    def unanswered(self) -> dict:
+        counts = defaultdict(int)
+        for kind, _ in self._pending.values():
+            counts[kind] += 1
+        return dict(counts)
+
+    # ---- Шлюз ----
+    async def send(self, op: int, data=None, event: str = None):
+        payload = {'op': op, 'd': data}
+        if op == 0:
+            self.sequence += 1
+            payload.update({'s': self.sequence, 't': event})
+        await self.ws.send_str(json.dumps(payload))
+
+    async def dispatch(self, event: str, data: dict):
+        await self.send(0, data, event)
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self.ws = ws
+        await self.send(10, {'heartbeat_interval': 41250})
+
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(message.data)
+            op, data = payload['op'], payload.get('d')
+            if op == 1:
+                await self.send(11)
+            elif op == 2:
+                self.identified.set()
+                await self.dispatch('READY', {
+                    'v': 10,
+                    'user': self.bot_user,
+                    'guilds': [{'id': self.guild['id'], 'unavailable': True}],
+                    'session_id': 'loadtest',
+                    'resume_gateway_url': self.gateway_url,
+                    'application': {'id': str(self.application_id), 'flags': 0}
+                })
+                await self.dispatch('GUILD_CREATE', self.guild)
+            elif op == 3:
+                # Смена статуса - последнее действие on_ready, бот готов к сценариям
+                self.ready.set()
+            elif op == 8:
+                await self.dispatch('GUILD_MEMBERS_CHUNK', {
+                    'guild_id': self.guild['id'],
+                    'members': list(self.members.values()),
+                    'chunk_index': 0,
+                    'chunk_count': 1,
+                    'nonce': data.get('nonce')
+                })
+        self.ws = None
+        return ws
+
+    # ---- REST ----
+    def _bucket_key(self, method: str, path: str, template: str) -> str:
+        major = MAJOR_RE.match(path)
+        return f"{template}:{major.group(2) if major else ''}"
+
+    async def rest(self, request):
+        path = '/' + request.match_info['tail']
+        method = request.method
+        template = route_template(method, path)
+        self.rest_calls[template] += 1
+
+        delay = self.latency + self.slow_routes.get(template, 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        headers = {}
+        # Ответы на взаимодействия в Discord не ограничены лимитами маршрутов
+        if not path.startswith('/interactions/') and self.route_limit:
+            key = self._bucket_key(method, path, template)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = Bucket(self.route_limit, self.route_window)
+            now = time.monotonic()
+            retry_after = bucket.take(now)
+            headers = {
+                'X-RateLimit-Limit': str(bucket.limit),
+                'X-RateLimit-Remaining': str(bucket.remaining),
+                'X-RateLimit-Reset': str(time.time() + max(bucket.reset_at - now, 0)),
+                'X-RateLimit-Reset-After': f'{max(bucket.reset_at - now, 0):.3f}',
+                'X-RateLimit-Bucket': str(abs(hash(key)))
+            }
+            if retry_after:
+                self.rate_limited[template] += 1
+                headers.update({'Retry-After': f'{retry_after:.3f}', 'X-RateLimit-Scope': 'user'})
+                return json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': False},
+                    status=429, headers=headers
+                )
+
+        body = None
+        if request.can_read_body:
+            if request.content_type == 'application/json':
+                body = await request.json()
+            elif request.content_type.startswith('multipart/'):
+                form = await request.post()
+                body = json.loads(form.get('payload_json', '{}'))
+
+        result = await self.handle(method, path, body or {})
+        if result is None:
+            return web.Response(status=204, headers=headers)
+        return json_response(result, headers=headers)
+
+    def _bot_message(self, channel_id: str, body: dict) -> dict:
+        message = {
+            'id': str(snowflake()),
+            'channel_id': channel_id,
+            'author': self.bot_user,
+            'content': body.get('content') or '',
+            'timestamp': iso_now(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': body.get('embeds') or [],
+            'components': body.get('components') or [],
+            'pinned': False,
+            'type': 0,
+            'flags': 0
+        }
+        for embed in message['embeds']:
+            self.complete(('embed', embed.get('title')), 'embed posted')
+        return message
+
+    async def handle(self, method: str, path: str, body: dict):
+        parts = path.strip('/').split('/')
+
+        if path == '/users/@me':
+            return self.bot_user
+        if path == '/oauth2/applications/@me':
+            return {
+                'id': str(self.application_id),
+                'name': self.bot_user['username'],
+                'description': '',
+                'icon': None,
+                'bot_public': False,
+                'bot_require_code_grant': False,
+                'owner': self.owner,
+                'verify_key': '',
+                'flags': 0
+            }
+        if path == '/gateway' or path == '/gateway/bot':
+            return {'url': self.gateway_url, 'shards': 1, 'session_start_limit': {
+                'total': 1000, 'remaining': 1000, 'reset_after': 0, 'max_concurrency': 1
+            }}
+        if path == '/users/@me/channels':
+            recipient = self.users.get(str(body.get('recipient_id')))
+            return {'id': str(snowflake()), 'type': 1, 'recipients': [recipient] if recipient else []}
+
+        if parts[0] == 'applications' and parts[-1] == 'commands':
+            return [dict(command, id=str(snowflake()), application_id=str(self.application_id), version='1')
+                    for command in body] if isinstance(body, list) else []
+
+        if parts[0] == 'interactions' and parts[-1] == 'callback':
+            self.complete(('interaction', parts[1]), 'response')
+            return None
+
+        if parts[0] == 'webhooks':
+            token = parts[2]
+            if method == 'POST':
+                self.complete(('followup', token), 'followup')
+            channel_id = self.text_channels[0]['id']
+            return self._bot_message(channel_id, body)
+
+        if parts[0] == 'channels':
+            channel_id = parts[1]
+            if len(parts) == 3 and parts[2] == 'messages' and method == 'POST':
+                message = self._bot_message(channel_id, body)
+                if channel_id != self.log_channel['id']:
+                    self.complete(('channel_message', channel_id), 'channel message')
+                return message
+            if len(parts) == 4 and parts[2] == 'messages' and method == 'DELETE':
+                self.complete(('message', parts[3]), 'deleted')
+                return None
+            if len(parts) == 4 and parts[2] == 'messages' and method == 'PATCH':
+                return self._bot_message(channel_id, body)
+            if len(parts) == 4 and parts[2] == 'permissions':
+                return None
+            if len(parts) == 2 and method == 'PATCH':
+                channel = self.channels.get(channel_id)
+                if channel is not None:
+                    channel.update({k: v for k, v in body.items() if k in ('name', 'topic', 'parent_id')})
+                return channel
+            if len(parts) == 2 and method == 'DELETE':
+                channel = self.channels.pop(channel_id, None)
+                if channel is not None:
+                    await self.dispatch('CHANNEL_DELETE', channel)
+                return channel
+
+        if parts[0] == 'guilds':
+            if len(parts) == 3 and parts[2] == 'channels' and method == 'POST':
+                channel = self._channel(body.get('name', 'канал'), body.get('type', 0), body.get('parent_id'))
+                channel['permission_overwrites'] = body.get('permission_overwrites', [])
+                channel['topic'] = body.get('topic')
+                self.channels[channel['id']] = channel
+                await self.dispatch('CHANNEL_CREATE', channel)
+                return channel
+            if len(parts) == 3 and parts[2] == 'roles' and method == 'POST':
+                role = self._role(body.get('name', 'роль'), len(self.roles), str(body.get('permissions', '0')))
+                self.roles.append(role)
+                await self.dispatch('GUILD_ROLE_CREATE', {'guild_id': self.guild['id'], 'role': role})
+                return role
+            if len(parts) == 6 and parts[2] == 'members' and parts[4] == 'roles':
+                return None
+            if len(parts) == 4 and parts[2] == 'members':
+                member = self.members.get(parts[3])
+                if member is not None and method == 'PATCH':
+                    member.update({k: v for k, v in body.items() if k == 'communication_disabled_until'})
+                return member
+
+        self.unhandled[route_template(method, path)] += 1
+        return {}
+
+    # ---- Запуск ----
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{port}'
+        self.gateway_url = f'ws://{host}:{port}/gateway'
+        return self.base_url + API_PREFIX
+
+    async def stop(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,18 @@
+import os
+import runpy
+import sys
+
+import discord
+import yarl
+
+# Запуск бота на стенде: python loadtest/run_bot.py <REST> <шлюз>
+# REST и шлюз Discord подменяются до импорта бота, сам bot.py о стенде не знает.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == "__main__":
+    api_base, gateway = sys.argv[1:3]
+    discord.http.Route.BASE = api_base
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(gateway)
+    sys.path.insert(0, ROOT)
+    runpy.run_path(os.path.join(ROOT, 'bot.py'), run_name='__main__')
@@ -0,0 +1,154 @@
+import asyncio
+import random
+
+from loadtest.mock_discord import MockDiscord, iso_now, snowflake
+
+# Сценарии отправляют события через шлюз с заданной частотой и отмечают,
+# какой ответ бота ждать: по нему считается сквозная задержка.
+
+SCENARIOS = {}
+
+
+def scenario(name: str):
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+async def paced(count: int, rate: float, send):
+    """Вызвать send(i) count раз с частотой rate в секунду"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i in range(count):
+        delay = start + i / rate - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await send(i)
+
+
+def member_without_user(member: dict) -> dict:
+    return {key: value for key, value in member.items() if key != 'user'}
+
+
+async def send_message(server: MockDiscord, channel: dict, member: dict, content: str) -> str:
+    message_id = str(snowflake())
+    await server.dispatch('MESSAGE_CREATE', {
+        'id': message_id,
+        'channel_id': channel['id'],
+        'guild_id': server.guild['id'],
+        'author': member['user'],
+        'member': member_without_user(member),
+        'content': content,
+        'timestamp': iso_now(),
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': [],
+        'components': [],
+        'pinned': False,
+        'type': 0,
+        'flags': 0
+    })
+    return message_id
+
+
+async def send_command(server: MockDiscord, name: str, options: list, resolved_members: list = ()) -> tuple:
+    """Слеш-команда от владельца сервера (у него права администратора)"""
+    interaction_id, token = str(snowflake()), f'token-{snowflake()}'
+    owner = server.members[server.owner['id']]
+    data = {'id': str(snowflake()), 'name': name, 'type': 1, 'options': options}
+    if resolved_members:
+        data['resolved'] = {
+            'users': {m['user']['id']: m['user'] for m in resolved_members},
+            'members': {m['user']['id']: dict(member_without_user(m), permissions='0') for m in resolved_members}
+        }
+    server.track(('interaction', interaction_id), name)
+    await server.dispatch('INTERACTION_CREATE', {
+        'id': interaction_id,
+        'application_id': str(server.application_id),
+        'type': 2,
+        'data': data,
+        'guild_id': server.guild['id'],
+        'channel_id': server.text_channels[0]['id'],
+        'member': dict(owner, permissions=str((1 << 41) - 1)),
+        'token': token,
+        'version': 1,
+        'locale': 'ru',
+        'guild_locale': 'ru',
+        'app_permissions': str((1 << 41) - 1),
+        'entitlements': []
+    })
+    return interaction_id, token
+
+
+@scenario('flood')
+async def message_flood(server: MockDiscord, count: int, rate: float):
+    """Несколько спамеров повторяют одно сообщение: ждем удаления каждого повтора"""
+    spammers = server.pick_members(10)
+    channels = server.text_channels
+    rng = random.Random(1)
+
+    async def send(i):
+        member = spammers[i % len(spammers)]
+        channel = channels[(i // len(spammers)) % len(channels)]
+        message_id = await send_message(server, channel, member, f"бесплатный нитро тут discord-gift {rng.randint(0, 3)}")
+        server.track(('message', message_id), 'spam message')
+
+    await paced(count, rate, send)
+
+
+@scenario('raid')
+async def mass_join(server: MockDiscord, count: int, rate: float):
+    """Волна входов со свежих аккаунтов и одинаковые сообщения в разных каналах"""
+    server.track(('embed', '🚨 РЕЖИМ РЕЙДА'), 'first join')
+    joined = []
+
+    async def join(i):
+        member = server.add_member(f'рейдер-{i}')
+        joined.append(member)
+        await server.dispatch('GUILD_MEMBER_ADD', dict(member, guild_id=server.guild['id']))
+
+    await paced(count, rate, join)
+
+    async def post(i):
+        channel = server.text_channels[i % len(server.text_channels)]
+        message_id = await send_message(
+            server, channel, joined[i % len(joined)],
+            f"Заходите на наш сервер, там раздают подарки всем участникам! вариант {i % 7}"
+        )
+        server.track(('message', message_id), 'raid message')
+
+    await paced(count, rate, post)
+
+
+@scenario('warns')
+async def warn_burst(server: MockDiscord, count: int, rate: float):
+    """Модератор выдает варны подряд разным участникам"""
+    targets = server.pick_members(max(count // 3, 1))
+
+    async def warn(i):
+        target = targets[i % len(targets)]
+        await send_command(server, 'варн', [
+            {'name': 'участник', 'type': 6, 'value': target['user']['id']},
+            {'name': 'причина', 'type': 3, 'value': f'нагрузочный тест {i}'},
+            {'name': 'уровень', 'type': 4, 'value': 1}
+        ], [target])
+
+    await paced(count, rate, warn)
+
+
+@scenario('tickets')
+async def ticket_storm(server: MockDiscord, count: int, rate: float):
+    """Много тикетов сразу: ждем ответа-отсрочки и итогового сообщения"""
+    async def ticket(i):
+        _, token = await send_command(server, 'тикет', [
+            {'name': 'тема', 'type': 3, 'value': f'вопрос {i}'},
+            {'name': 'описание', 'type': 3, 'value': 'нагрузочный тест'}
+        ])
+        server.track(('followup', token), 'ticket')
+
+    await paced(count, rate, ticket)
@@ -0,0 +1,157 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+
+import discord
+
+# Ограничения Discord: суммарный текст всех эмбедов сообщения, заголовок и описание одного эмбеда
+MAX_MESSAGE_EMBED_CHARS = 6000
+MAX_TITLE_CHARS = 256
+MAX_DESCRIPTION_CHARS = 4096
+
+
+class LogDispatcher:
+    """Очередь логов по серверам: пачки до 10 эмбедов (не больше 6000 символов) и схлопывание повторов"""
+
+    def __init__(self, max_batch: int = 10, flush_interval: float = 2.0,
+                 max_pending: int = 500, max_backoff: float = 60.0):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        # guild_id -> OrderedDict[(title, description)] = [count, last_time]
+        self._pending = {}
+        self._channels = {}
+        self._events = {}
+        self._tasks = {}
+        self.metrics = {
+            'queued': 0,
+            'collapsed': 0,
+            'sent_messages': 0,
+            'sent_embeds': 0,
+            'rate_limited': 0,
+            'dropped_overflow': 0,
+            'dropped_errors': 0
+        }
+
+    def queue_depth(self, guild_id: int = None) -> int:
+        """Сколько записей ждет отправки"""
+        if guild_id is not None:
+            return len(self._pending.get(guild_id, ()))
+        return sum(len(pending) for pending in self._pending.values())
+
+    def enqueue(self, channel: discord.TextChannel, title: str, description: str):
+        """Поставить запись в очередь канала логов"""
+        guild_id = channel.guild.id
+        self._channels[guild_id] = channel
+        pending = self._pending.setdefault(guild_id, OrderedDict())
+        key = (title, description)
+        now = datetime.now()
+        self.metrics['queued'] += 1
+
+        if key in pending:
+            pending[key][0] += 1
+            pending[key][1] = now
+            self.metrics['collapsed'] += 1
+        else:
+            pending[key] = [1, now]
+            if len(pending) > self.max_pending:
+                pending.popitem(last=False)
+                self.metrics['dropped_overflow'] += 1
+
+        event = self._events.setdefault(guild_id, asyncio.Event())
+        if len(pending) >= self.max_batch:
+            event.set()
+
+        task = self._tasks.get(guild_id)
+        if task is None or task.done():
+            self._tasks[guild_id] = asyncio.get_running_loop().create_task(self._worker(guild_id))
+
+    def _build_embed(self, guild_id: int, title: str, description: str, count: int,
+                     timestamp: datetime) -> discord.Embed:
+        embed = discord.Embed(
+            title=(f"{title} ×{count}" if count > 1 else title)[:MAX_TITLE_CHARS],
+            description=description[:MAX_DESCRIPTION_CHARS],
+            color=discord.Color.blurple(),
+            timestamp=timestamp
+        )
+        embed.set_footer(text=f"ID сервера: {guild_id}")
+        return embed
+
+    def _take_batch(self, guild_id: int) -> tuple:
+        """Записи и эмбеды для одного сообщения: до max_batch штук и MAX_MESSAGE_EMBED_CHARS символов"""
+        pending = self._pending[guild_id]
+        batch = []
+        embeds = []
+        chars = 0
+        while pending and len(batch) < self.max_batch:
+            (title, description), (count, timestamp) = item = pending.popitem(last=False)
+            embed = self._build_embed(guild_id, title, description, count, timestamp)
+            if batch and chars + len(embed) > MAX_MESSAGE_EMBED_CHARS:
+                # Не помещается: запись уйдет первой в следующем сообщении
+                pending[item[0]] = item[1]
+                pending.move_to_end(item[0], last=False)
+                break
+            batch.append(item)
+            embeds.append(embed)
+            chars += len(embed)
+        return batch, embeds
+
+    def _requeue(self, guild_id: int, batch: list):
+        # Неотправленные записи возвращаются в начало очереди
+        pending = self._pending[guild_id]
+        for key, (count, timestamp) in reversed(batch):
+            if key in pending:
+                pending[key][0] += count
+            else:
+                pending[key] = [count, timestamp]
+            pending.move_to_end(key, last=False)
+
+    async def _worker(self, guild_id: int):
+        event = self._events[guild_id]
+        backoff = 1.0
+        while self._pending.get(guild_id):
+            try:
+                await asyncio.wait_for(event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+
+            while self._pending.get(guild_id):
+                channel = self._channels[guild_id]
+                batch, embeds = self._take_batch(guild_id)
+                try:
+                    await channel.send(embeds=embeds)
+                except discord.HTTPException as e:
+                    if e.status == 429 or e.status >= 500:
+                        # Ждем и пробуем снова, записи не теряются
+                        self.metrics['rate_limited'] += 1
+                        self._requeue(guild_id, batch)
+                        await asyncio.sleep(backoff)
+                        backoff = min(backoff * 2, self.max_backoff)
+                        continue
+                    self.metrics['dropped_errors'] += len(batch)
+                    print(f"Ошибка отправки логов на сервере {guild_id}: {e}")
+                    break
+                except Exception as e:
+                    # Пачка теряется, но обработчик сервера продолжает работу
+                    self.metrics['dropped_errors'] += len(batch)
+                    print(f"Ошибка отправки логов на сервере {guild_id}: {e}")
+                else:
+                    backoff = 1.0
+                    self.metrics['sent_messages'] += 1
+                    self.metrics['sent_embeds'] += len(embeds)
+                # Неполная пачка ждет следующего интервала
+                if len(self._pending.get(guild_id, ())) < self.max_batch:
+                    break
+
+        self._tasks.pop(guild_id, None)
+
+    async def flush(self):
+        """Отправить все, что накопилось (при остановке бота)"""
+        for guild_id, event in self._events.items():
+            if self._pending.get(guild_id):
+                event.set()
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=10)
@@ -0,0 +1,241 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left
+
+import aiohttp
+import discord
+from discord import app_commands
+
+# Границы гистограмм в секундах: от долей миллисекунды (автомодерация) до секунд (REST)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def header(self) -> list:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self) -> list:
+        # Копия словаря: /metrics читается из потока Flask, пока цикл событий пишет
+        return [
+            f'{self.name}{format_labels(self.labels, key)} {format_value(value)}'
+            for key, value in list(self._values.items())
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), callback=None):
+        super().__init__(name, documentation, labels)
+        # callback() -> значение или {метки: значение}, вызывается при каждом чтении
+        self.callback = callback
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def samples(self) -> list:
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception as e:
+                print(f"Ошибка метрики {self.name}: {e}")
+                return []
+            self._values = value if isinstance(value, dict) else {(): value}
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = SLOW_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        # Счетчики корзин без накопления: накопленные суммы считаются только при выгрузке
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self) -> list:
+        lines = []
+        for key, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), list(counts)):
+                cumulative += bucket_count
+                labels = format_labels(self.labels + ('le',), key + (format_value(float(bound)),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """Набор метрик с выгрузкой в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = (), callback=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (),
+                  buckets: tuple = SLOW_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+COMMAND_SECONDS = REGISTRY.histogram(
+    'bot_command_duration_seconds', 'Время выполнения слеш-команд', ('command', 'status')
+)
+MESSAGE_SECONDS = REGISTRY.histogram(
+    'bot_on_message_duration_seconds', 'Время обработки сообщения в on_message', buckets=FAST_BUCKETS
+)
+AUTOMOD_SECONDS = REGISTRY.histogram(
+    'bot_automod_rule_duration_seconds', 'Время проверки правила автомодерации',
+    ('stage', 'rule'), buckets=FAST_BUCKETS
+)
+AUTOMOD_HITS = REGISTRY.counter(
+    'bot_automod_hits_total', 'Срабатывания правил автомодерации', ('stage', 'rule')
+)
+REST_SECONDS = REGISTRY.histogram(
+    'discord_rest_request_duration_seconds', 'Запросы к REST API по маршрутам', ('method', 'route', 'status')
+)
+RATE_LIMITS = REGISTRY.counter(
+    'discord_rest_rate_limited_total', 'Ответы 429 от REST API', ('scope',)
+)
+LOOP_LAG = REGISTRY.histogram(
+    'bot_event_loop_lag_seconds', 'Задержка цикла событий', buckets=FAST_BUCKETS + (0.25, 0.5, 1.0)
+)
+
+
+class TimedCommandTree(app_commands.CommandTree):
+    """Дерево команд, которое замеряет время каждой слеш-команды.
+    Успешное завершение отмечает событие app_command_completion (observe_command в bot.py)"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.type is discord.InteractionType.application_command:
+            interaction.extras['started'] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        observe_command(interaction, 'error')
+        await super().on_error(interaction, error)
+
+
+def observe_command(interaction: discord.Interaction, status: str):
+    """Записать время команды с момента interaction_check"""
+    started = interaction.extras.pop('started', None)
+    if started is None:
+        return
+    command = interaction.command
+    COMMAND_SECONDS.observe(
+        time.perf_counter() - started,
+        command.qualified_name if command is not None else 'unknown',
+        status
+    )
+
+
+def instrument_http(http):
+    """Обернуть HTTPClient.request: время и статус по шаблону маршрута"""
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            result = await request(route, **kwargs)
+            status = 'ok'
+            return result
+        except Exception as e:
+            status = str(getattr(e, 'status', 'error'))
+            raise
+        finally:
+            # route.path - шаблон вида /channels/{channel_id}/messages, без конкретных ID
+            REST_SECONDS.observe(time.perf_counter() - start, route.method, route.path, status)
+
+    http.request = timed_request
+
+
+def rate_limit_trace() -> aiohttp.TraceConfig:
+    """Счетчик ответов 429 для Client(http_trace=...): discord.py повторяет такие запросы сам"""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_end(session, context, params):
+        response = params.response
+        if response.status == 429:
+            # Каждый ответ считается один раз: глобальный лимит Discord помечает заголовком
+            is_global = response.headers.get('X-RateLimit-Global', '').lower() == 'true'
+            RATE_LIMITS.inc('global' if is_global else 'route')
+
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Насколько позже запланированного просыпается цикл событий"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(loop.time() - start - interval, 0.0))
@@ -0,0 +1,363 @@
+import asyncio
+import bisect
+import json
+import os
+import struct
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+# Файл индекса закрытого сегмента: число событий, затем массивы смещений, времени, серверов, участников, модераторов
+INDEX_HEADER = struct.Struct('<Q')
+INDEX_ARRAYS = ('Q', 'd', 'q', 'q', 'q')
+# Сколько ключей индекса чистится за один шаг цикла событий после удаления старого сегмента
+TRIM_CHUNK = 10000
+
+
+class ModJournal:
+    """Журнал модерации: сегменты только на дозапись и индексы по серверу, участнику, модератору и времени"""
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, max_segments: int = 64,
+                 flush_interval: float = 0.5):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        # События копятся в памяти и сериализуются/дописываются в файл одной записью раз в flush_interval
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._flush_handle = None
+        # Старые сегменты удаляются вместе с их записями в индексах
+        self.max_segments = max_segments
+        # Позиция события = seq - self._first; массивы одной длины, по порядку записи
+        self._first = 0
+        self._segment = array('I')
+        self._offset = array('Q')
+        self._time = array('d')
+        self._guild = array('q')
+        self._user = array('q')
+        self._moderator = array('q')
+        # ID -> возрастающий массив seq; нулевые ID (автомодерация, нет участника) не индексируются
+        self._by_guild = {}
+        self._by_user = {}
+        self._by_moderator = {}
+        self._segments = []
+        self._file = None
+        self._size = 0
+        # Номер первого события открытого сегмента
+        self._segment_first = 0
+        # Файлы индексов и удаление сегментов - в одном потоке по порядку, чистка индексов - частями в цикле событий
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='journal')
+        self._io = set()
+        self._trim_task = None
+        self.metrics = {
+            'events': 0,
+            'appended': 0,
+            'flushes': 0,
+            'segments': 0,
+            'rotations': 0,
+            'queries': 0,
+            'last_query_ms': 0.0
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self._time)
+
+    # ---- Файлы ----
+    def _path(self, number: int, suffix: str = SEGMENT_SUFFIX) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:06d}{suffix}")
+
+    def _load(self):
+        numbers = sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        for number in numbers[:-1]:
+            if not self._load_index(number):
+                self._scan(number)
+            self._segments.append(number)
+        # Последний сегмент открыт на дозапись, индекс для него строится по файлу
+        current = numbers[-1] if numbers else 1
+        self._segment_first = self._first + len(self)
+        self._size = self._scan(current) if numbers else 0
+        self._segments.append(current)
+        self._file = open(self._path(current), 'ab', buffering=0)
+        self.metrics['events'] = len(self)
+        self.metrics['segments'] = len(self._segments)
+
+    def _load_index(self, number: int) -> bool:
+        try:
+            with open(self._path(number, INDEX_SUFFIX), 'rb') as f:
+                (count,) = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                columns = []
+                for typecode in INDEX_ARRAYS:
+                    column = array(typecode)
+                    column.fromfile(f, count)
+                    columns.append(column)
+        except (OSError, EOFError, struct.error):
+            return False
+        offsets, times, guilds, users, moderators = columns
+        seq = self._first + len(self._time)
+        self._segment.extend(array('I', [number]) * count)
+        self._offset.extend(offsets)
+        self._time.extend(times)
+        self._guild.extend(guilds)
+        self._user.extend(users)
+        self._moderator.extend(moderators)
+        for index, column in ((self._by_guild, guilds), (self._by_user, users), (self._by_moderator, moderators)):
+            for i, key in enumerate(column, seq):
+                if key:
+                    seqs = index.get(key)
+                    if seqs is None:
+                        seqs = index[key] = array('q')
+                    seqs.append(i)
+        return True
+
+    def _scan(self, number: int) -> int:
+        """Прочитать сегмент целиком; оборванная последняя строка обрезается. Возвращает размер"""
+        offset = 0
+        with open(self._path(number), 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    event = json.loads(line)
+                    self._index(number, offset, event['ts'], event['guild_id'],
+                                event.get('user_id') or 0, event.get('moderator_id') or 0)
+                except (ValueError, KeyError) as e:
+                    print(f"Ошибка чтения журнала {self._path(number)} @ {offset}: {e}")
+                offset += len(line)
+        if os.path.getsize(self._path(number)) != offset:
+            os.truncate(self._path(number), offset)
+        return offset
+
+    def _background(self, func, *args):
+        """Файловая операция в потоке; без цикла событий (загрузка, остановка) - сразу"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            func(*args)
+            return
+        future = loop.run_in_executor(self._executor, func, *args)
+        self._io.add(future)
+        future.add_done_callback(self._io_done)
+
+    def _io_done(self, future):
+        self._io.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Ошибка файлов журнала {self.directory}: {future.exception()}")
+
+    def _write_index(self, number: int, columns: list):
+        tmp_path = self._path(number, INDEX_SUFFIX + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(len(columns[0])))
+            for column in columns:
+                column.tofile(f)
+        os.replace(tmp_path, self._path(number, INDEX_SUFFIX))
+
+    def _remove_segment(self, number: int):
+        for suffix in (SEGMENT_SUFFIX, INDEX_SUFFIX):
+            try:
+                os.remove(self._path(number, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _rotate(self, end: int):
+        """Закрыть текущий сегмент (события до позиции end) и начать следующий"""
+        self._file.close()
+        # Столбцы копируются сейчас, пока позиции не сдвинулись; файл пишется в потоке
+        number = self._segments[-1]
+        start = self._segment_first - self._first
+        columns = [column[start:end] for column in (self._offset, self._time, self._guild, self._user, self._moderator)]
+        self._background(self._write_index, number, columns)
+        self._segment_first = self._first + end
+        self._segments.append(self._segments[-1] + 1)
+        self._file = open(self._path(self._segments[-1]), 'ab', buffering=0)
+        self._size = 0
+        self.metrics['rotations'] += 1
+
+    def _drop_oldest(self):
+        number = self._segments.pop(0)
+        count = bisect.bisect_right(self._segment, number)
+        for column in (self._segment, self._offset, self._time, self._guild, self._user, self._moderator):
+            del column[:count]
+        self._first += count
+        self._background(self._remove_segment, number)
+        self.metrics['events'] = len(self)
+        # Поиск и так не смотрит номера меньше self._first, индексы чистятся от них ради памяти
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            for index in (self._by_guild, self._by_user, self._by_moderator):
+                self._trim(index, list(index))
+            return
+        if self._trim_task is None or self._trim_task.done():
+            self._trim_task = loop.create_task(self._trim_indexes())
+
+    def _trim(self, index: dict, keys: list):
+        for key in keys:
+            seqs = index.get(key)
+            if seqs is None:
+                continue
+            del seqs[:bisect.bisect_left(seqs, self._first)]
+            if not seqs:
+                del index[key]
+
+    async def _trim_indexes(self):
+        """Убрать из индексов номера удаленных событий частями, не занимая цикл событий надолго"""
+        for index in (self._by_guild, self._by_user, self._by_moderator):
+            keys = list(index)
+            for start in range(0, len(keys), TRIM_CHUNK):
+                self._trim(index, keys[start:start + TRIM_CHUNK])
+                await asyncio.sleep(0)
+
+    # ---- Запись ----
+    def _index(self, number: int, offset: int, ts: float, guild_id: int, user_id: int, moderator_id: int):
+        seq = self._first + len(self._time)
+        self._segment.append(number)
+        self._offset.append(offset)
+        self._time.append(ts)
+        self._guild.append(guild_id)
+        self._user.append(user_id)
+        self._moderator.append(moderator_id)
+        for index, key in ((self._by_guild, guild_id), (self._by_user, user_id), (self._by_moderator, moderator_id)):
+            if key:
+                seqs = index.get(key)
+                if seqs is None:
+                    seqs = index[key] = array('q')
+                seqs.append(seq)
+
+    def record(self, guild_id: int, action: str, user_id: Optional[int] = None,
+               moderator_id: Optional[int] = None, **details) -> int:
+        """Дописать событие; возвращает его номер"""
+        # Время не убывает, иначе поиск по времени через bisect сломается
+        ts = max(time.time(), self._time[-1] if self._time else 0.0)
+        event = {
+            'ts': ts,
+            'guild_id': guild_id,
+            'action': action,
+            'user_id': user_id,
+            'moderator_id': moderator_id
+        }
+        event.update(details)
+        self._pending.append(event)
+        # Сегмент и смещение станут известны при сбросе; до него событие ищется, но не читается
+        self._index(self._segments[-1], 0, ts, guild_id, user_id or 0, moderator_id or 0)
+        self.metrics['appended'] += 1
+        self.metrics['events'] = len(self)
+        if self._flush_handle is None:
+            try:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                self.flush()
+        return self._first + len(self._time) - 1
+
+    # ---- Поиск ----
+    def query(self, guild_id: Optional[int] = None, user_id: Optional[int] = None,
+              moderator_id: Optional[int] = None, since: Optional[float] = None,
+              until: Optional[float] = None, limit: int = 200) -> list:
+        """Номера последних подходящих событий, от новых к старым"""
+        # Сброс до поиска: ротация внутри сброса сдвигает позиции, найденные номера должны ее пережить
+        self.flush()
+        started = time.perf_counter()
+        filters = [
+            (index, column, key)
+            for index, column, key in (
+                (self._by_guild, self._guild, guild_id),
+                (self._by_user, self._user, user_id),
+                (self._by_moderator, self._moderator, moderator_id)
+            )
+            if key is not None
+        ]
+        # Обход идет по самому короткому индексу, остальные условия проверяются по столбцам
+        if filters:
+            candidates = min((index.get(key, ()) for index, _, key in filters), key=len)
+        else:
+            candidates = range(self._first, self._first + len(self))
+        lo = self._first + (bisect.bisect_left(self._time, since) if since is not None else 0)
+        hi = self._first + (bisect.bisect_right(self._time, until) if until is not None else len(self))
+        start, end = bisect.bisect_left(candidates, lo), bisect.bisect_left(candidates, hi)
+
+        result = []
+        for i in range(end - 1, start - 1, -1):
+            seq = candidates[i]
+            position = seq - self._first
+            if all(column[position] == key for _, column, key in filters):
+                result.append(seq)
+                if len(result) >= limit:
+                    break
+        self.metrics['queries'] += 1
+        self.metrics['last_query_ms'] = (time.perf_counter() - started) * 1000
+        return result
+
+    def flush(self):
+        """Дописать накопленные события в текущий сегмент"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        position = len(self._time) - len(pending)
+        chunk = bytearray()
+        for event in pending:
+            self._segment[position] = self._segments[-1]
+            self._offset[position] = self._size
+            line = json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n'
+            chunk += line
+            self._size += len(line)
+            position += 1
+            if self._size >= self.segment_bytes:
+                self._file.write(chunk)
+                chunk.clear()
+                self._rotate(position)
+        if chunk:
+            self._file.write(chunk)
+        self.metrics['flushes'] += 1
+        # Позиции событий сдвигаются при удалении старых сегментов, поэтому только после записи
+        while len(self._segments) > self.max_segments:
+            self._drop_oldest()
+        self.metrics['segments'] = len(self._segments)
+
+    def locate(self, seqs: list) -> list:
+        """Где лежат события: [(сегмент, смещение)]; считается в цикле событий до чтения в потоке"""
+        # Найденные события могут быть еще в буфере
+        self.flush()
+        # События, удаленные вместе со старым сегментом после поиска, пропускаются
+        return [
+            (self._segment[seq - self._first], self._offset[seq - self._first])
+            for seq in seqs if seq >= self._first
+        ]
+
+    def read(self, locations: list) -> list:
+        """Прочитать события по адресам (блокирующее, для asyncio.to_thread)"""
+        events = []
+        files = {}
+        try:
+            for number, offset in locations:
+                f = files.get(number)
+                if f is None:
+                    try:
+                        f = files[number] = open(self._path(number), 'rb')
+                    except FileNotFoundError:
+                        # Сегмент удален ротацией, пока шел поиск
+                        continue
+                f.seek(offset)
+                events.append(json.loads(f.readline()))
+        finally:
+            for f in files.values():
+                f.close()
+        return events
+
+    def close(self):
+        """Дописать буфер и дождаться файловых операций ротации"""
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+
+import discord
+
+
+class ModPermissionCache:
+    """Кэш модераторских ролей по серверам и статуса участников (LRU)"""
+
+    def __init__(self, mod_roles, max_members: int = 10000):
+        # guild_id -> список ID ролей или None, если данные сервера еще не загружены
+        self.mod_roles = mod_roles
+        self.max_members = max_members
+        self._role_ids = {}
+        # Поколение сервера входит в ключ: при его смене старые записи просто не находятся
+        self._generations = {}
+        self._members = OrderedDict()
+        self.metrics = {'hits': 0, 'misses': 0}
+
+    def role_ids(self, guild_id: int) -> frozenset:
+        """Множество ID модераторских ролей сервера"""
+        role_ids = self._role_ids.get(guild_id)
+        if role_ids is None:
+            roles = self.mod_roles(guild_id)
+            if roles is None:
+                return frozenset()
+            role_ids = frozenset(roles)
+            self._role_ids[guild_id] = role_ids
+        return role_ids
+
+    def is_mod(self, member: discord.Member) -> bool:
+        """Является ли участник модератором или администратором"""
+        guild_id = member.guild.id
+        key = (guild_id, self._generations.get(guild_id, 0), member.id)
+        cached = self._members.get(key)
+        if cached is not None:
+            self._members.move_to_end(key)
+            self.metrics['hits'] += 1
+            return cached
+
+        self.metrics['misses'] += 1
+        role_ids = self.role_ids(guild_id)
+        result = (
+            member.guild_permissions.administrator
+            or any(role.id in role_ids for role in member.roles)
+        )
+        self._members[key] = result
+        if len(self._members) > self.max_members:
+            self._members.popitem(last=False)
+        return result
+
+    def invalidate_member(self, guild_id: int, member_id: int):
+        """Сбросить статус одного участника (изменились его роли)"""
+        self._members.pop((guild_id, self._generations.get(guild_id, 0), member_id), None)
+
+    def invalidate_guild(self, guild_id: int):
+        """Сбросить все данные сервера (изменились роли или настройки)"""
+        self._role_ids.pop(guild_id, None)
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+import discord
+
+from storage import WriteBehind, load_json
+
+
+class TokenBucket:
+    """Ограничение частоты запросов: rate запросов за per секунд"""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def is_idle(self) -> bool:
+        """Запас восстановился полностью: такое ведро можно выбросить и создать заново"""
+        now = time.monotonic()
+        if self._lock.locked() or now < self.paused_until:
+            return False
+        return self.tokens + (now - self.updated) * self.rate / self.per >= self.rate
+
+    def pause(self, seconds: float):
+        """Остановить выдачу после ответа 429"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class PermissionFanout:
+    """Массовая установка прав в каналах с ограничением параллельности"""
+
+    def __init__(self, filename: str, writer: WriteBehind, concurrency: int = 5,
+                 guild_rate: int = 40, route_rate: int = 5, route_per: float = 5.0,
+                 max_attempts: int = 5):
+        self.filename = filename
+        self.writer = writer
+        self.concurrency = concurrency
+        self.guild_rate = guild_rate
+        self.route_rate = route_rate
+        self.route_per = route_per
+        self.max_attempts = max_attempts
+        # job_key -> {'guild_id', 'target_id', 'overwrite', 'done'}
+        self.jobs = load_json(filename)
+        self._guild_buckets = {}
+        self._route_buckets = {}
+        self._running = {}
+        self._tasks = set()
+        self.metrics = {'requests': 0, 'rate_limited': 0, 'failed': 0}
+        writer.register(filename, lambda: self.jobs)
+
+    @staticmethod
+    def job_key(guild_id: int, target_id: int) -> str:
+        return f"{guild_id}:{target_id}"
+
+    def progress(self, guild_id: int, target_id: int) -> Optional[tuple]:
+        """(сделано, всего) для незавершенной задачи"""
+        task_info = self._running.get(self.job_key(guild_id, target_id))
+        return task_info['progress'] if task_info else None
+
+    def _bucket(self, buckets: dict, key, rate: int, per: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, per)
+        return bucket
+
+    def _prune_buckets(self):
+        """Выбросить полные ведра: иначе словари растут с каждым каналом, где менялись права"""
+        for buckets in (self._guild_buckets, self._route_buckets):
+            for key in [key for key, bucket in buckets.items() if bucket.is_idle()]:
+                del buckets[key]
+
+    async def _apply_one(self, channel, target, overwrite: discord.PermissionOverwrite):
+        guild_bucket = self._bucket(self._guild_buckets, channel.guild.id, self.guild_rate, 1.0)
+        # Права канала в Discord ограничиваются по маршруту отдельно для каждого канала
+        route_bucket = self._bucket(
+            self._route_buckets, f"PUT /channels/{channel.id}/permissions",
+            self.route_rate, self.route_per
+        )
+        for attempt in range(self.max_attempts):
+            await guild_bucket.acquire()
+            await route_bucket.acquire()
+            self.metrics['requests'] += 1
+            try:
+                await channel.set_permissions(target, overwrite=overwrite, reason="Настройка роли мута")
+                return True
+            except discord.HTTPException as e:
+                if e.status == 429 or e.status >= 500:
+                    self.metrics['rate_limited'] += e.status == 429
+                    retry_after = getattr(e, 'retry_after', None) or 2 ** attempt
+                    route_bucket.pause(retry_after)
+                    continue
+                if e.status == 404:
+                    # Канал уже удален - считать его обработанным
+                    return True
+                raise
+        return False
+
+    async def apply(self, guild: discord.Guild, target, overwrite: dict,
+                    on_progress: Callable = None) -> int:
+        """Применить права ко всем каналам сервера; возвращает число ошибок"""
+        key = self.job_key(guild.id, target.id)
+        job = self.jobs.get(key)
+        if job is None or job['overwrite'] != overwrite:
+            job = {'guild_id': guild.id, 'target_id': target.id, 'overwrite': overwrite, 'done': []}
+            self.jobs[key] = job
+            self.writer.mark_dirty(self.filename)
+
+        done = set(job['done'])
+        channels = [channel for channel in guild.channels if channel.id not in done]
+        total = len(done) + len(channels)
+        permission_overwrite = discord.PermissionOverwrite(**overwrite)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        state = {'progress': (len(done), total)}
+        self._running[key] = state
+        failed = 0
+
+        async def worker(channel):
+            nonlocal failed
+            async with semaphore:
+                try:
+                    ok = await self._apply_one(channel, target, permission_overwrite)
+                except Exception as e:
+                    print(f"Ошибка установки прав в канале {channel.id}: {e}")
+                    ok = False
+                if not ok:
+                    failed += 1
+                    self.metrics['failed'] += 1
+                    return
+                job['done'].append(channel.id)
+                self.writer.mark_dirty(self.filename)
+                state['progress'] = (len(job['done']), total)
+                if on_progress:
+                    await on_progress(*state['progress'])
+
+        try:
+            await asyncio.gather(*(worker(channel) for channel in channels))
+        finally:
+            self._running.pop(key, None)
+            if not self._running:
+                self._prune_buckets()
+
+        if not failed:
+            self.jobs.pop(key, None)
+            self.writer.mark_dirty(self.filename)
+        return failed
+
+    def start(self, guild: discord.Guild, target, overwrite: dict,
+              on_progress: Callable = None) -> asyncio.Task:
+        """Запустить apply в фоне"""
+        task = asyncio.get_running_loop().create_task(self.apply(guild, target, overwrite, on_progress))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def resume(self, client: discord.Client):
+        """Продолжить задачи, прерванные перезапуском"""
+        for key, job in list(self.jobs.items()):
+            if key in self._running:
+                continue
+            guild = client.get_guild(job['guild_id'])
+            target = guild.get_role(job['target_id']) if guild else None
+            if target is None:
+                self.jobs.pop(key, None)
+                self.writer.mark_dirty(self.filename)
+                continue
+            await self.apply(guild, target, job['overwrite'])
@@ -0,0 +1,154 @@
+import re
+import time
+from array import array
+from collections import Counter, defaultdict, deque
+from itertools import chain
+from typing import Optional
+
+from bad_words_filter import normalize
+
+FINGERPRINT_BITS = 64
+BANDS = 8  # 8 полос по 8 бит: при расстоянии до 7 бит хотя бы одна полоса совпадает
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+# BIT_TABLES[bit][byte] - значение бита bit в байте byte, для подсчета голосов через bytes.translate
+BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Символьные n-граммы нормализованного текста без пробелов и знаков"""
+    text = NON_WORD_RE.sub('', normalize(text))
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-битный SimHash: похожие тексты дают близкие по Хэммингу отпечатки"""
+    features = shingles(text)
+    if not features:
+        return None
+    half = len(features) // 2
+    # Хэши n-грамм подряд по 8 байт; столбец байта - каждый 8-й байт. Голоса за бит считаются
+    # в C: translate превращает байты столбца в значения бита, count считает единицы.
+    # Порядок байт платформенный - отпечатки живут только в памяти процесса
+    rows = array('q', map(hash, features)).tobytes()
+    fingerprint = 0
+    for byte in range(FINGERPRINT_BITS // 8):
+        column = rows[byte::8]
+        for bit in range(8):
+            if column.translate(BIT_TABLES[bit]).count(1) > half:
+                fingerprint |= 1 << (byte * 8 + bit)
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class NearDuplicateIndex:
+    """Отпечатки сообщений сервера за последние window секунд с поиском по полосам (LSH)"""
+
+    def __init__(self, window: float = 60.0, max_distance: int = 6, min_length: int = 20,
+                 max_bucket: int = 200):
+        self.window = window
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.max_bucket = max_bucket
+        # guild_id -> {(полоса, значение): deque[(время, отпечаток, channel_id, author_id)]}
+        self._buckets = defaultdict(dict)
+        # guild_id -> deque[(время, [ключи полос])] для удаления устаревших записей
+        self._timeline = defaultdict(deque)
+
+    def _expire(self, guild_id: int, now: float):
+        timeline = self._timeline[guild_id]
+        buckets = self._buckets[guild_id]
+        deadline = now - self.window
+        while timeline and timeline[0][0] < deadline:
+            _, keys = timeline.popleft()
+            for key in keys:
+                bucket = buckets.get(key)
+                # Корзины упорядочены по времени, старые записи всегда в начале
+                while bucket and bucket[0][0] < deadline:
+                    bucket.popleft()
+                if bucket is not None and not bucket:
+                    del buckets[key]
+        if not timeline:
+            self._timeline.pop(guild_id, None)
+            self._buckets.pop(guild_id, None)
+
+    def check(self, guild_id: int, channel_id: int, author_id: int, content: str,
+              now: Optional[float] = None) -> tuple:
+        """Добавить сообщение и вернуть (число авторов, число каналов) среди похожих, включая его"""
+        if len(content) < self.min_length:
+            return 0, 0
+        fingerprint = simhash(content)
+        if fingerprint is None:
+            return 0, 0
+        now = time.monotonic() if now is None else now
+        self._expire(guild_id, now)
+
+        buckets = self._buckets[guild_id]
+        keys = [(band, (fingerprint >> (band * BAND_BITS)) & BAND_MASK) for band in range(BANDS)]
+        authors, channels = {author_id}, {channel_id}
+        # Запись лежит во всех 8 своих корзинах. При расстоянии до BANDS - 2 бит различия задевают
+        # не больше 6 полос, значит похожая запись совпадет хотя бы в двух корзинах; случайные
+        # совпадения по одной полосе отсеиваются подсчетом без сравнения отпечатков
+        min_matches = 2 if self.max_distance <= BANDS - 2 else 1
+        counts = Counter(chain.from_iterable(buckets.get(key, ()) for key in keys))
+        for entry, matches in counts.items():
+            if matches >= min_matches and hamming(fingerprint, entry[1]) <= self.max_distance:
+                channels.add(entry[2])
+                authors.add(entry[3])
+
+        entry = (now, fingerprint, channel_id, author_id)
+        for key in keys:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = deque(maxlen=self.max_bucket)
+            bucket.append(entry)
+        self._timeline[guild_id].append((now, keys))
+        return len(authors), len(channels)
+
+
+class JoinRateTracker:
+    """Частота входов на сервер: всплеск включает режим рейда"""
+
+    def __init__(self, threshold: int = 10, window: float = 10.0, raid_duration: float = 600.0):
+        self.threshold = threshold
+        self.window = window
+        self.raid_duration = raid_duration
+        self._joins = defaultdict(deque)
+        self._raid_until = {}
+
+    def member_joined(self, guild_id: int, now: Optional[float] = None) -> bool:
+        """Учесть вход; True, если режим рейда только что включился"""
+        now = time.monotonic() if now is None else now
+        joins = self._joins[guild_id]
+        joins.append(now)
+        while joins and joins[0] < now - self.window:
+            joins.popleft()
+
+        if len(joins) < self.threshold:
+            return False
+        started = not self.in_raid(guild_id, now)
+        # Пока входы продолжаются, режим продлевается
+        self._raid_until[guild_id] = now + self.raid_duration
+        return started
+
+    def in_raid(self, guild_id: int, now: Optional[float] = None) -> bool:
+        until = self._raid_until.get(guild_id)
+        if until is None:
+            return False
+        if (time.monotonic() if now is None else now) >= until:
+            del self._raid_until[guild_id]
+            self._joins.pop(guild_id, None)
+            return False
+        return True
+
+    def end_raid(self, guild_id: int):
+        self._raid_until.pop(guild_id, None)
+        self._joins.pop(guild_id, None)
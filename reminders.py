@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable
+
+import pytz
+
+from storage import WriteBehind, load_json
+
+
+class ReminderScheduler:
+    """Ежедневные напоминания по местному времени сервера с разбросом отправки"""
+
+    def __init__(self, filename: str, writer: WriteBehind, default_timezone: str = 'Europe/Moscow',
+                 default_hour: int = 12, window_minutes: int = 30, concurrency: int = 5):
+        self.filename = filename
+        self.writer = writer
+        self.default_timezone = default_timezone
+        self.default_hour = default_hour
+        self.window = window_minutes * 60
+        self.concurrency = concurrency
+        # guild_id -> {'timezone', 'hour', 'last_sent'}
+        self.config = load_json(filename)
+        self._channels = {}
+        self._in_flight = set()
+        self._tasks = set()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        writer.register(filename, lambda: self.config)
+
+    def _guild_config(self, guild_id: int) -> dict:
+        return self.config.get(str(guild_id), {})
+
+    def timezone(self, guild_id: int):
+        return pytz.timezone(self._guild_config(guild_id).get('timezone', self.default_timezone))
+
+    def configure(self, guild_id: int, timezone: str, hour: int):
+        """Задать часовой пояс и час напоминания (ошибка pytz, если пояс неизвестен)"""
+        pytz.timezone(timezone)
+        config = self.config.setdefault(str(guild_id), {})
+        config['timezone'] = timezone
+        config['hour'] = hour
+        self.writer.mark_dirty(self.filename)
+
+    def channel_id(self, guild_id: int):
+        return self._channels.get(guild_id)
+
+    def cache_channel(self, guild_id: int, channel_id):
+        if channel_id is None:
+            self._channels.pop(guild_id, None)
+        else:
+            self._channels[guild_id] = channel_id
+
+    def is_due(self, guild_id: int, now_utc: datetime) -> bool:
+        """Пора ли отправлять напоминание сегодня по местному времени"""
+        config = self._guild_config(guild_id)
+        local_now = now_utc.astimezone(self.timezone(guild_id))
+        return (
+            local_now.hour >= config.get('hour', self.default_hour)
+            and config.get('last_sent') != local_now.date().isoformat()
+        )
+
+    def offset(self, guild_id: int) -> float:
+        """Постоянная задержка сервера внутри окна рассылки"""
+        return (guild_id >> 22) % self.window if self.window else 0
+
+    def mark_sent(self, guild_id: int, now_utc: datetime):
+        local_date = now_utc.astimezone(self.timezone(guild_id)).date().isoformat()
+        self.config.setdefault(str(guild_id), {})['last_sent'] = local_date
+        self.writer.mark_dirty(self.filename)
+
+    async def _send(self, guild_id: int, delay: float, send: Callable[[int], Awaitable[bool]]):
+        try:
+            await asyncio.sleep(delay)
+            async with self._semaphore:
+                if await send(guild_id):
+                    self.mark_sent(guild_id, datetime.now(pytz.utc))
+        except Exception as e:
+            print(f"Ошибка напоминания на сервере {guild_id}: {e}")
+        finally:
+            self._in_flight.discard(guild_id)
+
+    def tick(self, guild_ids, send: Callable[[int], Awaitable[bool]]) -> int:
+        """Запланировать отправку для серверов, у которых подошло время"""
+        now_utc = datetime.now(pytz.utc)
+        loop = asyncio.get_running_loop()
+        scheduled = 0
+        for guild_id in guild_ids:
+            if guild_id in self._in_flight or not self.is_due(guild_id, now_utc):
+                continue
+            # Задержка отсчитывается от начала окна, поэтому опоздавший сервер уходит сразу
+            local_now = now_utc.astimezone(self.timezone(guild_id))
+            start = local_now.replace(
+                hour=self._guild_config(guild_id).get('hour', self.default_hour),
+                minute=0, second=0, microsecond=0
+            )
+            delay = max(self.offset(guild_id) - (local_now - start).total_seconds(), 0)
+            self._in_flight.add(guild_id)
+            task = loop.create_task(self._send(guild_id, delay, send))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            scheduled += 1
+        return scheduled
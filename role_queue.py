@@ -0,0 +1,63 @@
+import asyncio
+
+import discord
+
+
+class RoleAssignQueue:
+    """Очередь выдачи ролей без дублей и с ограниченной параллельностью"""
+
+    def __init__(self, workers: int = 3, max_attempts: int = 5):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._queue = asyncio.Queue()
+        self._pending = set()
+        self._tasks = []
+        self.metrics = {'queued': 0, 'duplicates': 0, 'assigned': 0, 'rate_limited': 0, 'failed': 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        """Запустить обработчики (повторный вызов ничего не делает)"""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, member: discord.Member, role: discord.Role, reason: str = None) -> bool:
+        """Поставить выдачу роли в очередь; False - уже стоит"""
+        key = (member.guild.id, member.id, role.id)
+        if key in self._pending:
+            self.metrics['duplicates'] += 1
+            return False
+        self.start()
+        self._pending.add(key)
+        self._queue.put_nowait((member, role, reason))
+        self.metrics['queued'] += 1
+        return True
+
+    async def _assign(self, member: discord.Member, role: discord.Role, reason: str):
+        for attempt in range(self.max_attempts):
+            try:
+                await member.add_roles(role, reason=reason)
+                self.metrics['assigned'] += 1
+                return
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    raise
+                self.metrics['rate_limited'] += e.status == 429
+                await asyncio.sleep(getattr(e, 'retry_after', None) or 2 ** attempt)
+        raise RuntimeError("превышено число попыток")
+
+    async def _worker(self):
+        while True:
+            member, role, reason = await self._queue.get()
+            try:
+                if role not in member.roles:
+                    await self._assign(member, role, reason)
+            except Exception as e:
+                self.metrics['failed'] += 1
+                print(f"Ошибка выдачи роли {role.id} участнику {member.id}: {e}")
+            finally:
+                self._pending.discard((member.guild.id, member.id, role.id))
+                self._queue.task_done()
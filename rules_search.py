@@ -0,0 +1,128 @@
+import math
+import re
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Окончания для легкого стемминга, длинные проверяются первыми
+ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'иях', 'ах', 'ях',
+    'ов', 'ев', 'ей', 'ий', 'ый', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю',
+    'ом', 'ем', 'ам', 'ям', 'ть', 'ти', 'ся', 'сь', 'ет', 'ит', 'ут', 'ют', 'ат', 'ят',
+    'ешь', 'ишь', 'ете', 'ите', 'ьте', 'ить', 'ать', 'ять', 'еть', 'ла', 'ло', 'ли', 'ия', 'ию',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й'
+), key=len, reverse=True)
+MIN_STEM = 3
+
+
+def stem(token: str) -> str:
+    """Отбросить типичное окончание, если остается основа не короче MIN_STEM"""
+    for ending in ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text: str) -> list:
+    """Нормализация: нижний регистр, ё -> е, основы слов"""
+    return [stem(token) for token in TOKEN_RE.findall(text.lower().replace('ё', 'е'))]
+
+
+def deletes(term: str) -> set:
+    """Все варианты слова без одной буквы"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class RulesIndex:
+    """Обратный индекс правил с ранжированием BM25 и поиском с опечатками"""
+
+    K1 = 1.2
+    B = 0.75
+    CATEGORY_BOOST = 2
+    FUZZY_WEIGHT = 0.5
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {doc_id: tf}
+        self._doc_terms = {}  # doc_id -> {term: tf}
+        self._doc_length = {}
+        self._total_length = 0
+        # Индекс удалений одной буквы: вариант -> слова словаря
+        self._deletes = defaultdict(set)
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _add_term(self, term: str):
+        self._deletes[term].add(term)
+        for variant in deletes(term):
+            self._deletes[variant].add(term)
+
+    def _remove_term(self, term: str):
+        for variant in deletes(term) | {term}:
+            terms = self._deletes.get(variant)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._deletes[variant]
+
+    def add(self, doc_id: str, text: str, category: str = ''):
+        """Добавить или обновить правило"""
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+
+        terms = defaultdict(int)
+        for term in tokenize(text):
+            terms[term] += 1
+        # Совпадение с категорией весит больше обычного слова
+        for term in tokenize(category):
+            terms[term] += self.CATEGORY_BOOST
+
+        for term, tf in terms.items():
+            if term not in self._postings:
+                self._add_term(term)
+            self._postings[term][doc_id] = tf
+
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = dict(terms)
+        self._doc_length[doc_id] = length
+        self._total_length += length
+
+    def remove(self, doc_id: str):
+        """Удалить правило из индекса"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._remove_term(term)
+        self._total_length -= self._doc_length.pop(doc_id)
+
+    def _candidates(self, term: str) -> dict:
+        """Слова словаря на расстоянии не больше одной правки -> вес"""
+        if term in self._postings:
+            return {term: 1.0}
+        found = set()
+        for variant in deletes(term) | {term}:
+            found |= self._deletes.get(variant, set())
+        return {candidate: self.FUZZY_WEIGHT for candidate in found}
+
+    def search(self, query: str, limit: int = 5) -> list:
+        """Найти правила по запросу: [(doc_id, score)] по убыванию релевантности"""
+        if not self._doc_terms:
+            return []
+        total_docs = len(self._doc_terms)
+        avg_length = self._total_length / total_docs
+        scores = defaultdict(float)
+
+        for query_term in set(tokenize(query)):
+            for term, weight in self._candidates(query_term).items():
+                postings = self._postings[term]
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self._doc_length[doc_id] / avg_length)
+                    scores[doc_id] += weight * idf * tf * (self.K1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Optional
+
+from storage import WriteBehind, load_json
+
+
+class Scheduler:
+    """Отложенные действия на одной куче с сохранением на диск"""
+
+    def __init__(self, filename: str, writer: WriteBehind, batch_size: int = 50,
+                 retry_delay: float = 60.0, max_attempts: int = 3):
+        self.filename = filename
+        self.writer = writer
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self._heap = []
+        # job_id -> [run_at, kind, payload, attempts]; это же и сохраняется в файл
+        self._jobs = {}
+        self._handlers = {}
+        self._ids = itertools.count(1)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Задачи читаются сразу: schedule() до start() не должен потеряться при загрузке
+        self.load()
+        writer.register(filename, lambda: self._jobs)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def handler(self, kind: str):
+        """Декоратор для обработчика задач определенного типа"""
+        def decorator(func):
+            self._handlers[kind] = func
+            return func
+        return decorator
+
+    def load(self):
+        """Восстановить задачи из файла"""
+        stored = load_json(self.filename)
+        self._jobs = {int(job_id): job for job_id, job in stored.items()}
+        self._heap = [(job[0], job_id) for job_id, job in self._jobs.items()]
+        heapq.heapify(self._heap)
+        self._ids = itertools.count(max(self._jobs, default=0) + 1)
+
+    def start(self):
+        """Запустить обработку задач (повторный вызов ничего не делает)"""
+        if self._task is not None and not self._task.done():
+            return False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return True
+
+    async def stop(self):
+        """Остановить обработку задач (при остановке бота)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, delay: float, kind: str, payload: dict, attempts: int = 0) -> int:
+        """Запланировать задачу через delay секунд"""
+        job_id = next(self._ids)
+        run_at = time.time() + delay
+        self._jobs[job_id] = [run_at, kind, payload, attempts]
+        heapq.heappush(self._heap, (run_at, job_id))
+        self.writer.mark_dirty(self.filename)
+        # Будим цикл, только если новая задача стала ближайшей
+        if self._heap[0][1] == job_id:
+            self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id: int) -> bool:
+        """Отменить задачу (запись в куче удалится при извлечении)"""
+        if self._jobs.pop(job_id, None) is None:
+            return False
+        self.writer.mark_dirty(self.filename)
+        return True
+
+    def cancel_where(self, kind: str, **match) -> int:
+        """Отменить все задачи типа kind с совпадающими полями"""
+        job_ids = [
+            job_id for job_id, (_, job_kind, payload, _) in self._jobs.items()
+            if job_kind == kind and all(payload.get(k) == v for k, v in match.items())
+        ]
+        for job_id in job_ids:
+            self.cancel(job_id)
+        return len(job_ids)
+
+    def kinds(self) -> set:
+        """Типы задач, для которых есть обработчик"""
+        return set(self._handlers)
+
+    def guild_jobs(self, guild_id: int) -> dict:
+        """Задачи сервера: job_id -> [run_at, kind, payload, attempts]"""
+        return {job_id: job for job_id, job in self._jobs.items() if job[2].get('guild_id') == guild_id}
+
+    def replace_guild_jobs(self, guild_id: int, jobs: list):
+        """Заменить задачи сервера (восстановление из снимка); просроченные выполнятся сразу"""
+        for job_id in self.guild_jobs(guild_id):
+            self.cancel(job_id)
+        now = time.time()
+        for run_at, kind, payload, attempts in jobs:
+            self.schedule(max(run_at - now, 0), kind, payload, attempts)
+
+    def next_run(self) -> Optional[float]:
+        self._drop_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0][1] not in self._jobs:
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now: float) -> list:
+        due = []
+        while self._heap and len(due) < self.batch_size:
+            run_at, job_id = self._heap[0]
+            if job_id not in self._jobs:
+                heapq.heappop(self._heap)
+                continue
+            if run_at > now:
+                break
+            heapq.heappop(self._heap)
+            due.append((job_id, self._jobs.pop(job_id)))
+        return due
+
+    async def _run(self):
+        while True:
+            next_run = self.next_run()
+            self._wakeup.clear()
+            if next_run is None:
+                await self._wakeup.wait()
+                continue
+
+            timeout = next_run - time.time()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = self._pop_due(time.time())
+            if due:
+                self.writer.mark_dirty(self.filename)
+                await asyncio.gather(*(self._fire(job_id, job) for job_id, job in due))
+
+    async def _fire(self, job_id: int, job: list):
+        _, kind, payload, attempts = job
+        func = self._handlers.get(kind)
+        if func is None:
+            print(f"Нет обработчика для задачи {kind} #{job_id}")
+            return
+        try:
+            await func(payload)
+        except Exception as e:
+            print(f"Ошибка задачи {kind} #{job_id}: {e}")
+            if attempts + 1 < self.max_attempts:
+                self.schedule(self.retry_delay, kind, payload, attempts + 1)
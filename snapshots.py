@@ -0,0 +1,250 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Optional
+
+from storage import atomic_write_json, load_json
+
+SNAPSHOT_VERSION = 1
+# Разделы снимка сервера; каждый раздел - словарь ключ -> значение
+SECTIONS = ('warnings', 'settings', 'rules', 'jobs')
+# Предел распакованного снимка: защита от gzip-бомб в загруженных файлах
+MAX_SNAPSHOT_BYTES = 64 * 1024 * 1024
+
+
+def item_digest(value) -> str:
+    return hashlib.blake2b(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8'),
+                           digest_size=8).hexdigest()
+
+
+def section_digests(sections: dict) -> dict:
+    return {name: {key: item_digest(value) for key, value in sections[name].items()} for name in SECTIONS}
+
+
+def full_snapshot(guild_id: int, sections: dict) -> dict:
+    return {
+        'version': SNAPSHOT_VERSION,
+        'guild_id': guild_id,
+        'kind': 'full',
+        'created_at': datetime.now().isoformat(),
+        'sections': sections
+    }
+
+
+def serialize(snapshot: dict) -> bytes:
+    """JSON без отступов; вызывается в цикле событий, пока данные не успели измениться"""
+    return json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def compress(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes) -> dict:
+    """Распаковка снимка с ограничением размера"""
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        raw = decompressor.decompress(data, MAX_SNAPSHOT_BYTES)
+    except zlib.error:
+        raise ValueError("файл не является сжатым снимком")
+    if decompressor.unconsumed_tail:
+        raise ValueError("снимок слишком большой")
+    try:
+        return json.loads(raw)
+    except ValueError:
+        raise ValueError("снимок поврежден")
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate(snapshot, guild_id: int, job_kinds: set):
+    """Проверить полный снимок перед восстановлением; ValueError с описанием ошибки"""
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError("неподдерживаемый формат снимка")
+    if snapshot.get('kind') != 'full':
+        raise ValueError("инкрементальный снимок нельзя восстановить без предыдущих")
+    if snapshot.get('guild_id') != guild_id:
+        raise ValueError("снимок сделан на другом сервере")
+    sections = snapshot.get('sections')
+    if not isinstance(sections, dict) or not all(isinstance(sections.get(name), dict) for name in SECTIONS):
+        raise ValueError("в снимке не хватает разделов")
+
+    for user_id, warnings in sections['warnings'].items():
+        if not user_id.isdigit() or not isinstance(warnings, list):
+            raise ValueError(f"варны участника {user_id} повреждены")
+        for warning in warnings:
+            if not isinstance(warning, dict) or not _is_int(warning.get('id')):
+                raise ValueError(f"варн участника {user_id} без номера")
+            if warning.get('level') not in (1, 2, 3) or not isinstance(warning.get('active', True), bool):
+                raise ValueError(f"варн {warning['id']} участника {user_id} поврежден")
+            try:
+                datetime.fromisoformat(warning.get('timestamp'))
+            except (TypeError, ValueError):
+                raise ValueError(f"варн {warning['id']} участника {user_id}: неверная дата")
+
+    settings = sections['settings']
+    if settings.get('log_channel') is not None and not _is_int(settings.get('log_channel')):
+        raise ValueError("неверный канал логов")
+    roles = settings.get('mod_roles')
+    if not isinstance(roles, list) or not all(_is_int(role_id) for role_id in roles):
+        raise ValueError("неверный список мод ролей")
+
+    for rule_id, rule in sections['rules'].items():
+        if not rule_id.isdigit() or not isinstance(rule, dict) or not isinstance(rule.get('text'), str):
+            raise ValueError(f"правило {rule_id} повреждено")
+        if rule.get('guild_id') != guild_id:
+            raise ValueError(f"правило {rule_id} относится к другому серверу")
+
+    for job_id, job in sections['jobs'].items():
+        if not isinstance(job, list) or len(job) != 4:
+            raise ValueError(f"задача {job_id} повреждена")
+        run_at, kind, payload, attempts = job
+        if not isinstance(run_at, (int, float)) or not _is_int(attempts) or kind not in job_kinds:
+            raise ValueError(f"задача {job_id} повреждена")
+        if not isinstance(payload, dict) or payload.get('guild_id') != guild_id:
+            raise ValueError(f"задача {job_id} относится к другому серверу")
+
+
+class SnapshotStore:
+    """Автоматические снимки серверов на диске: полный снимок и цепочка изменений после него"""
+
+    def __init__(self, directory: str, full_every: int = 8, keep_chains: int = 3):
+        self.directory = directory
+        # Каждый full_every-й снимок полный, между ними только изменения
+        self.full_every = full_every
+        # Сколько последних цепочек (полный + инкрементальные) хранится
+        self.keep_chains = keep_chains
+        # Снимки одного сервера сохраняются по очереди, иначе два сохранения получат один номер
+        self._locks = {}
+        self.metrics = {'full': 0, 'incremental': 0, 'unchanged': 0, 'bytes_written': 0, 'pruned': 0}
+
+    def _guild_dir(self, guild_id: int) -> str:
+        return os.path.join(self.directory, str(guild_id))
+
+    def _manifest_path(self, guild_id: int) -> str:
+        return os.path.join(self._guild_dir(guild_id), 'manifest.json')
+
+    def _snapshot_path(self, guild_id: int, name: str) -> str:
+        return os.path.join(self._guild_dir(guild_id), f"{name}.json.gz")
+
+    async def _manifest(self, guild_id: int) -> dict:
+        return await asyncio.to_thread(load_json, self._manifest_path(guild_id), {'seq': 0, 'snapshots': [], 'digests': {}})
+
+    async def list(self, guild_id: int) -> list:
+        """Сохраненные снимки сервера от старых к новым"""
+        return (await self._manifest(guild_id))['snapshots']
+
+    async def save(self, guild_id: int, sections: dict, full: bool = False) -> Optional[dict]:
+        """Сохранить снимок; None, если с прошлого снимка ничего не изменилось"""
+        async with self._locks.setdefault(guild_id, asyncio.Lock()):
+            return await self._save(guild_id, sections, full)
+
+    async def _save(self, guild_id: int, sections: dict, full: bool) -> Optional[dict]:
+        manifest = await self._manifest(guild_id)
+        # Отпечатки, разница и сериализация - без await, чтобы снимок был согласованным
+        digests = section_digests(sections)
+        entries = manifest['snapshots']
+        chain_length = 0
+        for entry in reversed(entries):
+            chain_length += 1
+            if entry['kind'] == 'full':
+                break
+        full = full or not entries or chain_length >= self.full_every
+
+        if full:
+            snapshot = full_snapshot(guild_id, sections)
+            changes = sum(len(items) for items in sections.values())
+        else:
+            previous = manifest['digests']
+            changed = {
+                name: {key: sections[name][key] for key, digest in digests[name].items()
+                       if previous.get(name, {}).get(key) != digest}
+                for name in SECTIONS
+            }
+            removed = {name: [key for key in previous.get(name, {}) if key not in digests[name]] for name in SECTIONS}
+            changes = sum(len(items) for items in changed.values()) + sum(len(keys) for keys in removed.values())
+            if not changes:
+                self.metrics['unchanged'] += 1
+                return None
+            snapshot = {
+                'version': SNAPSHOT_VERSION,
+                'guild_id': guild_id,
+                'kind': 'incremental',
+                'base': entries[-1]['name'],
+                'created_at': datetime.now().isoformat(),
+                'changes': changed,
+                'removed': removed
+            }
+        data = serialize(snapshot)
+
+        manifest['seq'] += 1
+        entry = {
+            'name': f"{manifest['seq']:05d}-{snapshot['kind']}",
+            'kind': snapshot['kind'],
+            'created_at': snapshot['created_at'],
+            'changes': changes
+        }
+        entries.append(entry)
+        manifest['digests'] = digests
+        pruned = self._prune(entries)
+        manifest['snapshots'] = entries[len(pruned):]
+
+        size = await asyncio.to_thread(self._write, guild_id, entry['name'], data, manifest, pruned)
+        entry['bytes'] = size
+        self.metrics[snapshot['kind']] += 1
+        self.metrics['bytes_written'] += size
+        self.metrics['pruned'] += len(pruned)
+        return entry
+
+    def _prune(self, entries: list) -> list:
+        """Старые записи, выходящие за keep_chains последних цепочек"""
+        starts = [i for i, entry in enumerate(entries) if entry['kind'] == 'full']
+        if len(starts) <= self.keep_chains:
+            return []
+        return entries[:starts[-self.keep_chains]]
+
+    def _write(self, guild_id: int, name: str, data: bytes, manifest: dict, pruned: list) -> int:
+        os.makedirs(self._guild_dir(guild_id), exist_ok=True)
+        compressed = compress(data)
+        path = self._snapshot_path(guild_id, name)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(compressed)
+        os.replace(f"{path}.tmp", path)
+        # Манифест пишется последним: без него файл снимка просто не виден
+        atomic_write_json(self._manifest_path(guild_id), manifest)
+        for entry in pruned:
+            try:
+                os.remove(self._snapshot_path(guild_id, entry['name']))
+            except FileNotFoundError:
+                pass
+        return len(compressed)
+
+    def _read(self, guild_id: int, name: str) -> dict:
+        with open(self._snapshot_path(guild_id, name), 'rb') as f:
+            return decompress(f.read())
+
+    async def load(self, guild_id: int, name: str) -> dict:
+        """Полный снимок на момент name: последний полный плюс изменения после него"""
+        entries = await self.list(guild_id)
+        names = [entry['name'] for entry in entries]
+        if name not in names:
+            raise ValueError(f"снимок {name} не найден")
+        end = names.index(name)
+        start = max(i for i in range(end + 1) if entries[i]['kind'] == 'full')
+        chain = await asyncio.to_thread(lambda: [self._read(guild_id, n) for n in names[start:end + 1]])
+
+        snapshot = chain[0]
+        sections = snapshot['sections']
+        for step in chain[1:]:
+            for section in SECTIONS:
+                sections[section].update(step['changes'][section])
+                for key in step['removed'][section]:
+                    sections[section].pop(key, None)
+        snapshot['created_at'] = chain[-1]['created_at']
+        return snapshot
@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+
+def fingerprint(content: str) -> int:
+    """Компактный отпечаток текста сообщения"""
+    return hash(' '.join(content.lower().split()))
+
+
+class SpamTracker:
+    """Скользящее окно последних сообщений по (сервер, канал, автор)"""
+
+    def __init__(
+        self,
+        history_size: int = 5,
+        repeat_count: int = 3,
+        flood_count: int = 5,
+        flood_window: float = 5.0,
+        max_mentions: int = 5,
+        idle_ttl: float = 300.0
+    ):
+        self.history_size = history_size
+        self.repeat_count = repeat_count
+        self.flood_count = flood_count
+        self.flood_window = flood_window
+        self.max_mentions = max_mentions
+        self.idle_ttl = idle_ttl
+        # Порядок ключей = порядок последней активности, старые в начале
+        self._buffers = OrderedDict()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    @property
+    def capacity(self) -> int:
+        """Сколько последних сообщений автора хранится"""
+        return max(self.history_size, self.flood_count)
+
+    def record(self, guild_id: int, channel_id: int, author_id: int, content: str,
+               now: Optional[float] = None) -> deque:
+        """Добавить сообщение в буфер автора"""
+        now = time.monotonic() if now is None else now
+        key = (guild_id, channel_id, author_id)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = deque(maxlen=self.capacity)
+            self._buffers[key] = buffer
+        else:
+            self._buffers.move_to_end(key)
+        buffer.append((now, fingerprint(content)))
+        self.evict(now)
+        return buffer
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Удалить буферы, в которые давно никто не писал"""
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        while self._buffers:
+            key, buffer = next(iter(self._buffers.items()))
+            if now - buffer[-1][0] < self.idle_ttl:
+                break
+            del self._buffers[key]
+            evicted += 1
+        return evicted
+
+    def is_repeat(self, buffer: deque) -> bool:
+        """Одно и то же сообщение несколько раз подряд"""
+        if len(buffer) < self.repeat_count:
+            return False
+        last = buffer[-1][1]
+        return all(buffer[-i][1] == last for i in range(2, self.repeat_count + 1))
+
+    def is_flood(self, buffer: deque, flood_count: Optional[int] = None) -> bool:
+        """Слишком много сообщений за короткое время"""
+        flood_count = flood_count or self.flood_count
+        if len(buffer) < flood_count:
+            return False
+        return buffer[-1][0] - buffer[-flood_count][0] <= self.flood_window
+
+    def check(self, guild_id: int, channel_id: int, author_id: int, content: str,
+              mentions: int = 0, now: Optional[float] = None) -> Optional[str]:
+        """Записать сообщение и вернуть причину, если это спам"""
+        buffer = self.record(guild_id, channel_id, author_id, content, now)
+        if mentions > self.max_mentions:
+            return 'mentions'
+        if self.is_repeat(buffer):
+            return 'repeat'
+        if self.is_flood(buffer):
+            return 'flood'
+        return None
@@ -0,0 +1,574 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Поля предупреждения, которые хранятся в отдельных колонках
+WARNING_FIELDS = ('id', 'guild_id', 'moderator', 'moderator_id', 'reason', 'level', 'timestamp', 'active')
+
+# Варны из старых файлов без guild_id попадают в раздел сервера 0;
+# при загрузке сервера их забирают его участники (Storage.adopt_legacy)
+UNKNOWN_GUILD = 0
+
+
+def load_json(filename, default=None):
+    """Чтение JSON-файла"""
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {} if default is None else default
+
+
+def atomic_write_json(filename, data):
+    """Запись JSON через временный файл и переименование"""
+    atomic_write_text(filename, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def atomic_write_text(filename, text: str):
+    """Запись готового текста через временный файл и переименование"""
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class WriteBehind:
+    """Отложенная запись JSON-файлов: изменения копятся и сбрасываются пачкой"""
+
+    def __init__(self, interval_ms: int = 500):
+        self.interval = interval_ms / 1000
+        self._sources = {}
+        self._dirty = set()
+        self._writing = set()
+        self._wakeup = None
+        self._task = None
+        self._lock = None
+        self.metrics = {
+            'flushes': 0,
+            'files_written': 0,
+            'writes_requested': 0,
+            'writes_coalesced': 0,
+            'flush_errors': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0
+        }
+
+    def register(self, filename: str, source):
+        """Привязать файл к функции, возвращающей актуальные данные"""
+        self._sources[filename] = source
+
+    def unregister(self, filename: str):
+        self._sources.pop(filename, None)
+
+    def is_dirty(self, filename: str) -> bool:
+        """Есть несохраненные изменения или файл сейчас записывается"""
+        return filename in self._dirty or filename in self._writing
+
+    def mark_dirty(self, filename: str):
+        """Отметить файл как измененный"""
+        self.metrics['writes_requested'] += 1
+        if filename in self._dirty:
+            self.metrics['writes_coalesced'] += 1
+        self._dirty.add(filename)
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Ждем интервал, чтобы собрать все изменения за это время в одну запись
+            await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Записать все измененные файлы"""
+        if not self._dirty:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            # Источники берутся до первого await: пока идет запись, файл могут снять с учета
+            sources = [(filename, self._sources.get(filename)) for filename in dirty]
+            self._writing = dirty
+            started = time.perf_counter()
+            try:
+                for filename, source in sources:
+                    if source is None:
+                        # Файл сняли с учета до сброса: записывать нечего
+                        self._writing.discard(filename)
+                        continue
+                    try:
+                        # Данные сериализуются на цикле событий: в потоке их могли бы менять во время обхода.
+                        # Компактный dumps идет через C-кодировщик, с отступами он в несколько раз медленнее
+                        text = json.dumps(source(), ensure_ascii=False)
+                        await asyncio.to_thread(atomic_write_text, filename, text)
+                        self.metrics['files_written'] += 1
+                        self._writing.discard(filename)
+                    except Exception as e:
+                        self.metrics['flush_errors'] += 1
+                        print(f"Ошибка записи {filename}: {e}")
+            finally:
+                # Незаписанные файлы (ошибка или отмена сброса) останутся помеченными до следующего сброса
+                self._dirty |= self._writing
+                self._writing = set()
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.metrics['flushes'] += 1
+            self.metrics['last_flush_ms'] = elapsed_ms
+            self.metrics['max_flush_ms'] = max(self.metrics['max_flush_ms'], elapsed_ms)
+            self.metrics['total_flush_ms'] += elapsed_ms
+
+    async def close(self):
+        """Остановить фоновую задачу и записать все, что осталось"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def empty_partition() -> dict:
+    """Данные одного сервера: варны по участникам, канал логов, мод роли"""
+    return {'warnings': {}, 'log_channel': None, 'mod_roles': []}
+
+
+def split_legacy_json(warnings_file: str, log_channel_file: str, mod_roles_file: str) -> dict:
+    """Разложить старые общие JSON-файлы по серверам: guild_id -> раздел"""
+    partitions = {}
+
+    def partition(guild_id) -> dict:
+        return partitions.setdefault(int(guild_id), empty_partition())
+
+    for user_id, user_warnings in load_json(warnings_file).items():
+        if not isinstance(user_warnings, list):
+            continue
+        for warning in user_warnings:
+            guild_id = warning.get('guild_id', UNKNOWN_GUILD)
+            partition(guild_id)['warnings'].setdefault(user_id, []).append(warning)
+
+    # В старом файле логов встречаются посторонние записи, берем только ID каналов
+    for guild_id, channel_id in load_json(log_channel_file).items():
+        if guild_id.isdigit() and isinstance(channel_id, int):
+            partition(guild_id)['log_channel'] = channel_id
+
+    for guild_id, config in load_json(mod_roles_file).items():
+        if guild_id.isdigit() and isinstance(config, dict):
+            partition(guild_id)['mod_roles'] = list(config.get('roles', []))
+
+    return partitions
+
+
+class Storage(ABC):
+    """Базовый интерфейс хранилища: данные разложены по серверам и грузятся по запросу"""
+
+    def __init__(self):
+        self._legacy_lock = asyncio.Lock()
+        self._legacy_empty = False
+
+    @abstractmethod
+    async def load_guild(self, guild_id: int) -> dict:
+        """Раздел сервера в формате empty_partition()"""
+
+    @abstractmethod
+    async def save_warnings(self, guild_id: int, user_id: str, warnings: list):
+        """Сохранить список варнов участника целиком"""
+
+    @abstractmethod
+    async def set_log_channel(self, guild_id: int, channel_id: int):
+        """Канал логов сервера"""
+
+    @abstractmethod
+    async def set_mod_roles(self, guild_id: int, roles: list):
+        """Мод роли сервера"""
+
+    @abstractmethod
+    async def list_guilds(self) -> list:
+        """ID серверов, у которых есть данные"""
+
+    @abstractmethod
+    async def replace_guild(self, guild_id: int, partition: dict):
+        """Заменить раздел сервера целиком (восстановление из снимка)"""
+
+    def release(self, guild_id: int) -> bool:
+        """Разрешить выгрузку раздела из памяти; False - есть несохраненные изменения"""
+        return True
+
+    async def adopt_legacy(self, owns_user: Callable[[str], bool]) -> dict:
+        """Забрать из раздела UNKNOWN_GUILD варны участников, для которых owns_user(user_id): user_id -> [варны]"""
+        if self._legacy_empty:
+            return {}
+        async with self._legacy_lock:
+            legacy = await self.load_guild(UNKNOWN_GUILD)
+            moved = {user_id: warns for user_id, warns in legacy['warnings'].items() if owns_user(user_id)}
+            if moved:
+                for user_id in moved:
+                    del legacy['warnings'][user_id]
+                await self.replace_guild(UNKNOWN_GUILD, legacy)
+            self._legacy_empty = not legacy['warnings']
+        return moved
+
+    async def close(self):
+        pass
+
+
+class JsonStorage(Storage):
+    """Хранилище в JSON-файлах (файл на сервер) с отложенной записью"""
+
+    MIGRATED_MARKER = '.migrated'
+
+    def __init__(self, directory: str, warnings_file: str, log_channel_file: str, mod_roles_file: str,
+                 writer: WriteBehind):
+        super().__init__()
+        self.directory = directory
+        self.writer = writer
+        self._partitions = {}
+        os.makedirs(directory, exist_ok=True)
+        marker = os.path.join(directory, self.MIGRATED_MARKER)
+        if not os.path.exists(marker):
+            partitions = split_legacy_json(warnings_file, log_channel_file, mod_roles_file)
+            for guild_id, partition in partitions.items():
+                atomic_write_json(self._path(guild_id), partition)
+            atomic_write_json(marker, {'guilds': len(partitions)})
+            if partitions:
+                print(f"📦 Данные разложены по серверам в {directory}: {len(partitions)}")
+
+    def _path(self, guild_id: int) -> str:
+        return os.path.join(self.directory, f"{guild_id}.json")
+
+    async def load_guild(self, guild_id: int) -> dict:
+        partition = self._partitions.get(guild_id)
+        if partition is None:
+            partition = await asyncio.to_thread(load_json, self._path(guild_id), empty_partition())
+            self._partitions[guild_id] = partition
+            self.writer.register(self._path(guild_id), lambda: partition)
+        return partition
+
+    async def save_warnings(self, guild_id: int, user_id: str, warnings: list):
+        partition = await self.load_guild(guild_id)
+        partition['warnings'][user_id] = warnings
+        self.writer.mark_dirty(self._path(guild_id))
+
+    async def set_log_channel(self, guild_id: int, channel_id: int):
+        partition = await self.load_guild(guild_id)
+        partition['log_channel'] = channel_id
+        self.writer.mark_dirty(self._path(guild_id))
+
+    async def set_mod_roles(self, guild_id: int, roles: list):
+        partition = await self.load_guild(guild_id)
+        partition['mod_roles'] = roles
+        self.writer.mark_dirty(self._path(guild_id))
+
+    async def list_guilds(self) -> list:
+        names = await asyncio.to_thread(os.listdir, self.directory)
+        return [int(name[:-5]) for name in names if name.endswith('.json') and name[:-5].isdigit()]
+
+    async def replace_guild(self, guild_id: int, partition: dict):
+        # Файл сервера перезаписывается целиком через временный файл
+        self._partitions[guild_id] = partition
+        self.writer.register(self._path(guild_id), lambda: partition)
+        self.writer.mark_dirty(self._path(guild_id))
+
+    def release(self, guild_id: int) -> bool:
+        path = self._path(guild_id)
+        if self.writer.is_dirty(path):
+            return False
+        self.writer.unregister(path)
+        self._partitions.pop(guild_id, None)
+        return True
+
+    async def close(self):
+        await self.writer.flush()
+
+
+class SqliteStorage(Storage):
+    """Хранилище во встроенной базе SQLite (режим WAL)"""
+
+    SCHEMA_VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS warnings (
+            guild_id INTEGER NOT NULL DEFAULT 0,
+            user_id INTEGER NOT NULL,
+            warn_id INTEGER NOT NULL,
+            moderator TEXT,
+            moderator_id INTEGER,
+            reason TEXT,
+            level INTEGER,
+            timestamp TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            extra TEXT,
+            PRIMARY KEY (guild_id, user_id, warn_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_warnings_guild_user ON warnings (guild_id, user_id);
+        CREATE INDEX IF NOT EXISTS idx_warnings_guild_active ON warnings (guild_id, active);
+        CREATE INDEX IF NOT EXISTS idx_warnings_timestamp ON warnings (timestamp);
+
+        CREATE TABLE IF NOT EXISTS log_channels (
+            guild_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS mod_roles (
+            guild_id INTEGER NOT NULL,
+            role_id INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, role_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, filename: str):
+        super().__init__()
+        self.filename = filename
+        # В режиме кластера базу открывают несколько процессов, ждем блокировку до 10 секунд
+        self.conn = sqlite3.connect(filename, timeout=10, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._upgrade()
+        self.conn.executescript(self.SCHEMA)
+        self.conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self.conn.commit()
+        # Один рабочий поток: запросы не блокируют цикл событий и не идут параллельно
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+
+    def _upgrade(self):
+        """Перестроить таблицу варнов первой версии (ключ был без guild_id)"""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'warnings'"
+        ).fetchone()
+        if not exists or version >= self.SCHEMA_VERSION:
+            return
+        with self.conn:
+            self.conn.execute("ALTER TABLE warnings RENAME TO warnings_v1")
+            self.conn.execute("DROP INDEX IF EXISTS idx_warnings_guild_user")
+            self.conn.execute("DROP INDEX IF EXISTS idx_warnings_guild_active")
+            self.conn.execute("DROP INDEX IF EXISTS idx_warnings_timestamp")
+            self.conn.executescript(self.SCHEMA)
+            self.conn.execute(
+                "INSERT OR IGNORE INTO warnings "
+                "SELECT COALESCE(guild_id, 0), user_id, warn_id, moderator, moderator_id, "
+                "reason, level, timestamp, active, extra FROM warnings_v1"
+            )
+            self.conn.execute("DROP TABLE warnings_v1")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    @staticmethod
+    def _warning_from_row(row) -> dict:
+        warning = json.loads(row['extra']) if row['extra'] else {}
+        warning.update({
+            'id': row['warn_id'],
+            'moderator': row['moderator'],
+            'moderator_id': row['moderator_id'],
+            'reason': row['reason'],
+            'level': row['level'],
+            'timestamp': row['timestamp'],
+            'active': bool(row['active'])
+        })
+        if row['guild_id'] != UNKNOWN_GUILD:
+            warning['guild_id'] = row['guild_id']
+        return warning
+
+    @staticmethod
+    def _warning_row(guild_id: int, user_id: str, warning: dict) -> tuple:
+        extra = {k: v for k, v in warning.items() if k not in WARNING_FIELDS}
+        return (
+            guild_id,
+            int(user_id),
+            warning['id'],
+            warning.get('moderator'),
+            warning.get('moderator_id'),
+            warning.get('reason'),
+            warning.get('level', 1),
+            warning.get('timestamp'),
+            1 if warning.get('active', True) else 0,
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+
+    def _load_guild(self, guild_id: int) -> dict:
+        partition = empty_partition()
+        rows = self.conn.execute(
+            "SELECT * FROM warnings WHERE guild_id = ? ORDER BY user_id, warn_id", (guild_id,)
+        )
+        for row in rows:
+            partition['warnings'].setdefault(str(row['user_id']), []).append(self._warning_from_row(row))
+        row = self.conn.execute("SELECT channel_id FROM log_channels WHERE guild_id = ?", (guild_id,)).fetchone()
+        if row:
+            partition['log_channel'] = row['channel_id']
+        rows = self.conn.execute("SELECT role_id FROM mod_roles WHERE guild_id = ? ORDER BY rowid", (guild_id,))
+        partition['mod_roles'] = [row['role_id'] for row in rows]
+        return partition
+
+    async def load_guild(self, guild_id: int) -> dict:
+        return await self._run(self._load_guild, guild_id)
+
+    def _save_warnings(self, rows: list):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO warnings "
+                "(guild_id, user_id, warn_id, moderator, moderator_id, reason, level, timestamp, active, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    async def save_warnings(self, guild_id: int, user_id: str, warnings: list):
+        # Строки готовятся сразу, пока список не успел измениться
+        rows = [self._warning_row(guild_id, user_id, w) for w in warnings]
+        await self._run(self._save_warnings, rows)
+
+    def _set_log_channel(self, guild_id: int, channel_id: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO log_channels (guild_id, channel_id) VALUES (?, ?)",
+                (guild_id, channel_id)
+            )
+
+    async def set_log_channel(self, guild_id: int, channel_id: int):
+        await self._run(self._set_log_channel, guild_id, channel_id)
+
+    def _set_mod_roles(self, guild_id: int, roles: list):
+        with self.conn:
+            self.conn.execute("DELETE FROM mod_roles WHERE guild_id = ?", (guild_id,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO mod_roles (guild_id, role_id) VALUES (?, ?)",
+                [(guild_id, role_id) for role_id in roles]
+            )
+
+    async def set_mod_roles(self, guild_id: int, roles: list):
+        await self._run(self._set_mod_roles, guild_id, list(roles))
+
+    def _list_guilds(self) -> list:
+        rows = self.conn.execute(
+            "SELECT guild_id FROM warnings UNION SELECT guild_id FROM log_channels "
+            "UNION SELECT guild_id FROM mod_roles"
+        )
+        return [row['guild_id'] for row in rows]
+
+    async def list_guilds(self) -> list:
+        return await self._run(self._list_guilds)
+
+    def _replace_guild(self, guild_id: int, rows: list, log_channel, roles: list):
+        with self.conn:
+            for table in ('warnings', 'log_channels', 'mod_roles'):
+                self.conn.execute(f"DELETE FROM {table} WHERE guild_id = ?", (guild_id,))
+            self.conn.executemany(
+                "INSERT INTO warnings "
+                "(guild_id, user_id, warn_id, moderator, moderator_id, reason, level, timestamp, active, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            if log_channel is not None:
+                self.conn.execute(
+                    "INSERT INTO log_channels (guild_id, channel_id) VALUES (?, ?)", (guild_id, log_channel)
+                )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO mod_roles (guild_id, role_id) VALUES (?, ?)",
+                [(guild_id, role_id) for role_id in roles]
+            )
+
+    async def replace_guild(self, guild_id: int, partition: dict):
+        # Одна транзакция: раздел заменяется целиком или не меняется совсем
+        rows = [
+            self._warning_row(guild_id, user_id, w)
+            for user_id, user_warnings in partition['warnings'].items() for w in user_warnings
+        ]
+        await self._run(self._replace_guild, guild_id, rows, partition['log_channel'], list(partition['mod_roles']))
+
+    def is_migrated(self) -> bool:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+        return row is not None
+
+    def migrate_from_json(self, warnings_file: str, log_channel_file: str, mod_roles_file: str) -> dict:
+        """Однократный перенос данных из JSON-файлов"""
+        if self.is_migrated():
+            return {}
+
+        partitions = split_legacy_json(warnings_file, log_channel_file, mod_roles_file)
+        counts = {'warnings': 0, 'log_channels': 0, 'mod_roles': 0}
+
+        with self.conn:
+            for guild_id, partition in partitions.items():
+                for user_id, user_warnings in partition['warnings'].items():
+                    rows = [self._warning_row(guild_id, user_id, w) for w in user_warnings]
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO warnings "
+                        "(guild_id, user_id, warn_id, moderator, moderator_id, reason, level, timestamp, active, extra) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    counts['warnings'] += len(rows)
+
+                if partition['log_channel'] is not None:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO log_channels (guild_id, channel_id) VALUES (?, ?)",
+                        (guild_id, partition['log_channel'])
+                    )
+                    counts['log_channels'] += 1
+
+                for role_id in partition['mod_roles']:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO mod_roles (guild_id, role_id) VALUES (?, ?)",
+                        (guild_id, role_id)
+                    )
+                    counts['mod_roles'] += 1
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (json.dumps(counts),)
+            )
+        return counts
+
+    async def close(self):
+        await self._run(self.conn.close)
+        self._executor.shutdown(wait=True)
+
+
+def create_storage(backend: str, database_file: str, guilds_directory: str, warnings_file: str,
+                   log_channel_file: str, mod_roles_file: str, writer: WriteBehind) -> Storage:
+    """Выбор хранилища по названию"""
+    if backend == 'sqlite':
+        storage = SqliteStorage(database_file)
+        counts = storage.migrate_from_json(warnings_file, log_channel_file, mod_roles_file)
+        if counts:
+            print(f"📦 Данные перенесены в {database_file}: {counts}")
+        return storage
+    if backend == 'json':
+        return JsonStorage(guilds_directory, warnings_file, log_channel_file, mod_roles_file, writer)
+    raise ValueError(f"Неизвестное хранилище: {backend}")
+
+
+if __name__ == "__main__":
+    # python storage.py migrate [bot.db] - перенос JSON-файлов в SQLite
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print("Использование: python storage.py migrate [файл_базы]")
+        sys.exit(1)
+    database_file = sys.argv[2] if len(sys.argv) > 2 else 'bot.db'
+    storage = SqliteStorage(database_file)
+    counts = storage.migrate_from_json('warnings.json', 'log_channel.json', 'mod_roles.json')
+    print(f"✅ Перенесено: {counts}" if counts else "ℹ️ Данные уже были перенесены")
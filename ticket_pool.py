@@ -0,0 +1,68 @@
+import asyncio
+from typing import Optional
+
+import discord
+
+
+class TicketChannelPool:
+    """Заранее созданные скрытые каналы для быстрого открытия тикетов"""
+
+    def __init__(self, size: int, channel_name: str = "резерв-тикета"):
+        self.size = size
+        self.channel_name = channel_name
+        self._channels = {}
+        self._refilling = set()
+        self._tasks = set()
+
+    def is_reserved(self, channel) -> bool:
+        return channel.name == self.channel_name
+
+    def discover(self, category: discord.CategoryChannel):
+        """Найти резервные каналы, оставшиеся с прошлого запуска"""
+        pool = self._channels.setdefault(category.guild.id, [])
+        for channel in category.text_channels:
+            if self.is_reserved(channel) and channel.id not in pool:
+                pool.append(channel.id)
+
+    def take(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """Забрать свободный канал из пула"""
+        pool = self._channels.get(guild.id, [])
+        while pool:
+            channel = guild.get_channel(pool.pop())
+            if channel is not None:
+                return channel
+        return None
+
+    @staticmethod
+    def hidden_overwrites(guild: discord.Guild) -> dict:
+        return {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, manage_channels=True)
+        }
+
+    async def refill(self, category: discord.CategoryChannel):
+        """Досоздать каналы до нужного размера пула"""
+        guild = category.guild
+        if not self.size or guild.id in self._refilling:
+            return
+        self._refilling.add(guild.id)
+        try:
+            pool = self._channels.setdefault(guild.id, [])
+            while len(pool) < self.size:
+                channel = await guild.create_text_channel(
+                    name=self.channel_name,
+                    category=category,
+                    overwrites=self.hidden_overwrites(guild),
+                    reason="Резервный канал для тикетов"
+                )
+                pool.append(channel.id)
+        except discord.HTTPException as e:
+            print(f"Ошибка пополнения пула тикетов: {e}")
+        finally:
+            self._refilling.discard(guild.id)
+
+    def schedule_refill(self, category: discord.CategoryChannel):
+        if self.size:
+            task = asyncio.get_running_loop().create_task(self.refill(category))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,91 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+class WarningLedger:
+    """Счетчики активных варнов и очередь их истечения"""
+
+    def __init__(self, ttl_days: dict):
+        # Уровень -> срок жизни в днях (0 или None - не истекает)
+        self.ttl_days = ttl_days
+        self._counts = {}  # user_id -> [активных, сумма уровней]
+        self._heap = []  # (время истечения, user_id, warn_id)
+
+    def expires_at(self, warning: dict) -> Optional[datetime]:
+        """Когда истекает предупреждение"""
+        if warning.get('expires_at'):
+            return datetime.fromisoformat(warning['expires_at'])
+        ttl = self.ttl_days.get(warning.get('level', 1))
+        if not ttl:
+            return None
+        return datetime.fromisoformat(warning['timestamp']) + timedelta(days=ttl)
+
+    def load(self, warnings_data: dict):
+        """Построить счетчики и очередь по уже выданным варнам"""
+        self._counts = {}
+        self._heap = []
+        for user_id, warns in warnings_data.items():
+            for warn in warns:
+                if warn.get('active'):
+                    self._track(user_id, warn)
+        heapq.heapify(self._heap)
+
+    def _track(self, user_id: str, warning: dict, push: bool = False):
+        counts = self._counts.setdefault(user_id, [0, 0])
+        counts[0] += 1
+        counts[1] += warning.get('level', 1)
+        expires_at = self.expires_at(warning)
+        if expires_at is not None:
+            entry = (expires_at.timestamp(), user_id, warning['id'])
+            if push:
+                heapq.heappush(self._heap, entry)
+            else:
+                self._heap.append(entry)
+
+    def add(self, user_id: str, warning: dict):
+        """Учесть новое предупреждение (и проставить срок истечения)"""
+        expires_at = self.expires_at(warning)
+        if expires_at is not None:
+            warning['expires_at'] = expires_at.isoformat()
+        self._track(user_id, warning, push=True)
+
+    def deactivate(self, user_id: str, warning: dict) -> bool:
+        """Снять предупреждение; запись в очереди удалится при извлечении"""
+        if not warning.get('active'):
+            return False
+        warning['active'] = False
+        counts = self._counts.get(user_id)
+        if counts:
+            counts[0] -= 1
+            counts[1] -= warning.get('level', 1)
+            if counts[0] <= 0:
+                del self._counts[user_id]
+        return True
+
+    def active_count(self, user_id: str) -> int:
+        return self._counts.get(user_id, (0, 0))[0]
+
+    def severity_sum(self, user_id: str) -> int:
+        return self._counts.get(user_id, (0, 0))[1]
+
+    @staticmethod
+    def find(warns: list, warn_id: int) -> Optional[dict]:
+        """Найти варн по номеру (номера идут подряд с 1)"""
+        if 0 < warn_id <= len(warns) and warns[warn_id - 1]['id'] == warn_id:
+            return warns[warn_id - 1]
+        for warn in warns:
+            if warn['id'] == warn_id:
+                return warn
+        return None
+
+    def expire_due(self, warnings_data: dict, now: datetime = None) -> list:
+        """Снять все истекшие варны: [(user_id, warning)]"""
+        now_ts = (now or datetime.now()).timestamp()
+        expired = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            _, user_id, warn_id = heapq.heappop(self._heap)
+            warning = self.find(warnings_data.get(user_id, []), warn_id)
+            if warning is not None and self.deactivate(user_id, warning):
+                expired.append((user_id, warning))
+        return expired